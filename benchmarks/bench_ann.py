@@ -0,0 +1,76 @@
+"""
+Compare recall and query latency of the IVF index of NumpyVectorStore against exact search for several nprobe values.
+
+Embeddings are drawn around a few hundred random centers so neighbours are meaningful, as with real text embeddings.
+
+Run from the repository root with the package installed (pip install -e .).
+
+Usage:
+    python benchmarks/bench_ann.py [--dim 1536] [--size 50000] [--nprobe 1 4 8 16 32]
+"""
+import argparse
+import time
+
+import numpy as np
+from llama_index.schema import TextNode
+from llama_index.vector_stores.types import NodeWithEmbedding, VectorStoreQuery
+
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import \
+    NumpyVectorStore
+
+
+def clustered(rng, size, dim, clusters=256):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centers[labels] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+
+
+def search(store, queries, top_k, **kwargs):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(store.query(VectorStoreQuery(
+            query_embedding=query.tolist(), similarity_top_k=top_k), **kwargs).ids)
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = clustered(rng, args.size, args.dim)
+    queries = clustered(rng, args.queries, args.dim)
+    results = [
+        NodeWithEmbedding(node=TextNode(text="", id_=f"node_{i}"),
+                          embedding=embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+
+    flat = NumpyVectorStore()
+    flat.add(results)
+    exact, flat_ms = search(flat, queries, args.top_k)
+
+    ivf = NumpyVectorStore(index_type="ivf", ivf_nlist=args.nlist, ivf_min_train_size=0)
+    ivf.add(results)
+    start = time.perf_counter()
+    ivf.build_ann_index()
+    train_s = time.perf_counter() - start
+
+    print(f"{args.size} nodes, exact search {flat_ms:.2f} ms, IVF training {train_s:.1f} s")
+    print(f"{'nprobe':>7} {'recall@k':>9} {'query ms':>9} {'speedup':>8}")
+    for nprobe in args.nprobe:
+        ids, latency = search(ivf, queries, args.top_k, nprobe=nprobe)
+        recall = np.mean([len(set(found) & set(expected)) / len(expected)
+                          for found, expected in zip(ids, exact)])
+        print(f"{nprobe:>7} {recall:>9.3f} {latency:>9.2f} {flat_ms / latency:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
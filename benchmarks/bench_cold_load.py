@@ -0,0 +1,62 @@
+"""
+Compare cold load time of NumpyVectorStore from `vector_store.json` and from the memory-mapped `vector_store.bin`.
+
+Run from the repository root with the package installed (pip install -e .).
+
+Usage:
+    python benchmarks/bench_cold_load.py [--dim 1536] [--sizes 1000 10000 50000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from llama_index.schema import TextNode
+from llama_index.vector_stores.types import (DEFAULT_PERSIST_FNAME,
+                                             NodeWithEmbedding,
+                                             VectorStoreQuery)
+
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import (
+    BINARY_FNAME, NumpyVectorStore)
+
+
+def time_load(persist_dir, query, top_k):
+    # The first query is part of a cold load: the mapped pages are only read then
+    start = time.perf_counter()
+    store = NumpyVectorStore.from_persist_dir(persist_dir)
+    store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k))
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'nodes':>8} {'json ms':>10} {'binary ms':>10} {'json MB':>8} {'binary MB':>10}")
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim)).astype(np.float32)
+        query = rng.standard_normal(args.dim).astype(np.float32)
+        with tempfile.TemporaryDirectory() as json_dir, tempfile.TemporaryDirectory() as binary_dir:
+            for persist_dir, persist_format in ((json_dir, "json"), (binary_dir, "binary")):
+                store = NumpyVectorStore(persist_format=persist_format)
+                store.add([
+                    NodeWithEmbedding(node=TextNode(text="", id_=f"node_{i}"),
+                                      embedding=embedding.tolist())
+                    for i, embedding in enumerate(embeddings)
+                ])
+                store.persist(os.path.join(persist_dir, DEFAULT_PERSIST_FNAME))
+            json_ms = time_load(json_dir, query, args.top_k)
+            binary_ms = time_load(binary_dir, query, args.top_k)
+            json_mb = os.path.getsize(os.path.join(json_dir, DEFAULT_PERSIST_FNAME)) / 2 ** 20
+            binary_mb = os.path.getsize(os.path.join(binary_dir, BINARY_FNAME)) / 2 ** 20
+        print(f"{size:>8} {json_ms:>10.1f} {binary_ms:>10.1f} {json_mb:>8.1f} {binary_mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the stored size and the decode time of chat history entries with the JSON and binary history codecs,
+with and without compression.
+
+The turns have the shape `ChatMemory.add_conversation` stores. Sizes are the bytes of the Redis list items,
+decode time is the time to deserialize every item, as reading a whole history does.
+
+Run from the repository root with the package installed (pip install -e .).
+
+Usage:
+    python benchmarks/bench_history_codec.py [--turns 1000] [--words 40 200]
+"""
+import argparse
+import random
+import time
+
+from chatgpt_long_term_memory.memory.history_codec import (TIMESTAMP_FORMAT,
+                                                           HistoryCodec)
+
+WORDS = ("memory context history user assistant answer question summary index vector redis token model "
+         "prompt chunk store cache query embedding document retrieval latency budget window turn").split()
+
+CODECS = [
+    ("json", dict(codec="json")),
+    ("binary", dict(codec="binary", compression="none")),
+    ("binary+zlib", dict(codec="binary", compression="zlib")),
+    ("binary+zstd", dict(codec="binary", compression="zstd")),
+]
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--words", type=int, nargs=2, default=[40, 200],
+                        help="Words of the user query and of the bot response.")
+    parser.add_argument("--threshold", type=int, default=512)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    start = 1700000000
+    entries = [
+        {time.strftime(TIMESTAMP_FORMAT, time.gmtime(start + 60 * turn)): {
+            "user_query": sentence(rng, args.words[0]),
+            "bot_response": sentence(rng, args.words[1])}}
+        for turn in range(args.turns)
+    ]
+
+    print(f"{args.turns} turns, {args.words[0]} + {args.words[1]} words per turn")
+    print(f"{'codec':<14} {'KiB':>10} {'bytes/turn':>11} {'encode ms':>10} {'decode ms':>10}")
+    for name, kwargs in CODECS:
+        try:
+            codec = HistoryCodec(compression_threshold=args.threshold, **kwargs)
+        except ImportError as error:
+            print(f"{name:<14} skipped: {error}")
+            continue
+
+        started = time.perf_counter()
+        # Redis returns bytes, whatever was stored
+        items = [codec.encode(entry) for entry in entries]
+        items = [item.encode("utf-8") if isinstance(item, str) else item for item in items]
+        encode_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        decoded = [codec.decode(item) for item in items]
+        decode_ms = (time.perf_counter() - started) * 1000
+        assert decoded == entries
+
+        size = sum(len(item) for item in items)
+        print(f"{name:<14} {size / 1024:>10.1f} {size / len(items):>11.0f} {encode_ms:>10.1f} {decode_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure how long importing the package and its lightweight entry points takes in a fresh interpreter, and check
+that they don't load llama_index, openai, tiktoken or redis before they are needed.
+
+Exits with status 1 if importing the bare package takes longer than `--threshold` seconds or loads a heavy
+dependency, so it can guard startup time in CI.
+
+Run from the repository root with the package installed (pip install -e .).
+
+Usage:
+    python benchmarks/bench_import.py [--runs 5] [--threshold 0.2]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("llama_index", "openai", "tiktoken", "redis", "redis_chatgpt")
+
+# Statement -> heavy modules it may load
+STATEMENTS = {
+    "import chatgpt_long_term_memory": (),
+    "from chatgpt_long_term_memory.memory import ChatMemoryConfig": (),
+    "from chatgpt_long_term_memory.openai_engine import OpenAIChatConfig": (),
+    "from chatgpt_long_term_memory.openai_engine.token_counter import TokenCounter": ("tiktoken",),
+    "from chatgpt_long_term_memory.memory import ChatMemory": ("redis", "redis_chatgpt"),
+    "from chatgpt_long_term_memory import ChatbotClient": HEAVY_MODULES,
+}
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def time_import(statement):
+    output = subprocess.run([sys.executable, "-c", SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)],
+                            check=True, capture_output=True, text=True).stdout
+    elapsed, loaded = json.loads(output.strip().splitlines()[-1])
+    return elapsed, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Maximum median seconds of `import chatgpt_long_term_memory`.")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'statement':<80} {'median ms':>10} {'max ms':>10}  heavy modules loaded")
+    for statement, allowed in STATEMENTS.items():
+        times, loaded = [], set()
+        for _ in range(args.runs):
+            elapsed, modules = time_import(statement)
+            times.append(elapsed)
+            loaded.update(modules)
+        median = statistics.median(times)
+        print(f"{statement:<80} {median * 1000:>10.1f} {max(times) * 1000:>10.1f}  "
+              f"{', '.join(sorted(loaded)) or '-'}")
+
+        unexpected = loaded - set(allowed)
+        if unexpected:
+            failures.append(f"'{statement}' loaded {', '.join(sorted(unexpected))}")
+        if statement == "import chatgpt_long_term_memory" and median > args.threshold:
+            failures.append(f"'{statement}' took {median:.3f}s, over the {args.threshold}s threshold")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
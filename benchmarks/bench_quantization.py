@@ -0,0 +1,73 @@
+"""
+Compare recall, query latency, scanned and stored memory of NumpyVectorStore quantization modes against exact float32 search.
+
+Embeddings are drawn around a few hundred random centers so neighbours are meaningful, as with real text embeddings.
+
+Run from the repository root with the package installed (pip install -e .).
+
+Usage:
+    python benchmarks/bench_quantization.py [--dim 1536] [--size 20000] [--rerank-factor 1]
+"""
+import argparse
+import time
+
+import numpy as np
+from llama_index.schema import TextNode
+from llama_index.vector_stores.types import NodeWithEmbedding, VectorStoreQuery
+
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import (
+    QUANTIZATIONS, NumpyVectorStore)
+
+
+def clustered(rng, size, dim, clusters=256):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centers[labels] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+
+
+def search(store, queries, top_k):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(store.query(VectorStoreQuery(
+            query_embedding=query.tolist(), similarity_top_k=top_k)).ids)
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--rerank-factor", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = clustered(rng, args.size, args.dim)
+    queries = clustered(rng, args.queries, args.dim)
+    results = [
+        NodeWithEmbedding(node=TextNode(text="", id_=f"node_{i}"),
+                          embedding=embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+
+    print(f"{'mode':>8} {'recall@k':>9} {'query ms':>9} {'scan MB':>8} {'stored MB':>10} {'savings':>8}")
+    exact = None
+    for quantization in QUANTIZATIONS:
+        store = NumpyVectorStore(quantization=quantization,
+                                 rerank_factor=args.rerank_factor)
+        store.add(results)
+        ids, latency = search(store, queries, args.top_k)
+        if exact is None:
+            exact = ids
+        recall = np.mean([len(set(found) & set(expected)) / len(expected)
+                          for found, expected in zip(ids, exact)])
+        stats = store.memory_stats()
+        print(f"{quantization:>8} {recall:>9.3f} {latency:>9.2f} "
+              f"{stats['scan_bytes'] / 2 ** 20:>8.1f} {stats['stored_bytes'] / 2 ** 20:>10.1f} "
+              f"{stats['savings']:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare counting the tokens of a growing chat prompt by re-encoding it on every turn with the cached, segment-wise
+count of TokenCounter.template_token_counter.
+
+Every turn formats the chatbot prompt with the whole history so far, as OpenAIChatBot.chat does.
+
+Run from the repository root with the package installed (pip install -e .).
+
+Usage:
+    python benchmarks/bench_token_counter.py [--turns 200] [--words 60]
+"""
+import argparse
+import random
+import time
+
+from chatgpt_long_term_memory.openai_engine.config import (OpenAIChatConfig,
+                                                           TokenCounterConfig)
+from chatgpt_long_term_memory.openai_engine.token_counter import TokenCounter
+
+WORDS = ("memory context history user assistant answer question summary index vector redis token model "
+         "prompt chunk store cache query embedding document retrieval latency budget window turn").split()
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--words", type=int, default=60)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    template = OpenAIChatConfig().prompt
+    counter = TokenCounter(token_counter_config=TokenCounterConfig())
+    turns = [(sentence(rng, args.words // 3), sentence(rng, args.words)) for _ in range(args.turns)]
+
+    full_s = cached_s = 0.0
+    overcount = 0
+    history = []
+    for question, answer in turns:
+        start = time.perf_counter()
+        exact = len(counter.tt_encoding.encode(template.format("\n".join(history), question)))
+        full_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        counted = counter.template_token_counter(template, history, question)
+        cached_s += time.perf_counter() - start
+
+        assert counted >= exact, "The segment-wise count is below the exact count!"
+        overcount = max(overcount, counted - exact)
+        history.append(f"USER: {question}, ANSWER: {answer}")
+
+    print(f"{args.turns} turns, final prompt {exact} tokens")
+    print(f"{'method':>12} {'ms/turn':>9}")
+    print(f"{'re-encode':>12} {full_s / args.turns * 1000:>9.3f}")
+    print(f"{'cached':>12} {cached_s / args.turns * 1000:>9.3f}")
+    print(f"speedup {full_s / cached_s:.1f}x, largest overcount {overcount} tokens")
+
+
+if __name__ == "__main__":
+    main()
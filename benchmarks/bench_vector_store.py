@@ -0,0 +1,61 @@
+"""
+Compare query latency of llama_index's SimpleVectorStore and NumpyVectorStore as the number of stored nodes grows.
+
+Run from the repository root with the package installed (pip install -e .).
+
+Usage:
+    python benchmarks/bench_vector_store.py [--dim 1536] [--top-k 7] [--sizes 100 1000 10000 50000]
+"""
+import argparse
+import time
+
+import numpy as np
+from llama_index.schema import TextNode
+from llama_index.vector_stores import SimpleVectorStore
+from llama_index.vector_stores.types import NodeWithEmbedding, VectorStoreQuery
+
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import \
+    NumpyVectorStore
+
+
+def build(store, embeddings):
+    results = [
+        NodeWithEmbedding(node=TextNode(text="", id_=f"node_{i}"),
+                          embedding=embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+    store.add(results)
+    return store
+
+
+def time_queries(store, queries, top_k):
+    start = time.perf_counter()
+    for query in queries:
+        store.query(VectorStoreQuery(
+            query_embedding=query.tolist(), similarity_top_k=top_k))
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 10000, 50000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'nodes':>8} {'simple ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim)).astype(np.float32)
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        simple = time_queries(build(SimpleVectorStore(), embeddings),
+                              queries, args.top_k)
+        numpy_ms = time_queries(build(NumpyVectorStore(), embeddings),
+                                queries, args.top_k)
+        print(f"{size:>8} {simple:>10.2f} {numpy_ms:>10.2f} {simple / numpy_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,43 @@
-from chatgpt_long_term_memory.conversation.chatgpt_chatbot_client import \
-    ChatbotClient
-from chatgpt_long_term_memory.conversation.chatgpt_index_client import \
-    ChatGPTClient
-from chatgpt_long_term_memory.llama_index_helpers import DocIndexer, Retrievers
-from chatgpt_long_term_memory.llama_index_helpers.config import (
-    IndexConfig, RetrieversConfig)
-from chatgpt_long_term_memory.memory import ChatMemory
-from chatgpt_long_term_memory.memory.chat_memory import ChatMemoryConfig
-from chatgpt_long_term_memory.openai_engine import (OpenAIChatBot,
-                                                    OpenAIChatConfig,
-                                                    TokenCounterConfig,
-                                                    retry_on_openai_errors)
+from typing import TYPE_CHECKING
+
+from chatgpt_long_term_memory._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from chatgpt_long_term_memory.conversation.chatgpt_chatbot_client import \
+        ChatbotClient
+    from chatgpt_long_term_memory.conversation.chatgpt_index_client import \
+        ChatGPTClient
+    from chatgpt_long_term_memory.llama_index_helpers.config import (
+        IndexConfig, RetrieversConfig)
+    from chatgpt_long_term_memory.llama_index_helpers.index_engine import \
+        DocIndexer
+    from chatgpt_long_term_memory.llama_index_helpers.retrievers_engine import \
+        Retrievers
+    from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
+    from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+    from chatgpt_long_term_memory.openai_engine.config import (
+        OpenAIChatConfig, TokenCounterConfig)
+    from chatgpt_long_term_memory.openai_engine.error_handler import \
+        retry_on_openai_errors
+    from chatgpt_long_term_memory.openai_engine.openai_chatbot import \
+        OpenAIChatBot
+
+# Public names are imported on first access, so importing the package doesn't load llama_index,
+# openai, tiktoken or redis until they are needed
+_EXPORTS = {
+    "ChatbotClient": "chatgpt_long_term_memory.conversation.chatgpt_chatbot_client",
+    "ChatGPTClient": "chatgpt_long_term_memory.conversation.chatgpt_index_client",
+    "DocIndexer": "chatgpt_long_term_memory.llama_index_helpers.index_engine",
+    "Retrievers": "chatgpt_long_term_memory.llama_index_helpers.retrievers_engine",
+    "IndexConfig": "chatgpt_long_term_memory.llama_index_helpers.config",
+    "RetrieversConfig": "chatgpt_long_term_memory.llama_index_helpers.config",
+    "ChatMemory": "chatgpt_long_term_memory.memory.chat_memory",
+    "ChatMemoryConfig": "chatgpt_long_term_memory.memory.config",
+    "OpenAIChatBot": "chatgpt_long_term_memory.openai_engine.openai_chatbot",
+    "OpenAIChatConfig": "chatgpt_long_term_memory.openai_engine.config",
+    "TokenCounterConfig": "chatgpt_long_term_memory.openai_engine.config",
+    "retry_on_openai_errors": "chatgpt_long_term_memory.openai_engine.error_handler"
+}
 
 __all__ = [
     "DocIndexer",
@@ -26,3 +53,5 @@ __all__ = [
     "ChatGPTClient",
     "ChatbotClient"
 ]
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
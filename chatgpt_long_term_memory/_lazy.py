@@ -0,0 +1,32 @@
+import importlib
+
+
+def lazy_exports(package, exports):
+    """
+    Build the module `__getattr__` and `__dir__` of a package whose public names are imported on first use.
+
+    Importing the package then stays cheap: llama_index, openai, tiktoken and redis are only loaded once a
+    name that needs them is accessed.
+
+    Args:
+        package (str): `__name__` of the package.
+        exports (dict): Public name -> name of the module defining it.
+
+    Returns:
+        tuple: The `__getattr__` and `__dir__` functions of the package.
+    """
+    namespace = importlib.import_module(package).__dict__
+
+    def __getattr__(name):
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f"module '{package}' has no attribute '{name}'")
+        value = getattr(importlib.import_module(module), name)
+        # Later lookups find the name directly
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(exports))
+
+    return __getattr__, __dir__
@@ -1,9 +1,26 @@
-from chatgpt_long_term_memory.conversation.chatgpt_chatbot_client import \
-    ChatbotClient
-from chatgpt_long_term_memory.conversation.chatgpt_index_client import \
-    ChatGPTClient
+from typing import TYPE_CHECKING
+
+from chatgpt_long_term_memory._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from chatgpt_long_term_memory.conversation.batch import ConverseManyError
+    from chatgpt_long_term_memory.conversation.chatgpt_chatbot_client import \
+        ChatbotClient
+    from chatgpt_long_term_memory.conversation.chatgpt_index_client import \
+        ChatGPTClient
+
+# Public names are imported on first access, so importing the package doesn't load llama_index,
+# openai, tiktoken or redis until they are needed
+_EXPORTS = {
+    "ChatbotClient": "chatgpt_long_term_memory.conversation.chatgpt_chatbot_client",
+    "ChatGPTClient": "chatgpt_long_term_memory.conversation.chatgpt_index_client",
+    "ConverseManyError": "chatgpt_long_term_memory.conversation.batch"
+}
 
 __all__ = [
     "ChatGPTClient",
-    "ChatbotClient"
+    "ChatbotClient",
+    "ConverseManyError"
 ]
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,148 @@
+import atexit
+import logging
+import queue
+import threading
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a worker's queue on shutdown
+_STOP = object()
+
+
+class BackgroundIndexer:
+    """
+    Write-behind indexer that adds new conversation turns to the users' indexes outside the request path.
+
+    Each user is pinned to one worker thread by hashing the user id, so a user's turns are indexed in the order
+    they were submitted. A worker drains up to `batch_size` queued turns at a time and hands all turns of a
+    user to `index_fn` in one call, which lets them be embedded in one request and the index be persisted once
+    per batch instead of once per turn.
+    Queues are bounded: `submit` blocks once a worker has `max_queue_size` turns waiting. Pending turns are
+    flushed when the interpreter exits.
+
+    Args:
+        index_fn (callable): Called as `index_fn(user_id, index, conversations)` with the list of
+                             (question, response) tuples to add to the user's index.
+        num_workers (int): Number of worker threads. Defaults to 4.
+        max_queue_size (int): Maximum number of turns waiting per worker. Defaults to 1000.
+        batch_size (int): Maximum number of turns a worker takes from its queue at once. Defaults to 32.
+
+    """
+
+    def __init__(self, index_fn, num_workers: int = 4, max_queue_size: int = 1000, batch_size: int = 32):
+        assert num_workers > 0, "num_workers must be at least 1!"
+        self.index_fn = index_fn
+        self.batch_size = batch_size
+        self.submitted = 0
+        self.indexed = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._queues = [queue.Queue(maxsize=max_queue_size) for _ in range(num_workers)]
+        self._workers = [
+            threading.Thread(target=self._run, args=(q,), daemon=True,
+                             name=f"background-indexer-{i}")
+            for i, q in enumerate(self._queues)
+        ]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, index, conversation, timeout=None):
+        """
+        Queue a conversation turn for indexing.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            index (VectorStoreIndex): The user's index.
+            conversation (tuple): The user's question and the bot's response.
+            timeout (float, optional): Seconds to wait for room in a full queue. Defaults to None (wait forever).
+        """
+        assert not self._closed, "BackgroundIndexer is closed!"
+        worker_queue = self._queues[self._shard(user_id)]
+        worker_queue.put((user_id, index, conversation), timeout=timeout)
+        with self._stats_lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, worker_queue.qsize())
+
+    def flush(self):
+        """
+        Block until every turn submitted so far has been indexed.
+        """
+        for worker_queue in self._queues:
+            worker_queue.join()
+
+    def close(self):
+        """
+        Index the pending turns and stop the workers. Called automatically at interpreter exit.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for worker_queue in self._queues:
+            worker_queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+        atexit.unregister(self.close)
+
+    def stats(self):
+        """
+        Return the indexer counters.
+
+        Returns:
+            dict: Current and maximum queue depth, depth per worker, and numbers of submitted, indexed and
+                  failed turns and of index batches.
+        """
+        depths = [worker_queue.qsize() for worker_queue in self._queues]
+        with self._stats_lock:
+            return {
+                "queue_depth": sum(depths),
+                "worker_queue_depths": depths,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "indexed": self.indexed,
+                "failed": self.failed,
+                "batches": self.batches
+            }
+
+    def _shard(self, user_id):
+        # Stable across processes, unlike hash() of a str
+        return zlib.crc32(str(user_id).encode("utf-8")) % len(self._queues)
+
+    def _run(self, worker_queue):
+        stopping = False
+        while not stopping:
+            items = [worker_queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(worker_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(item is _STOP for item in items)
+            jobs = [item for item in items if item is not _STOP]
+
+            # Group by user, keeping each user's turns in submission order
+            by_user = OrderedDict()
+            for user_id, index, conversation in jobs:
+                by_user.setdefault(user_id, (index, []))[1].append(conversation)
+            for user_id, (index, conversations) in by_user.items():
+                self._index(user_id, index, conversations)
+
+            for _ in items:
+                worker_queue.task_done()
+
+    def _index(self, user_id, index, conversations):
+        try:
+            self.index_fn(user_id, index, conversations)
+        except Exception:
+            logger.exception("Indexing %d turns of user %s failed", len(conversations), user_id)
+            with self._stats_lock:
+                self.failed += len(conversations)
+            return
+        with self._stats_lock:
+            self.indexed += len(conversations)
+            self.batches += 1
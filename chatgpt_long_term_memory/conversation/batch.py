@@ -0,0 +1,88 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ConverseManyError(Exception):
+    """
+    Raised by `converse_many` when some items of a batch failed, after the others were answered, stored and
+    indexed.
+
+    Attributes:
+        results (list): Per item, in input order, the (index, response) tuple or the exception that failed it.
+        errors (dict): Position of each failed item -> its exception.
+
+    """
+
+    def __init__(self, results):
+        self.results = results
+        self.errors = {position: result for position, result in enumerate(results)
+                       if isinstance(result, BaseException)}
+        super().__init__(f"{len(self.errors)} of {len(results)} conversations failed, "
+                         f"first error: {next(iter(self.errors.values()))!r}")
+
+
+def map_settled(fn, max_workers, *iterables):
+    """
+    Call a function on every item concurrently, collecting what each call returned or raised.
+
+    Args:
+        fn (callable): The function, called with one element of each iterable.
+        max_workers (int): Maximum number of concurrent calls.
+        *iterables: The arguments of the calls.
+
+    Returns:
+        list: The result of each call, or the exception it raised, in input order.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fn, *args) for args in zip(*iterables)]
+    return [future.exception() or future.result() for future in futures]
+
+
+def store_answers(client, items, indexes, responses):
+    """
+    Store the answered turns of a batch in the chat memory and index them, each user's turns at once.
+
+    A failure only fails the items it concerns: a turn that couldn't be stored, or all of a user's turns if
+    indexing them failed, in which case they are in the chat memory already.
+
+    Args:
+        client: The conversation client.
+        items (list): List of (question, user_id) tuples.
+        indexes (dict): The index of each user.
+        responses (list): The response of each item, or the exception its completion raised.
+
+    Returns:
+        list: A (index, response) tuple per item, or the exception that failed it, in the order of `items`.
+    """
+    results = list(responses)
+    conversations = {}
+    for position, ((question, user_id), response) in enumerate(zip(items, responses)):
+        if isinstance(response, BaseException):
+            logger.warning("Answering item %d of user %s failed: %r", position, user_id, response)
+            continue
+        try:
+            client.add_conversation(user_id, (question, response))
+        except Exception as error:
+            logger.exception("Storing item %d of user %s failed", position, user_id)
+            results[position] = error
+            continue
+        conversations.setdefault(user_id, []).append((position, (question, response)))
+
+    for user_id, user_items in conversations.items():
+        index = indexes[user_id]
+        try:
+            if client.background_indexer:
+                for _, conversation in user_items:
+                    client.background_indexer.submit(user_id, index, conversation)
+            else:
+                client.index_conversations(user_id, index, [conversation for _, conversation in user_items])
+        except Exception as error:
+            logger.exception("Indexing %d turns of user %s failed", len(user_items), user_id)
+            for position, _ in user_items:
+                results[position] = error
+            continue
+        for position, (_, response) in user_items:
+            results[position] = (index, response)
+    return results
@@ -0,0 +1,28 @@
+import inspect
+
+
+def callback_args(callback, user_id, index, latest):
+    """
+    Return the arguments to call a converse callback with.
+
+    Every callback gets the user id and the index. A callback taking a third argument also gets the newest
+    conversations, read back with the append of the turn, so it doesn't need another Redis round trip.
+
+    Args:
+        callback (function): The callback passed to `converse_callback`.
+        user_id (str): Unique identifier for the user.
+        index: The user's index.
+        latest (list): The newest conversations of the user, oldest first.
+
+    Returns:
+        tuple: The positional arguments of the callback.
+    """
+    try:
+        parameters = inspect.signature(callback).parameters.values()
+    except (TypeError, ValueError):
+        return user_id, index
+    positional = [parameter for parameter in parameters
+                  if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)]
+    if len(positional) >= 3 or any(parameter.kind == parameter.VAR_POSITIONAL for parameter in parameters):
+        return user_id, index, latest
+    return user_id, index
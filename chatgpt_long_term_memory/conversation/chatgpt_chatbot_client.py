@@ -1,84 +1,149 @@
 # Import necessary classes from modules
+from chatgpt_long_term_memory.conversation.conversation_client import \
+    ConversationClient
 from chatgpt_long_term_memory.llama_index_helpers.config import (
     IndexConfig, RetrieversConfig)
-from chatgpt_long_term_memory.llama_index_helpers.index_engine import \
-    DocIndexer
-from chatgpt_long_term_memory.llama_index_helpers.retrievers_engine import \
-    Retrievers
-from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
 from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
 from chatgpt_long_term_memory.openai_engine.config import OpenAIChatConfig
 from chatgpt_long_term_memory.openai_engine.openai_chatbot import OpenAIChatBot
 
 
-class ChatbotClient(DocIndexer, Retrievers, ChatMemory, OpenAIChatBot):
+class ChatbotClient(ConversationClient, OpenAIChatBot):
     def __init__(self, doc_indexer_config: IndexConfig,
                  retrievers_config: RetrieversConfig,
                  chat_memory_config: ChatMemoryConfig,
-                 openai_chatbot_config: OpenAIChatConfig):
+                 openai_chatbot_config: OpenAIChatConfig,
+                 redis_client=None, async_redis_client=None):
 
-        super().__init__(doc_config=doc_indexer_config, retrieve_config=retrievers_config,
-                         memory_config=chat_memory_config, openai_chatbot_config=openai_chatbot_config)
-    def converse_callback(self, question: str, user_id: str, callback=None):
+        super().__init__(doc_indexer_config, retrievers_config, chat_memory_config,
+                         openai_chatbot_config=openai_chatbot_config,
+                         redis_client=redis_client, async_redis_client=async_redis_client)
+
+    def _generate_answer(self, question, user_id, retrieved_nodes, shared=False):
+        # A shared answer must not draw on the user's rolling summary
+        return self.chat(question, retrieved_nodes, user_id=None if shared else user_id)
+
+    async def _agenerate_answer(self, question, user_id, retrieved_nodes, shared=False):
+        return await self.achat(question, retrieved_nodes, user_id=None if shared else user_id)
+
+    def _stream_answer(self, question, user_id, retrieved_nodes, started):
+        return self.chat_stream(question, retrieved_nodes, user_id=user_id, started=started)
+
+    def _astream_answer(self, question, user_id, retrieved_nodes, started):
+        return self.achat_stream(question, retrieved_nodes, user_id=user_id, started=started)
+
+    def history_summary(self, history, user_id=None, user_input=""):
         """
-        This method performs a conversation with the ChatGPT client.
+        Summarize the user's conversation history incrementally when the context overflows.
+
+        The summary is stored in Redis with the number of conversations it covers. When nothing was added
+        since, it is served as is; otherwise only the previous summary and the new conversations are
+        summarized, which usually takes a single request. The retrieved memories and knowledge base passages
+        are kept beside it: as they are if they fit in the prompt, else summarized.
 
         Args:
-            question (str): The user's question or input.
-            user_id (str): Unique identifier for the user.
-            callback (function, optional): A function to be called after the conversation. Defaults to None.
+            history (str): The joined retrieved nodes, summarized as is when no user is given.
+            user_id (str, optional): Unique identifier for the user. Defaults to None.
+            user_input (str, optional): The user's query, which shares the prompt with the summary. Defaults to "".
 
         Returns:
-            tuple: A tuple containing the index and the response to the user's input.
+            str: The summary used as the prompt's history.
         """
-        # Load the index associated with the user
-        index = self.load_index(user_id)
-
-        # Query the index to get a response for the user's question
-        nodes = self.get_nodes(question=question, index=index)
-
-        query_response = self.chat(question, nodes)
+        if user_id is None:
+            return super().history_summary(history)
+
+        stored = self.get_summary(user_id) or {"watermark": 0, "summary": ""}
+        new_turns = self.get_since(user_id, stored["watermark"])
+        if not new_turns and not stored["summary"]:
+            # No stored conversations yet, summarize what was retrieved
+            return super().history_summary(history)
+
+        summary = stored["summary"]
+        if new_turns:
+            summary = self.create_context.summarize_memories(
+                self._summary_input(summary, new_turns), self.token_counter.tt_encoding)
+            self.set_summary(user_id, stored["watermark"] + len(new_turns), summary)
+
+        room = self._retrieved_room(summary, user_input)
+        if history and self.token_counter.prompt_token_counter(history) > room:
+            history = super().history_summary(history)
+        return self._pack_retrieved(summary, history, room)
+
+    async def ahistory_summary(self, history, user_id=None, user_input=""):
+        """
+        Asynchronous version of `history_summary`.
 
-        # Create a conversation tuple with the user's question and the response
-        conversation = (question, query_response)
+        Args:
+            history (str): The joined retrieved nodes, summarized as is when no user is given.
+            user_id (str, optional): Unique identifier for the user. Defaults to None.
+            user_input (str, optional): The user's query. Defaults to "".
 
-        # Add the conversation to the user's chat memory
-        self.add_conversation(user_id, conversation)
+        Returns:
+            str: The summary used as the prompt's history.
+        """
+        if user_id is None:
+            return await super().ahistory_summary(history)
+
+        stored = await self.aget_summary(user_id) or {"watermark": 0, "summary": ""}
+        new_turns = await self.aget_since(user_id, stored["watermark"])
+        if not new_turns and not stored["summary"]:
+            return await super().ahistory_summary(history)
+
+        summary = stored["summary"]
+        if new_turns:
+            summary = await self.create_context.asummarize_memories(
+                self._summary_input(summary, new_turns), self.token_counter.tt_encoding)
+            await self.aset_summary(user_id, stored["watermark"] + len(new_turns), summary)
+
+        room = self._retrieved_room(summary, user_input)
+        if history and self.token_counter.prompt_token_counter(history) > room:
+            history = await super().ahistory_summary(history)
+        return self._pack_retrieved(summary, history, room)
+
+    def _retrieved_room(self, summary, user_input):
+        """
+        Count the tokens left for the retrieved nodes in a prompt holding the rolling summary and the query.
 
-        # Call the provided callback function with user_id and the updated index
-        if callback:
-            callback(user_id, index)
+        Args:
+            summary (str): The rolling summary of the user's conversations.
+            user_input (str): The user's query.
 
-        # Return the index and the response
-        return index, query_response
+        Returns:
+            int: The number of tokens left, may be zero.
+        """
+        used = self.token_counter.template_token_counter(self.prompt, summary + "\n", user_input)
+        # Same budget as _fits: the answer's tokens are reserved twice
+        return max(self.models_max_tokens[self.config.model_name] - 2 * self.max_tokens - used, 0)
 
-    def after_converse_callback(self, user_id: str, index):
+    def _pack_retrieved(self, summary, retrieved, room):
         """
-        This method updates the index for a user after a conversation.
+        Join the rolling summary and the retrieved nodes, cutting the latter down to the room left.
 
         Args:
-            user_id (str): Unique identifier for the user.
-            index: The updated index to be stored for the user.
+            summary (str): The rolling summary of the user's conversations.
+            retrieved (str): The retrieved nodes or their summary.
+            room (int): The number of tokens left for them.
+
+        Returns:
+            str: The prompt's history.
         """
-        # Update the index for the user
-        retrieved_documents = self.get(user_id)
-        self.update_index(user_id, index, retrieved_documents)
+        retrieved = self.token_counter.truncate(retrieved, room) if retrieved and room else ""
+        return f"{summary}\n{retrieved}" if retrieved else summary
 
-    def converse(self, question: str, user_id: str):
+    @staticmethod
+    def _summary_input(summary, turns):
         """
-        This method initiates a conversation with the ChatGPT client.
+        Join the previous summary and the new conversations into the text to summarize.
 
         Args:
-            question (str): The user's question or input.
-            user_id (str): Unique identifier for the user.
+            summary (str): The previous summary, may be empty.
+            turns (list): List of dictionaries with the new conversations.
 
         Returns:
-            tuple: A tuple containing the index and the response to the user's input.
+            str: The text to summarize.
         """
-        # Start the conversation by calling the converse_callback method
-        # and passing the user's question, user_id, and after_converse_callback function
-        index, query_response = self.converse_callback(
-            question, user_id, self.after_converse_callback)
-
-        # Return the index and the response
-        return index, query_response
+        lines = [summary] if summary else []
+        for turn in turns:
+            conversation = list(turn.values())[0]
+            lines.append(f"USER: {conversation['user_query']}, ANSWER: {conversation['bot_response']}")
+        return "\n".join(lines)
@@ -0,0 +1,459 @@
+# Import necessary classes from modules
+import asyncio
+import inspect
+import time
+
+from chatgpt_long_term_memory.conversation.background_indexer import \
+    BackgroundIndexer
+from chatgpt_long_term_memory.conversation.batch import (ConverseManyError,
+                                                         map_settled,
+                                                         store_answers)
+from chatgpt_long_term_memory.conversation.callbacks import callback_args
+from chatgpt_long_term_memory.llama_index_helpers.config import (
+    IndexConfig, RetrieversConfig)
+from chatgpt_long_term_memory.llama_index_helpers.index_engine import \
+    DocIndexer
+from chatgpt_long_term_memory.llama_index_helpers.retrievers_engine import \
+    Retrievers
+from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+
+
+class ConversationClient(DocIndexer, Retrievers, ChatMemory):
+    """
+    Base class of the conversation clients: retrieval, the semantic cache, the chat memory, indexing of the new
+    turns, batching, streaming and compaction.
+
+    Subclasses only choose how an answer is generated from the retrieved nodes, by implementing
+    `_generate_answer`, `_agenerate_answer`, `_stream_answer` and `_astream_answer`.
+
+    """
+
+    def __init__(self, doc_indexer_config: IndexConfig,
+                 retrievers_config: RetrieversConfig,
+                 chat_memory_config: ChatMemoryConfig,
+                 redis_client=None, async_redis_client=None, **kw):
+
+        super().__init__(doc_config=doc_indexer_config, retrieve_config=retrievers_config,
+                         memory_config=chat_memory_config, redis_client=redis_client,
+                         async_redis_client=async_redis_client, **kw)
+
+        # Without a knowledge base no answer could be shared between users
+        assert not (self.semantic_cache and self.semantic_cache.scope == "kb"
+                    and not doc_indexer_config.knowledge_base), \
+            "The 'kb' semantic cache scope needs a knowledge base!"
+
+        # Index new turns after converse returns instead of before
+        self.background_indexer = None
+        if doc_indexer_config.write_behind:
+            self.background_indexer = BackgroundIndexer(
+                self.index_conversations,
+                num_workers=doc_indexer_config.write_behind_workers,
+                max_queue_size=doc_indexer_config.write_behind_queue_size,
+                batch_size=doc_indexer_config.write_behind_batch_size
+            )
+
+    def _generate_answer(self, question, user_id, retrieved_nodes, shared=False):
+        """
+        Generate the response to a question from the retrieved nodes.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            retrieved_nodes (list): Texts of the retrieved nodes, best score first.
+            shared (bool): The response goes into a cache shared by every user, so it may only draw on the
+                           retrieved nodes. Defaults to False.
+
+        Returns:
+            str: The response.
+        """
+        raise NotImplementedError
+
+    async def _agenerate_answer(self, question, user_id, retrieved_nodes, shared=False):
+        """
+        Asynchronous version of `_generate_answer`.
+        """
+        raise NotImplementedError
+
+    def _stream_answer(self, question, user_id, retrieved_nodes, started):
+        """
+        Generate the response to a question from the retrieved nodes, piece by piece.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            retrieved_nodes (list): Texts of the retrieved nodes, best score first.
+            started (float): `time.perf_counter()` when the conversation started, for the stream metrics.
+
+        Returns:
+            generator: The response text pieces.
+        """
+        raise NotImplementedError
+
+    def _astream_answer(self, question, user_id, retrieved_nodes, started):
+        """
+        Asynchronous version of `_stream_answer`, returns an async generator.
+        """
+        raise NotImplementedError
+
+    def _shares_answers(self):
+        """
+        Check whether answers go into a semantic cache shared by every user.
+        """
+        return self.semantic_cache is not None and self.semantic_cache.scope == "kb"
+
+    def converse_callback(self, question: str, user_id: str, callback=None):
+        """
+        This method performs a conversation with the client.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            callback (function, optional): A function to be called after the conversation. Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the index and the response to the user's input.
+        """
+        # Load the index associated with the user
+        index = self.load_index(user_id)
+
+        # Query the user's index and the shared knowledge base to get a response for the user's question,
+        # unless the semantic cache already answered a similar one
+        kb_index = self.load_kb_index()
+
+        def answer(embedding):
+            nodes = self.retrieve_nodes(question, index, kb_index=kb_index, embedding=embedding)
+            shareable = self.kb_only(nodes)
+            response = self._generate_answer(
+                question, user_id, [i.node.text for i in nodes], shared=shareable and self._shares_answers())
+            return response, shareable
+
+        query_response = self.cached_answer(
+            question, user_id, index, answer,
+            version=self.kb_version(user_id) if self.semantic_cache else None)
+
+        # Create a conversation tuple with the user's question and the response
+        conversation = (question, query_response)
+
+        # Add the conversation to the user's chat memory, reading the newest turn back in the same round trip
+        latest = self.add_conversation(user_id, conversation, tail=1 if callback else 0)
+
+        # Call the provided callback function with user_id and the updated index
+        if callback:
+            callback(*callback_args(callback, user_id, index, latest))
+
+        # Return the index and the response
+        return index, query_response
+
+    def after_converse_callback(self, user_id: str, index, retrieved_documents=None):
+        """
+        This method updates the index for a user after a conversation.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            index: The updated index to be stored for the user.
+            retrieved_documents (list, optional): The newest conversation, if already read with the append.
+                                                  Defaults to None, which reads it from Redis.
+        """
+        # Update the index for the user with the newest conversation only
+        if retrieved_documents is None:
+            retrieved_documents = self.get_latest(user_id, 1)
+        self.update_index(user_id, index, retrieved_documents)
+
+    def converse(self, question: str, user_id: str, stream: bool = False):
+        """
+        This method initiates a conversation with the client.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            stream (bool): Return a generator yielding the response as it is generated instead of the response.
+                           The turn is stored in the chat memory and the index once the generator is exhausted.
+                           Defaults to False.
+
+        Returns:
+            tuple: A tuple containing the index and the response to the user's input.
+        """
+        if stream:
+            return self.converse_stream(question, user_id)
+
+        if self.background_indexer:
+            # The new turn is indexed by a background worker
+            index, query_response = self.converse_callback(question, user_id)
+            self.background_indexer.submit(user_id, index, (question, query_response))
+            return index, query_response
+
+        # Start the conversation by calling the converse_callback method
+        # and passing the user's question, user_id, and after_converse_callback function
+        index, query_response = self.converse_callback(
+            question, user_id, self.after_converse_callback)
+
+        # Return the index and the response
+        return index, query_response
+
+    def converse_many(self, items, max_workers: int = 8, return_exceptions: bool = False):
+        """
+        This method answers many questions, possibly from different users, as one batch.
+
+        All questions are embedded in one batch, the completions run concurrently in up to `max_workers`
+        threads, and each user's index is updated and persisted once with all of the user's new turns.
+        Questions of the same batch don't see each other's answers. An item whose completion, storage or
+        indexing fails doesn't fail the others: they are stored and indexed all the same.
+
+        Args:
+            items (list): List of (question, user_id) tuples.
+            max_workers (int): Maximum number of concurrent completion requests. Defaults to 8.
+            return_exceptions (bool): Return the exception of a failed item in its place instead of raising
+                                      ConverseManyError once the batch is done. Defaults to False.
+
+        Returns:
+            list: A (index, response) tuple per item, or the exception that failed it, in the order of `items`.
+
+        Raises:
+            ConverseManyError: If an item failed and `return_exceptions` is False. Its `results` hold the
+                               results of the whole batch.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        # Load every user's index once
+        indexes = {}
+        for _, user_id in items:
+            if user_id not in indexes:
+                indexes[user_id] = self.load_index(user_id)
+
+        retrieved = self.get_nodes_many(
+            [question for question, _ in items],
+            [indexes[user_id] for _, user_id in items],
+            kb_index=self.load_kb_index())
+
+        # A failed completion is returned in place of its response, the others are kept
+        responses = map_settled(
+            self._generate_answer, max_workers, [question for question, _ in items],
+            [user_id for _, user_id in items], retrieved)
+
+        # Store and index the answered turns, grouped by user in input order
+        results = store_answers(self, items, indexes, responses)
+        if not return_exceptions and any(isinstance(result, BaseException) for result in results):
+            raise ConverseManyError(results)
+        return results
+
+    async def aconverse_callback(self, question: str, user_id: str, callback=None):
+        """
+        This method performs a conversation with the client without blocking the event loop.
+
+        Storage reads and writes run in worker threads, OpenAI and Redis calls are awaited.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            callback (function, optional): A function or coroutine function to be called after the conversation.
+                                           Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the index and the response to the user's input.
+        """
+        # Load the index associated with the user
+        index = await self.aload_index(user_id)
+
+        # Query the user's index and the shared knowledge base to get a response for the user's question,
+        # unless the semantic cache already answered a similar one
+        kb_index = await self.aload_kb_index()
+
+        async def answer(embedding):
+            nodes = await self.aretrieve_nodes(question, index, kb_index=kb_index, embedding=embedding)
+            shareable = self.kb_only(nodes)
+            response = await self._agenerate_answer(
+                question, user_id, [i.node.text for i in nodes], shared=shareable and self._shares_answers())
+            return response, shareable
+
+        query_response = await self.acached_answer(
+            question, user_id, index, answer,
+            version=self.kb_version(user_id) if self.semantic_cache else None)
+
+        # Add the conversation to the user's chat memory, reading the newest turn back in the same round trip
+        latest = await self.aadd_conversation(
+            user_id, (question, query_response), tail=1 if callback else 0)
+
+        # Call the provided callback function with user_id and the updated index
+        if callback:
+            result = callback(*callback_args(callback, user_id, index, latest))
+            if inspect.isawaitable(result):
+                await result
+
+        # Return the index and the response
+        return index, query_response
+
+    async def aafter_converse_callback(self, user_id: str, index, retrieved_documents=None):
+        """
+        This method asynchronously updates the index for a user after a conversation.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            index: The updated index to be stored for the user.
+            retrieved_documents (list, optional): The newest conversation, if already read with the append.
+                                                  Defaults to None, which reads it from Redis.
+        """
+        if retrieved_documents is None:
+            retrieved_documents = await self.aget_latest(user_id, 1)
+        await self.aupdate_index(user_id, index, retrieved_documents)
+
+    async def aconverse(self, question: str, user_id: str, stream: bool = False):
+        """
+        This method is the asyncio version of `converse`, so one event loop can serve many users at once.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            stream (bool): Return an async generator yielding the response as it is generated instead of the
+                           response. Defaults to False.
+
+        Returns:
+            tuple: A tuple containing the index and the response to the user's input.
+        """
+        if stream:
+            return await self.aconverse_stream(question, user_id)
+
+        if self.background_indexer:
+            index, query_response = await self.aconverse_callback(question, user_id)
+            # A full queue blocks, keep that off the event loop
+            await asyncio.to_thread(
+                self.background_indexer.submit, user_id, index, (question, query_response))
+            return index, query_response
+
+        index, query_response = await self.aconverse_callback(
+            question, user_id, self.aafter_converse_callback)
+
+        # Return the index and the response
+        return index, query_response
+
+    def converse_stream(self, question: str, user_id: str):
+        """
+        This method starts a conversation whose response is streamed as the model generates it.
+
+        The index is loaded and queried right away, the completion starts when the generator is first
+        iterated. The time to first token, measured from this call, is recorded in `stream_metrics`.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            tuple: A tuple containing the index and a generator of response text pieces.
+        """
+        started = time.perf_counter()
+        index = self.load_index(user_id)
+        nodes = self.get_nodes(
+            question=question, index=index, kb_index=self.load_kb_index())
+        return index, self._store_stream(
+            question, user_id, index, self._stream_answer(question, user_id, nodes, started))
+
+    async def aconverse_stream(self, question: str, user_id: str):
+        """
+        This method is the asyncio version of `converse_stream`.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            tuple: A tuple containing the index and an async generator of response text pieces.
+        """
+        started = time.perf_counter()
+        index = await self.aload_index(user_id)
+        nodes = await self.aget_nodes(
+            question=question, index=index, kb_index=await self.aload_kb_index())
+        return index, self._astore_stream(
+            question, user_id, index, self._astream_answer(question, user_id, nodes, started))
+
+    def _store_stream(self, question, user_id, index, pieces):
+        """
+        Pass the response pieces through and store the assembled turn once the stream ends.
+
+        A stream that is abandoned before its end isn't stored.
+        """
+        parts = []
+        for piece in pieces:
+            parts.append(piece)
+            yield piece
+
+        conversation = (question, "".join(parts))
+        self.add_conversation(user_id, conversation)
+        if self.background_indexer:
+            self.background_indexer.submit(user_id, index, conversation)
+        else:
+            self.index_conversations(user_id, index, [conversation])
+
+    async def _astore_stream(self, question, user_id, index, pieces):
+        """
+        Asynchronous version of `_store_stream`.
+        """
+        parts = []
+        async for piece in pieces:
+            parts.append(piece)
+            yield piece
+
+        conversation = (question, "".join(parts))
+        await self.aadd_conversation(user_id, conversation)
+        if self.background_indexer:
+            await asyncio.to_thread(self.background_indexer.submit, user_id, index, conversation)
+        else:
+            await asyncio.to_thread(self.index_conversations, user_id, index, [conversation])
+
+    def compact_memory(self, user_id: str, now: float = None):
+        """
+        This method applies the retention policies to one user's memory.
+
+        An index idle for longer than `index_idle_ttl` is deleted. Otherwise the raw history in Redis is trimmed
+        to `history_max_turns`/`history_max_age` and the indexed conversations beyond `index_max_turns`/
+        `index_max_age` are folded into the user's summary node. Meant to run periodically, e.g. from a cron job.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            now (float, optional): Current time as a Unix timestamp. Defaults to the current time.
+
+        Returns:
+            dict: Number of trimmed history entries, number of folded conversations and whether the index
+                  was deleted.
+        """
+        # Queued turns would otherwise be indexed after the idle check, with an index it may delete
+        self.flush_index_updates()
+        result = {"history_trimmed": self.trim_history(user_id, now=now),
+                  "index_folded": 0,
+                  "index_expired": self.expire_idle_index(user_id, now=now)}
+        if not result["index_expired"]:
+            result["index_folded"] = self.fold_conversations(
+                user_id,
+                lambda text: self.create_context.summarize_memories(text, self.token_counter.tt_encoding),
+                now=now)
+        return result
+
+    def compact_memories(self, user_ids=None, now: float = None):
+        """
+        This method applies the retention policies to many users' memories.
+
+        Args:
+            user_ids (list, optional): The users to compact. Defaults to None, every user with a stored index.
+            now (float, optional): Current time as a Unix timestamp. Defaults to the current time.
+
+        Returns:
+            dict: The result of `compact_memory` of every user.
+        """
+        if user_ids is None:
+            user_ids = self.stored_user_ids()
+        return {user_id: self.compact_memory(user_id, now=now) for user_id in user_ids}
+
+    def flush_index_updates(self):
+        """
+        Block until the turns queued for background indexing are in the users' indexes.
+        """
+        if self.background_indexer:
+            self.background_indexer.flush()
+
+    def close(self):
+        """
+        Index the queued turns and stop the background indexer.
+        """
+        if self.background_indexer:
+            self.background_indexer.close()
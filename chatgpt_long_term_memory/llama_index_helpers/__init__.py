@@ -1,9 +1,23 @@
-from chatgpt_long_term_memory.llama_index_helpers.config import (
-    IndexConfig, RetrieversConfig)
-from chatgpt_long_term_memory.llama_index_helpers.index_engine import \
-    DocIndexer
-from chatgpt_long_term_memory.llama_index_helpers.retrievers_engine import \
-    Retrievers
+from typing import TYPE_CHECKING
+
+from chatgpt_long_term_memory._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from chatgpt_long_term_memory.llama_index_helpers.config import (
+        IndexConfig, RetrieversConfig)
+    from chatgpt_long_term_memory.llama_index_helpers.index_engine import \
+        DocIndexer
+    from chatgpt_long_term_memory.llama_index_helpers.retrievers_engine import \
+        Retrievers
+
+# Public names are imported on first access, so importing the package doesn't load llama_index,
+# openai, tiktoken or redis until they are needed
+_EXPORTS = {
+    "IndexConfig": "chatgpt_long_term_memory.llama_index_helpers.config",
+    "RetrieversConfig": "chatgpt_long_term_memory.llama_index_helpers.config",
+    "DocIndexer": "chatgpt_long_term_memory.llama_index_helpers.index_engine",
+    "Retrievers": "chatgpt_long_term_memory.llama_index_helpers.retrievers_engine"
+}
 
 __all__ = [
     "DocIndexer",
@@ -11,3 +25,5 @@ __all__ = [
     "RetrieversConfig",
     "Retrievers"
 ]
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,186 @@
+import threading
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+
+from llama_index.callbacks.base import BASE_TRACE_EVENT, CallbackManager
+from llama_index.schema import MetadataMode
+from llama_index.vector_stores.types import NodeWithEmbedding
+
+from chatgpt_long_term_memory.llama_index_helpers.embedding_cache import \
+    batch_text_embeddings
+
+
+class ReadWriteLock:
+    """
+    Lock letting any number of readers in at once, or one writer alone.
+
+    Waiting writers go first, so a steady flow of queries can't starve index updates. The writer may take
+    the lock again, for reading or writing, while it holds it.
+
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        self._writer = None
+        self._writes = 0
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writes += 1
+            else:
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                if self._writer == me:
+                    self._writes -= 1
+                else:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+                self._waiting_writers -= 1
+                self._writer = me
+            self._writes += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writes -= 1
+                if not self._writes:
+                    self._writer = None
+                    self._condition.notify_all()
+
+
+class ThreadSafeCallbackManager(CallbackManager):
+    """
+    CallbackManager keeping its trace stacks per thread.
+
+    llama_index pushes and pops the events of a query or a node parsing on stacks held by the callback manager
+    of the service context, which every index shares. A write-behind indexer parsing nodes while another thread
+    queries would pop the other thread's events, and eventually the stack's base event.
+
+    """
+
+    def __init__(self, handlers):
+        self._local = threading.local()
+        super().__init__(handlers)
+
+    def _trace(self):
+        local = self._local
+        if not hasattr(local, "event_stack"):
+            local.trace_map = defaultdict(list)
+            local.event_stack = [BASE_TRACE_EVENT]
+            local.id_stack = []
+        return local
+
+    @property
+    def _trace_map(self):
+        return self._trace().trace_map
+
+    @_trace_map.setter
+    def _trace_map(self, value):
+        self._trace().trace_map = value
+
+    @property
+    def _trace_event_stack(self):
+        return self._trace().event_stack
+
+    @_trace_event_stack.setter
+    def _trace_event_stack(self, value):
+        self._trace().event_stack = value
+
+    @property
+    def _trace_id_stack(self):
+        return self._trace().id_stack
+
+    @_trace_id_stack.setter
+    def _trace_id_stack(self, value):
+        self._trace().id_stack = value
+
+
+# One lock per index object, dropped with the index
+_index_locks = weakref.WeakKeyDictionary()
+_index_locks_guard = threading.Lock()
+
+
+def index_lock(index):
+    """
+    Return the read/write lock of an index.
+
+    llama_index adds a node to the vector store before the index structure and the docstore, and deletes it in
+    the same order, so a query running during an update can get ids it can't resolve. Queries hold the read
+    lock, updates the write lock.
+
+    Args:
+        index (VectorStoreIndex): The index.
+
+    Returns:
+        ReadWriteLock: The lock shared by every user of the index object.
+    """
+    with _index_locks_guard:
+        lock = _index_locks.get(index)
+        if lock is None:
+            lock = _index_locks[index] = ReadWriteLock()
+        return lock
+
+
+def embed_documents(index, documents):
+    """
+    Split documents into nodes and embed all of them in batched requests, without touching the index.
+
+    Args:
+        index (VectorStoreIndex): The index the documents go into, whose service context parses and embeds them.
+        documents (list): The documents.
+
+    Returns:
+        tuple: The nodes and their embeddings.
+    """
+    service_context = index.service_context
+    nodes = service_context.node_parser.get_nodes_from_documents(documents)
+    embeddings = batch_text_embeddings(
+        service_context.embed_model,
+        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes])
+    return nodes, embeddings
+
+
+def insert_embedded(index, documents, nodes, embeddings):
+    """
+    Add embedded nodes to an index under its write lock, like `index.insert` without embedding anything.
+
+    Only suits vector stores that don't store text, like NumpyVectorStore and SimpleVectorStore. The embeddings
+    go to the vector store only, not into the docstore.
+
+    Args:
+        index (VectorStoreIndex): The index.
+        documents (list): The documents the nodes were split from.
+        nodes (list): The nodes, as returned by `embed_documents`.
+        embeddings (list): The embedding of each node.
+    """
+    results = [NodeWithEmbedding(node=node, embedding=embedding)
+               for node, embedding in zip(nodes, embeddings)]
+    with index_lock(index).write():
+        new_ids = index.vector_store.add(results)
+        for node, new_id in zip(nodes, new_ids):
+            index.index_struct.add_node(node, text_id=new_id)
+        index.docstore.add_documents(nodes, allow_update=True)
+        index.storage_context.index_store.add_index_struct(index.index_struct)
+        for document in documents:
+            index.docstore.set_document_hash(document.get_doc_id(), document.hash)
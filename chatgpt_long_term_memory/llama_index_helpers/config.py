@@ -1,18 +1,58 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+
 
 class IndexConfig(BaseModel):
     root_path: str = Field(
         default="")
     knowledge_base: bool = Field(default=True)
+    shared_knowledge_base: bool = Field(default=False)
     model_name: str = Field(default="gpt-3.5-turbo")
     temperature: int = Field(default=0)
     context_window: int = Field(default=4096)
     num_outputs: int = Field(default=700)
     max_chunk_overlap: float = Field(default=0.5)
     chunk_size_limit: int = Field(default=600)
+    index_cache_size: int = Field(default=128)
+    index_cache_ttl: float = Field(default=0)
+    vector_store: str = Field(default="numpy")
+    persist_format: str = Field(default="json")
+    binary_dtype: str = Field(default="float32")
+    quantization: str = Field(default="none")
+    rerank_factor: int = Field(default=1)
+    index_type: str = Field(default="flat")
+    ivf_nlist: int = Field(default=0)
+    ivf_min_train_size: int = Field(default=4096)
+    storage_mode: str = Field(default="full")
+    compaction_threshold: int = Field(default=100)
+    embedding_model_name: str = Field(default="text-embedding-ada-002")
+    embedding_cache: str = Field(default="none")
+    embedding_cache_path: str = Field(default="")
+    embedding_cache_size: int = Field(default=100000)
+    embedding_cache_redis: Optional[ChatMemoryConfig] = Field(default=None)
+    write_behind: bool = Field(default=False)
+    write_behind_workers: int = Field(default=4)
+    write_behind_queue_size: int = Field(default=1000)
+    write_behind_batch_size: int = Field(default=32)
+    # Retention of indexed conversations, folded into a summary node by compaction, 0 disables a limit
+    index_max_turns: int = Field(default=0)
+    index_max_age: float = Field(default=0)
+    # Seconds without updates after which compaction deletes a user's index, 0 keeps it forever
+    index_idle_ttl: float = Field(default=0)
 
 
 class RetrieversConfig(BaseModel):
     top_k: int = Field(default=7)
     max_tokens: int = Field(default=1000)
+    nprobe: int = Field(default=8)
+    model_name: str = Field(default="gpt-3.5-turbo-16k")
+    context_budget: int = Field(default=0)
+    min_truncated_tokens: int = Field(default=32)
+    semantic_cache: bool = Field(default=False)
+    semantic_cache_threshold: float = Field(default=0.95)
+    semantic_cache_scope: str = Field(default="user")
+    semantic_cache_size: int = Field(default=10000)
+    semantic_cache_ttl: float = Field(default=0)
@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from llama_index.embeddings.base import BaseEmbedding
+from llama_index.embeddings.openai import aget_embedding, get_embeddings
+
+# Most inputs the OpenAI embeddings endpoint accepts in one request
+MAX_EMBEDDING_BATCH = 2048
+
+
+def embedding_key(model_name, text):
+    """
+    Build the content address of an embedding from the model name and the embedded text.
+
+    Args:
+        model_name (str): Name of the embedding model.
+        text (str): The embedded text.
+
+    Returns:
+        str: Hex digest identifying the embedding.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def batch_query_embeddings(embed_model, queries):
+    """
+    Embed several queries with as few embedding requests as possible.
+
+    Args:
+        embed_model (BaseEmbedding): The embedding model.
+        queries (list): The queries.
+
+    Returns:
+        list: One embedding per query, in the order of `queries`.
+    """
+    if hasattr(embed_model, "get_query_embeddings"):
+        return embed_model.get_query_embeddings(queries)
+    if hasattr(embed_model, "query_engine"):
+        # OpenAIEmbedding only batches texts, send the queries to the query engine directly
+        embeddings = []
+        for start in range(0, len(queries), MAX_EMBEDDING_BATCH):
+            embeddings.extend(get_embeddings(
+                queries[start:start + MAX_EMBEDDING_BATCH], engine=embed_model.query_engine,
+                deployment_id=embed_model.deployment_name, **embed_model.openai_kwargs))
+        return embeddings
+    return [embed_model.get_query_embedding(query) for query in queries]
+
+
+def batch_text_embeddings(embed_model, texts):
+    """
+    Embed several texts with as few embedding requests as possible.
+
+    Args:
+        embed_model (BaseEmbedding): The embedding model.
+        texts (list): The texts.
+
+    Returns:
+        list: One embedding per text, in the order of `texts`.
+    """
+    embeddings = []
+    for start in range(0, len(texts), MAX_EMBEDDING_BATCH):
+        embeddings.extend(embed_model._get_text_embeddings(texts[start:start + MAX_EMBEDDING_BATCH]))
+    return embeddings
+
+
+def pack_embedding(embedding):
+    return array("f", embedding).tobytes()
+
+
+def unpack_embedding(data):
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Base class of the embedding cache backends.
+
+    Subclasses implement `_get_many` and `_put_many`; this class keeps the hit and miss counters.
+
+    Attributes:
+        max_entries (int): Maximum number of embeddings kept, least recently used ones are evicted first.
+        hits (int): Number of embeddings served from the cache.
+        misses (int): Number of embeddings that had to be computed.
+
+    """
+
+    def __init__(self, max_entries: int = 100000, **kw):
+        super().__init__(**kw)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get_many(self, keys):
+        """
+        Look up several embeddings at once.
+
+        Args:
+            keys (list): Embedding keys built with `embedding_key`.
+
+        Returns:
+            dict: Mapping of the keys found in the cache to their embedding.
+        """
+        if not keys:
+            return {}
+        found = self._get_many(keys)
+        with self._stats_lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        Store several embeddings at once.
+
+        Args:
+            items (dict): Mapping of embedding keys to embeddings.
+        """
+        if items:
+            self._put_many(items)
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: Hits, misses and hit rate of the cache.
+        """
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _get_many(self, keys):
+        raise NotImplementedError
+
+    def _put_many(self, items):
+        raise NotImplementedError
+
+
+class SQLiteEmbeddingCache(EmbeddingCache):
+    """
+    Embedding cache stored in a local SQLite database, shared by every process on the host and kept across restarts.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        max_entries (int): Maximum number of embeddings kept.
+
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, **kw):
+        super().__init__(max_entries=max_entries, **kw)
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._con:
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)")
+            self._con.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+
+    def _get_many(self, keys):
+        found = {}
+        with self._lock, self._con:
+            # Stay below SQLite's limit of host parameters per statement
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._con.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+                found.update((key, unpack_embedding(vector)) for key, vector in rows)
+                self._con.execute(
+                    f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders})",
+                    [time.time()] + batch)
+        return found
+
+    def _put_many(self, items):
+        now = time.time()
+        with self._lock, self._con:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, pack_embedding(embedding), now) for key, embedding in items.items()])
+            overflow = self._con.execute(
+                "SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._con.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)", (overflow,))
+
+    def __len__(self):
+        with self._lock:
+            return self._con.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    """
+    Embedding cache stored in Redis so every worker host shares the same embeddings.
+
+    Embeddings are stored under `{prefix}:{key}` and a sorted set of access times drives the LRU eviction.
+
+    Args:
+        redis_con (redis.Redis): Redis connection.
+        max_entries (int): Maximum number of embeddings kept.
+        prefix (str): Prefix of the Redis keys. Defaults to "embedding".
+
+    """
+
+    def __init__(self, redis_con, max_entries: int = 100000, prefix: str = "embedding", **kw):
+        super().__init__(max_entries=max_entries, **kw)
+        self.redis_con = redis_con
+        self.prefix = prefix
+        self.lru_key = f"{prefix}:lru"
+
+    def _get_many(self, keys):
+        values = self.redis_con.mget([f"{self.prefix}:{key}" for key in keys])
+        found = {key: unpack_embedding(value)
+                 for key, value in zip(keys, values) if value is not None}
+        if found:
+            now = time.time()
+            self.redis_con.zadd(self.lru_key, {key: now for key in found})
+        return found
+
+    def _put_many(self, items):
+        now = time.time()
+        pipe = self.redis_con.pipeline(transaction=False)
+        for key, embedding in items.items():
+            pipe.set(f"{self.prefix}:{key}", pack_embedding(embedding))
+        pipe.zadd(self.lru_key, {key: now for key in items})
+        pipe.zcard(self.lru_key)
+        overflow = pipe.execute()[-1] - self.max_entries
+        if overflow > 0:
+            evicted = self.redis_con.zpopmin(self.lru_key, overflow)
+            keys = [key.decode("utf-8") if isinstance(key, bytes) else key
+                    for key, _ in evicted]
+            if keys:
+                self.redis_con.delete(*[f"{self.prefix}:{key}" for key in keys])
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Embedding model wrapper that serves repeated texts from an EmbeddingCache and only sends misses to the wrapped model.
+
+    Args:
+        embed_model (BaseEmbedding): The embedding model doing the actual work.
+        cache (EmbeddingCache): The cache backend.
+        model_name (str): Model name used in the cache keys when the wrapped model doesn't expose its engines.
+
+    """
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, model_name: str):
+        super().__init__(
+            embed_batch_size=embed_model._embed_batch_size,
+            tokenizer=embed_model._tokenizer,
+            callback_manager=embed_model.callback_manager
+        )
+        self.embed_model = embed_model
+        self.cache = cache
+        self.query_model_name = getattr(embed_model, "query_engine", None) or model_name
+        self.text_model_name = getattr(embed_model, "text_engine", None) or model_name
+
+    def _get_query_embedding(self, query):
+        key = embedding_key(self.query_model_name, query)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+        embedding = self.embed_model._get_query_embedding(query)
+        self.cache.put_many({key: embedding})
+        return embedding
+
+    def get_query_embeddings(self, queries):
+        """
+        Get the embeddings of several queries, sending all cache misses to the wrapped model at once.
+
+        Args:
+            queries (list): The queries.
+
+        Returns:
+            list: One embedding per query, in the order of `queries`.
+        """
+        keys = [embedding_key(self.query_model_name, query) for query in queries]
+        found = self.cache.get_many(list(set(keys)))
+        missing = {}
+        for key, query in zip(keys, queries):
+            if key not in found:
+                missing.setdefault(key, query)
+        if missing:
+            embeddings = batch_query_embeddings(self.embed_model, list(missing.values()))
+            computed = dict(zip(missing.keys(), embeddings))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aget_query_embedding(self, query):
+        """
+        Asynchronously get the embedding of a query, from the cache or from the wrapped model.
+
+        Cache lookups run in a worker thread so a Redis or SQLite round trip doesn't block the event loop.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            list: The query embedding.
+        """
+        key = embedding_key(self.query_model_name, query)
+        found = await asyncio.to_thread(self.cache.get_many, [key])
+        if key in found:
+            return found[key]
+        embedding = await self._aembed_query(query)
+        await asyncio.to_thread(self.cache.put_many, {key: embedding})
+        return embedding
+
+    async def _aembed_query(self, query):
+        model = self.embed_model
+        if hasattr(model, "query_engine"):
+            # OpenAIEmbedding only has an async path for texts, call the query engine directly
+            return await aget_embedding(query, engine=model.query_engine,
+                                        deployment_id=model.deployment_name, **model.openai_kwargs)
+        return await asyncio.to_thread(model._get_query_embedding, query)
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts):
+        keys = [embedding_key(self.text_model_name, text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            embeddings = self.embed_model._get_text_embeddings(list(missing.values()))
+            computed = dict(zip(missing.keys(), embeddings))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def _aget_text_embedding(self, text):
+        return (await self._aget_text_embeddings([text]))[0]
+
+    async def _aget_text_embeddings(self, texts):
+        keys = [embedding_key(self.text_model_name, text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            embeddings = await self.embed_model._aget_text_embeddings(list(missing.values()))
+            computed = dict(zip(missing.keys(), embeddings))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
@@ -0,0 +1,256 @@
+import json
+import os
+import shutil
+import threading
+
+from llama_index.storage.docstore.utils import doc_to_json, json_to_doc
+
+from chatgpt_long_term_memory.llama_index_helpers.concurrent_index import (
+    embed_documents, index_lock, insert_embedded)
+
+LOG_FNAME = "append_log.jsonl"
+COMPACT_DIRNAME = ".compact_tmp"
+
+# index_store.json goes last: a node listed there is guaranteed to be in the other files too,
+# which is what replay relies on to skip records already covered by the snapshot.
+SNAPSHOT_FNAMES = ["vector_store.json", "vector_store.bin", "ivf_index.npz", "docstore.json",
+                   "graph_store.json", "index_store.json"]
+# Files a snapshot may not write, stale copies left by an older snapshot are removed. vector_store.json
+# isn't one of them: a "binary" store writes it as long as it is there, only `convert_to_binary` removes it.
+OPTIONAL_FNAMES = ["vector_store.bin", "ivf_index.npz"]
+
+
+class IncrementalStorage:
+    """
+    IncrementalStorage persists index updates as an append-only log next to a full snapshot of the index.
+
+    Each insert appends one line with the new nodes and their embeddings to `append_log.jsonl`, and each
+    deletion one line with the removed document ids, so a write costs O(changed nodes) instead of rewriting
+    the whole storage directory. Once `compaction_threshold` records
+    have piled up, the index is written to a temporary directory in a background thread and swapped in
+    with atomic file replaces, after which the log is truncated. Loading replays the log on top of the snapshot.
+
+    Args:
+        compaction_threshold (int): Number of log records that triggers a compaction.
+        background_compaction (bool): Whether compaction runs in a background thread or inline.
+
+    """
+
+    def __init__(self, compaction_threshold: int = 100, background_compaction: bool = True):
+        self.compaction_threshold = compaction_threshold
+        self.background_compaction = background_compaction
+        self._locks = {}
+        self._pending = {}
+        self._compacting = set()
+        self._guard = threading.Lock()
+
+    def lock(self, path):
+        """
+        Return the lock guarding writes to a storage directory.
+
+        Args:
+            path (str): Storage directory of the index.
+
+        Returns:
+            threading.RLock: The lock for the directory.
+        """
+        with self._guard:
+            if path not in self._locks:
+                self._locks[path] = threading.RLock()
+            return self._locks[path]
+
+    def append(self, index, path, document):
+        """
+        Insert a document into the index and append the resulting nodes to the storage log.
+
+        Args:
+            index (VectorStoreIndex): The index to update.
+            path (str): Storage directory of the index.
+            document (Document): The document to insert.
+        """
+        self.append_many(index, path, [document])
+
+    def append_many(self, index, path, documents, embedded=None):
+        """
+        Insert documents into the index and append the resulting nodes to the storage log in one write.
+
+        Args:
+            index (VectorStoreIndex): The index to update.
+            path (str): Storage directory of the index.
+            documents (list): The documents to insert.
+            embedded (tuple, optional): Their nodes and embeddings, as returned by `embed_documents`.
+                                        Defaults to None (embedded here, in batched requests).
+        """
+        nodes, embeddings = embedded or embed_documents(index, documents)
+        by_document = {}
+        for node, embedding in zip(nodes, embeddings):
+            by_document.setdefault(node.ref_doc_id, []).append(
+                {"node": doc_to_json(node), "embedding": list(embedding)})
+        records = [
+            {
+                "op": "insert",
+                "ref_doc_id": document.doc_id,
+                "doc_hash": document.hash,
+                "nodes": by_document.get(document.doc_id, [])
+            }
+            for document in documents
+        ]
+        with self.lock(path):
+            insert_embedded(index, documents, nodes, embeddings)
+            self._write_records(path, records)
+        self._maybe_compact(index, path)
+
+    def delete(self, index, path, ref_doc_ids):
+        """
+        Delete documents and their nodes from the index and append the deletion to the storage log.
+
+        Args:
+            index (VectorStoreIndex): The index to update.
+            path (str): Storage directory of the index.
+            ref_doc_ids (list): The doc_ids of the documents to delete.
+        """
+        with self.lock(path):
+            with index_lock(index).write():
+                for ref_doc_id in ref_doc_ids:
+                    index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+            self._write_records(path, [{"op": "delete", "ref_doc_ids": list(ref_doc_ids)}])
+        self._maybe_compact(index, path)
+
+    def replay(self, index, path):
+        """
+        Apply the records of the storage log that are not part of the loaded snapshot yet.
+
+        A torn last line left behind by a crash is cut off the log.
+
+        Args:
+            index (VectorStoreIndex): The index loaded from the snapshot.
+            path (str): Storage directory of the index.
+
+        Returns:
+            int: Number of records read from the log.
+        """
+        log_path = os.path.join(path, LOG_FNAME)
+        if not os.path.exists(log_path):
+            return 0
+
+        records = 0
+        with self.lock(path), open(log_path, "r+b") as f:
+            offset = 0
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Unterminated log record")
+                    record = json.loads(line)
+                except ValueError:
+                    # Cut the torn tail so later appends start on a clean line
+                    f.truncate(offset)
+                    break
+                offset += len(line)
+                records += 1
+                self._apply_record(index, record)
+            self._pending[path] = records
+        return records
+
+    def compact(self, index, path):
+        """
+        Write a fresh snapshot of the index and truncate the storage log.
+
+        Snapshot files are written to a temporary directory first and moved into place one by one with
+        `os.replace`, so a crash at any point leaves a loadable snapshot plus a log that replays cleanly.
+
+        Args:
+            index (VectorStoreIndex): The index to snapshot.
+            path (str): Storage directory of the index.
+        """
+        tmp_path = os.path.join(path, COMPACT_DIRNAME)
+        try:
+            with self.lock(path):
+                if os.path.exists(tmp_path):
+                    shutil.rmtree(tmp_path)
+                with index_lock(index).read():
+                    index.storage_context.persist(tmp_path)
+                fnames = self._snapshot_fnames(tmp_path)
+                for fname in fnames:
+                    self._fsync_file(os.path.join(tmp_path, fname))
+                    os.replace(os.path.join(tmp_path, fname),
+                               os.path.join(path, fname))
+                for fname in OPTIONAL_FNAMES:
+                    if fname not in fnames and os.path.exists(os.path.join(path, fname)):
+                        os.remove(os.path.join(path, fname))
+                self._fsync_dir(path)
+                # Every logged record is part of the snapshot now
+                with open(os.path.join(path, LOG_FNAME), "w", encoding="utf-8") as f:
+                    os.fsync(f.fileno())
+                self._pending[path] = 0
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        finally:
+            with self._guard:
+                self._compacting.discard(path)
+
+    def _apply_record(self, index, record):
+        if record["op"] == "insert":
+            nodes, embeddings = [], []
+            for item in record["nodes"]:
+                node = json_to_doc(item["node"])
+                if node.node_id in index.index_struct.nodes_dict:
+                    continue
+                node.embedding = None
+                nodes.append(node)
+                embeddings.append(item["embedding"])
+            if nodes:
+                insert_embedded(index, [], nodes, embeddings)
+                index.docstore.set_document_hash(
+                    record["ref_doc_id"], record["doc_hash"])
+        elif record["op"] == "delete":
+            # Deleting a document the snapshot doesn't have is a no-op
+            for ref_doc_id in record["ref_doc_ids"]:
+                index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+
+    def _write_records(self, path, records):
+        if not os.path.exists(path):
+            os.makedirs(path)
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with open(os.path.join(path, LOG_FNAME), "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending[path] = self._pending.get(path, 0) + len(records)
+
+    def _maybe_compact(self, index, path):
+        if self._pending.get(path, 0) < self.compaction_threshold:
+            return
+        with self._guard:
+            if path in self._compacting:
+                return
+            self._compacting.add(path)
+        if self.background_compaction:
+            threading.Thread(target=self.compact, args=(index, path),
+                             daemon=True).start()
+        else:
+            self.compact(index, path)
+
+    @staticmethod
+    def _snapshot_fnames(tmp_path):
+        written = set(os.listdir(tmp_path))
+        ordered = [fname for fname in SNAPSHOT_FNAMES if fname in written]
+        others = sorted(written - set(SNAPSHOT_FNAMES))
+        # Unknown files first, index_store.json stays last
+        return others + ordered
+
+    @staticmethod
+    def _fsync_file(file_path):
+        with open(file_path, "rb") as f:
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _fsync_dir(path):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class IndexCache:
+    """
+    IndexCache keeps recently used indexes in memory so hot users don't reload their storage from disk on every turn.
+
+    Entries are evicted in least-recently-used order once the cache holds more than `max_size` indexes,
+    and an entry older than `ttl` seconds is treated as a miss and dropped. An entry can be stored with the
+    version of the storage it matches; looking it up with another version is a miss too.
+
+    Args:
+        max_size (int): Maximum number of indexes to keep in memory. 0 disables the cache.
+        ttl (float): Time to live of an entry in seconds. 0 means entries never expire.
+
+    Attributes:
+        hits (int): Number of lookups served from memory.
+        misses (int): Number of lookups that had to fall back to storage.
+        evictions (int): Number of entries dropped because of size or age.
+
+    """
+
+    def __init__(self, max_size: int = 128, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        """
+        Return the cached index for a key, or None if it isn't cached, has expired or is out of date.
+
+        Args:
+            key (str): Cache key, usually the user id.
+            version (hashable, optional): Current version of the storage, compared with the one the entry was
+                                          stored with. Defaults to None (not compared).
+
+        Returns:
+            VectorStoreIndex: The cached index or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            index, stored_at, stored_version = entry
+            if (self.ttl and time.monotonic() - stored_at > self.ttl) or \
+                    (version is not None and version != stored_version):
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return index
+
+    def put(self, key, index, version=None):
+        """
+        Store an index in the cache and evict the least recently used entries above `max_size`.
+
+        Args:
+            key (str): Cache key, usually the user id.
+            index (VectorStoreIndex): The index to keep in memory.
+            version (hashable, optional): Version of the storage the index matches. Defaults to None.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (index, time.monotonic(), version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """
+        Drop one entry, or every entry when no key is given.
+
+        Args:
+            key (str, optional): Cache key to drop. Defaults to None.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: Size, hits, misses, evictions and hit rate of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -1,20 +1,42 @@
+import asyncio
 import os
+import shutil
+import threading
+import time
 import uuid
 
-import openai
+import redis
 from llama_index import (Document, PromptHelper, ServiceContext,
                          SimpleDirectoryReader, StorageContext,
                          VectorStoreIndex, load_index_from_storage,
                          set_global_service_context)
+from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms import OpenAI
 
+from chatgpt_long_term_memory.llama_index_helpers.concurrent_index import (
+    ThreadSafeCallbackManager, embed_documents, index_lock, insert_embedded)
 from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.llama_index_helpers.embedding_cache import (
+    CachedEmbedding, RedisEmbeddingCache, SQLiteEmbeddingCache)
+from chatgpt_long_term_memory.llama_index_helpers.incremental_storage import \
+    IncrementalStorage
+from chatgpt_long_term_memory.llama_index_helpers.index_cache import \
+    IndexCache
+from chatgpt_long_term_memory.llama_index_helpers.kb_manifest import (
+    MANIFEST_FNAME, KBManifest, kb_doc_prefix)
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import \
+    NumpyVectorStore
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+from chatgpt_long_term_memory.memory.connection_pool import \
+    shared_connection_pool
+from chatgpt_long_term_memory.openai_engine.credentials import \
+    set_openai_api_key
 
-# Set the OpenAI API kEY using the environment variable or a default kEY
-KEY = os.getenv("OPENAI_API_KEY",
-                "")
-openai.api_key = KEY
-os.environ["OPENAI_API_KEY"] = KEY
+# Prefixes of the doc_ids of conversation turns and of the summaries they are folded into
+CONVERSATION_PREFIX = "doc_id_"
+SUMMARY_PREFIX = "summary_id_"
+# Bookkeeping metadata kept out of the embedded and prompted text
+RETENTION_METADATA = ["kind", "created_at"]
 
 
 class DocIndexer:
@@ -24,12 +46,45 @@ class DocIndexer:
     Args:
         root_path (str): Root path for the storage of indices and data.
         knowledge_base (bool): Boolean flag indicating whether the user has a personal knowledge base.
+        shared_knowledge_base (bool): Build the knowledge base index once in `storages/_kb` and keep only the
+                                      conversation history in each user's index. Indexes built before it was
+                                      turned on still hold a copy of the knowledge base, see `drop_kb_copies`.
         model_name (str): Name of the language model to use (e.g., "gpt-3.5-turbo").
         temperature (int): Temperature for language model sampling.
         context_window (int): Context window for the LLM.
         num_outputs (int): Number of outputs for the LLM.
         max_chunk_overlap (float): Chunk overlap as a ratio of chunk size.
         chunk_size_limit (Optional[int]): Maximum chunk size to use.
+        index_cache_size (int): Maximum number of user indexes kept in memory, 0 disables the cache. A cached
+                                index is reloaded when its storage directory was written by someone else.
+        index_cache_ttl (float): Seconds a cached index stays valid, 0 means no expiry.
+        vector_store (str): "numpy" keeps embeddings in a NumPy matrix, "simple" uses llama_index's SimpleVectorStore.
+        persist_format (str): "json" saves the "numpy" store as `vector_store.json`, "binary" as a memory-mapped
+                              `vector_store.bin`. Either file is loaded regardless of this setting. A
+                              `vector_store.json` is kept up to date until `convert_to_binary` removes it.
+        binary_dtype (str): Embedding dtype of `vector_store.bin`, "float32" or "float16".
+        quantization (str): Vectors scanned by queries of the "numpy" store: "none", "float16" or "int8".
+        rerank_factor (int): With "int8", candidates re-scored on a float16 copy per retrieved node, 1 keeps
+                             no copy.
+        index_type (str): "flat" for exact search, "ivf" for approximate search over clustered embeddings.
+        ivf_nlist (int): Number of clusters of the "ivf" index, 0 for the square root of the number of nodes.
+        ivf_min_train_size (int): Number of nodes below which "ivf" indexes still use exact search.
+        storage_mode (str): "full" rewrites the storage on every update, "incremental" appends updates to a log.
+        compaction_threshold (int): Number of logged updates that triggers a snapshot in "incremental" mode.
+        embedding_model_name (str): Name of the OpenAI embedding model.
+        embedding_cache (str): Where embeddings are cached, one of "none", "sqlite" or "redis". Defaults to
+                               "none", which writes nothing besides the indexes.
+        embedding_cache_path (str): SQLite cache file, defaults to `storages/embedding_cache.sqlite3` under root_path.
+        embedding_cache_size (int): Maximum number of cached embeddings.
+        embedding_cache_redis (Optional[ChatMemoryConfig]): Redis server of the "redis" embedding cache.
+        write_behind (bool): Index new conversation turns in background threads after `converse` returns.
+        write_behind_workers (int): Number of background indexing threads.
+        write_behind_queue_size (int): Maximum number of turns waiting per background thread.
+        write_behind_batch_size (int): Maximum number of turns a background thread indexes at once.
+        index_max_turns (int): Number of newest conversations `fold_conversations` keeps, 0 keeps all of them.
+        index_max_age (float): Seconds after which `fold_conversations` folds a conversation, 0 never.
+        index_idle_ttl (float): Seconds without updates after which `expire_idle_index` deletes a user's index,
+                                0 keeps it forever.
 
     """
 
@@ -38,18 +93,42 @@ class DocIndexer:
         super().__init__(**kw)
         self.config = doc_config
 
+        # Set the OpenAI API key using the environment variable or a default key
+        set_openai_api_key()
+
         # Initialize the OpenAI language model
         self.llm = OpenAI(model=self.config.model_name,
                           temperature=self.config.temperature)
-        service_context = ServiceContext.from_defaults(llm=self.llm)
-        set_global_service_context(service_context)
-
         self.root_path = self.config.root_path
+
+        # Embeddings of already seen texts come from the cache instead of the OpenAI API
+        self.embedding_cache = self.create_embedding_cache()
+        self.embed_model = OpenAIEmbedding(
+            model=self.config.embedding_model_name)
+        if self.embedding_cache is not None:
+            self.embed_model = CachedEmbedding(
+                self.embed_model, self.embedding_cache, self.config.embedding_model_name)
+        service_context = ServiceContext.from_defaults(
+            llm=self.llm, embed_model=self.embed_model,
+            callback_manager=ThreadSafeCallbackManager([]))
+        set_global_service_context(service_context)
         if self.config.knowledge_base:
             self.data_path = f'{self.root_path}/resources/data'
             assert os.path.exists(
                 self.data_path), f"Path '{self.data_path}' does not exist!"
 
+        # Shared knowledge base index, built once for all users
+        # Outside of the `storage_{user_id}` namespace, so no user id can reach it
+        self.kb_path = f'{self.root_path}/storages/_kb'
+        self.kb_index = None
+        self.kb_lock = threading.Lock()
+        # Storage directory -> fingerprint of the knowledge base in it, read once and updated by ingest
+        self.kb_versions = {}
+
+        # Serialize loads and updates of the same user's storage directory
+        self.user_locks = {}
+        self.user_locks_guard = threading.Lock()
+
         # Define prompt helper for the index
         self.prompt_helper = PromptHelper(
             self.config.context_window,
@@ -58,6 +137,77 @@ class DocIndexer:
             chunk_size_limit=self.config.chunk_size_limit
         )
 
+        # Keep hot users' indexes in memory to skip reloading them from disk
+        self.index_cache = IndexCache(
+            max_size=self.config.index_cache_size,
+            ttl=self.config.index_cache_ttl
+        )
+
+        assert self.config.vector_store in ("numpy", "simple"), \
+            f"Unknown vector store '{self.config.vector_store}'!"
+        assert self.config.persist_format in ("json", "binary"), \
+            f"Unknown persist format '{self.config.persist_format}'!"
+        self.vector_store_kwargs = {
+            "persist_format": self.config.persist_format,
+            "dtype": self.config.binary_dtype,
+            "quantization": self.config.quantization,
+            "rerank_factor": self.config.rerank_factor,
+            "index_type": self.config.index_type,
+            "ivf_nlist": self.config.ivf_nlist,
+            "ivf_min_train_size": self.config.ivf_min_train_size
+        }
+
+        # Append-only persistence for index updates
+        assert self.config.storage_mode in ("full", "incremental"), \
+            f"Unknown storage mode '{self.config.storage_mode}'!"
+        self.incremental_storage = None
+        if self.config.storage_mode == "incremental":
+            self.incremental_storage = IncrementalStorage(
+                compaction_threshold=self.config.compaction_threshold)
+
+    def create_embedding_cache(self):
+        """
+        Create the embedding cache backend selected in the config.
+
+        Returns:
+            EmbeddingCache: The cache backend, or None if embeddings aren't cached.
+        """
+        backend = self.config.embedding_cache
+        assert backend in ("sqlite", "redis", "none"), \
+            f"Unknown embedding cache '{backend}'!"
+        if backend == "sqlite":
+            path = self.config.embedding_cache_path or \
+                f'{self.root_path}/storages/embedding_cache.sqlite3'
+            return SQLiteEmbeddingCache(
+                path, max_entries=self.config.embedding_cache_size)
+        if backend == "redis":
+            redis_config = self.config.embedding_cache_redis or ChatMemoryConfig()
+            redis_con = redis.StrictRedis(
+                connection_pool=shared_connection_pool(redis_config))
+            return RedisEmbeddingCache(
+                redis_con, max_entries=self.config.embedding_cache_size)
+        return None
+
+    def create_storage_context(self, persist_dir=None):
+        """
+        Create the storage context of an index with the configured vector store.
+
+        Args:
+            persist_dir (str, optional): Storage directory to load from. Defaults to None for an empty context.
+
+        Returns:
+            StorageContext: The storage context.
+        """
+        if self.config.vector_store == "simple":
+            return StorageContext.from_defaults(persist_dir=persist_dir)
+        if persist_dir is None:
+            vector_store = NumpyVectorStore(**self.vector_store_kwargs)
+        else:
+            vector_store = NumpyVectorStore.from_persist_dir(
+                persist_dir, **self.vector_store_kwargs)
+        return StorageContext.from_defaults(
+            persist_dir=persist_dir, vector_store=vector_store)
+
     def load_documents(self, retrieved_documents):
         """
         Load and create a generic interface for a data document from retrieved chat history.
@@ -68,12 +218,28 @@ class DocIndexer:
         Returns:
             Document: A document object representing the chat history.
         """
-        # Sort the dictionaries based on the date strings
-        sorted_data = sorted(retrieved_documents,
-                             key=lambda x: list(x.keys())[0], reverse=True)
-        doc = list(sorted_data[0].values())[0]
-        doc = f"USER: {doc['user_query']}, ANSWER: {doc['bot_response']}"
-        return Document(text=doc, doc_id=f"doc_id_{str(uuid.uuid4())}")
+        # Pick the newest conversation based on the date strings
+        latest = max(retrieved_documents, key=lambda x: list(x.keys())[0])
+        doc = list(latest.values())[0]
+        return self.conversation_document(doc['user_query'], doc['bot_response'])
+
+    @staticmethod
+    def conversation_document(question, response):
+        """
+        Create the document indexed for one conversation turn.
+
+        Args:
+            question (str): The user's question.
+            response (str): The bot's response.
+
+        Returns:
+            Document: A document object representing the turn, stamped with its creation time.
+        """
+        return Document(text=f"USER: {question}, ANSWER: {response}",
+                        doc_id=f"{CONVERSATION_PREFIX}{str(uuid.uuid4())}",
+                        metadata={"kind": "conversation", "created_at": time.time()},
+                        excluded_embed_metadata_keys=RETENTION_METADATA,
+                        excluded_llm_metadata_keys=RETENTION_METADATA)
 
     def construct_index_general(self, user_id, path, mode):
         """
@@ -82,7 +248,7 @@ class DocIndexer:
         Args:
             user_id (str): Unique identifier for the user.
             path (str): Path to store the user's index.
-            mode (str): Mode for constructing the index, either "kb" (knowledge base) or "user" (user input).
+            mode (str): Mode for constructing the index, either "kb" (knowledge base) or "user" (conversations only).
 
         Returns:
             VectorStoreIndex: The constructed index.
@@ -92,31 +258,248 @@ class DocIndexer:
             os.makedirs(path)
 
         # Load data from the directory for the user's personal knowledge base
+        manifest = None
         if mode == 'kb':
             if self.config.knowledge_base:
-                documents = SimpleDirectoryReader(self.data_path).load_data()
+                # Record what was read from each file, so `ingest` can update the index file by file
+                manifest = KBManifest()
+                added, _, _, _, entries = manifest.diff(self.data_path)
+                documents = self.read_kb_files(manifest, added, entries)
             else:
                 # User doesn't have any personal knowledge base
                 documents = []
 
-        # Create a Document structure for the user's input query and chatbot response
+        # Start with an empty index, the user's conversations are added by update_index
         if mode == 'user':
-            documents = [self.load_documents(user_id)]
+            documents = []
 
         # Construct index
         index = VectorStoreIndex.from_documents(
-            documents, prompt_helper=self.prompt_helper
+            documents, storage_context=self.create_storage_context(),
+            prompt_helper=self.prompt_helper
         )
 
+        # Cluster large knowledge bases now so the ANN index is saved with them
+        if isinstance(index.vector_store, NumpyVectorStore) and \
+                index.vector_store.count >= self.config.ivf_min_train_size:
+            index.vector_store.build_ann_index()
+
         # Persist index
         index.storage_context.persist(path)
+        if manifest is not None:
+            manifest.save(path)
 
-        if mode == 'kb':
-            return index
+        return index
+
+    def read_kb_files(self, manifest, relpaths, entries):
+        """
+        Read knowledge base files into documents with stable doc_ids and record them in the manifest.
+
+        Args:
+            manifest (KBManifest): The manifest of the index the documents go into.
+            relpaths (list): Paths of the files relative to the data directory.
+            entries (dict): Manifest entries of the files, as returned by `KBManifest.diff`.
+
+        Returns:
+            list: The documents of all the files.
+        """
+        documents = []
+        for relpath in relpaths:
+            file_documents = SimpleDirectoryReader(
+                input_files=[os.path.join(self.data_path, relpath)]).load_data()
+            prefix = kb_doc_prefix(relpath)
+            for number, document in enumerate(file_documents):
+                document.doc_id = f"{prefix}{number}"
+            manifest.files[relpath] = dict(
+                entries[relpath], ref_doc_ids=[document.doc_id for document in file_documents])
+            documents.extend(file_documents)
+        return documents
+
+    def ingest(self, user_id=None):
+        """
+        Bring a knowledge base index up to date with the files of `resources/data`.
+
+        The ingestion manifest kept next to the index tells which files were added, modified or removed since
+        the index was built or last ingested. Only added and modified files are parsed and embedded, the
+        documents of modified and removed files are deleted from the index, and unchanged files aren't even
+        read, so a refresh costs O(changed files) instead of a full rebuild. The index is persisted before
+        the manifest, and documents have stable doc_ids derived from their file's path, so an interrupted
+        ingestion is completed by the next one. An index built before manifests were kept is re-read once.
+        Queries keep running meanwhile and see the knowledge base either before or after the ingestion.
+
+        Ingest from one process at a time, other processes keep the index they loaded until they restart.
+
+        Args:
+            user_id (str, optional): Unique identifier for the user whose index holds the knowledge base, only
+                                     used without a shared knowledge base. Defaults to None (the shared one).
+
+        Returns:
+            dict: Numbers of "added", "modified", "removed" and "unchanged" files.
+        """
+        assert self.config.knowledge_base, "There is no knowledge base to ingest!"
+        if self.config.shared_knowledge_base:
+            index = self.load_kb_index()
+            path, lock, storage = self.kb_path, self.kb_lock, None
+        else:
+            assert user_id is not None, "Without a shared knowledge base, ingest needs a user_id!"
+            index = self.load_index(user_id)
+            path = f'{self.root_path}/storages/storage_{user_id}'
+            lock, storage = self.user_lock(user_id), self.incremental_storage
+
+        with lock:
+            manifest = KBManifest.load(path)
+            stale = []
+            if manifest is None:
+                # The documents of an index built without a manifest can't be traced back to their files
+                manifest = KBManifest()
+                stale = [ref_doc_id for ref_doc_id in index.ref_doc_info
+                         if not ref_doc_id.startswith((CONVERSATION_PREFIX, SUMMARY_PREFIX))]
+            added, modified, removed, unchanged, entries = manifest.diff(self.data_path)
+
+            # Look documents up by prefix, which also finds those of an interrupted ingestion
+            prefixes = tuple(kb_doc_prefix(relpath) for relpath in added + modified + removed)
+            if prefixes:
+                listed = set(stale)
+                stale.extend(ref_doc_id for ref_doc_id in index.ref_doc_info
+                             if ref_doc_id.startswith(prefixes) and ref_doc_id not in listed)
+            documents = self.read_kb_files(manifest, added + modified, entries)
+            for relpath in removed:
+                del manifest.files[relpath]
+            for relpath in unchanged:
+                if relpath in entries:
+                    manifest.files[relpath].update(entries[relpath])
+
+            if stale or documents:
+                # Embed before locking the index, queries then only wait for the swap of the documents
+                embedded = embed_documents(index, documents)
+                if storage:
+                    with storage.lock(path), index_lock(index).write():
+                        if stale:
+                            storage.delete(index, path, stale)
+                        storage.append_many(index, path, documents, embedded)
+                else:
+                    with index_lock(index).write():
+                        for ref_doc_id in stale:
+                            index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+                        insert_embedded(index, documents, *embedded)
+                    with index_lock(index).read():
+                        index.storage_context.persist(path)
+            if stale or documents or entries:
+                manifest.save(path)
+            self.kb_versions[path] = manifest.fingerprint()
+            if not self.config.shared_knowledge_base:
+                self._cache_index(user_id, index)
+
+        return {"added": len(added), "modified": len(modified), "removed": len(removed),
+                "unchanged": len(unchanged)}
+
+    def drop_kb_copies(self, user_id):
+        """
+        Delete the copy of the knowledge base from a user's index built before `shared_knowledge_base` was on.
+
+        Without it, retrieval would get the knowledge base from both the shared index and the user's one.
+        Every document but the user's conversations and summaries is deleted, as is the user's manifest.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Number of deleted documents.
+        """
+        assert self.config.shared_knowledge_base, "Without a shared knowledge base, users need their copy!"
+        path = f'{self.root_path}/storages/storage_{user_id}'
+        index = self.load_index(user_id)
+        with self.user_lock(user_id):
+            stale = [ref_doc_id for ref_doc_id in index.ref_doc_info
+                     if not ref_doc_id.startswith((CONVERSATION_PREFIX, SUMMARY_PREFIX))]
+            if stale:
+                if self.incremental_storage:
+                    self.incremental_storage.delete(index, path, stale)
+                else:
+                    with index_lock(index).write():
+                        for ref_doc_id in stale:
+                            index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+                    with index_lock(index).read():
+                        index.storage_context.persist(path)
+            manifest_path = os.path.join(path, MANIFEST_FNAME)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            self.kb_versions.pop(path, None)
+            self._cache_index(user_id, index)
+        return len(stale)
+
+    def kb_version(self, user_id=None):
+        """
+        Version of the knowledge base, so caches built from it can tell when it changed.
+
+        The version is read from the ingestion manifest once and updated by `ingest`, so it only changes when
+        the index does: a file edited but not ingested yet doesn't change it.
+
+        Args:
+            user_id (str, optional): Unique identifier for the user whose index holds the knowledge base, only
+                                     used without a shared knowledge base. Defaults to None (the shared one).
+
+        Returns:
+            str: A digest of the ingested files' content, empty without a knowledge base or manifest.
+        """
+        if not self.config.knowledge_base:
+            return ""
+        if self.config.shared_knowledge_base:
+            path = self.kb_path
+        else:
+            path = f'{self.root_path}/storages/storage_{user_id}'
+        version = self.kb_versions.get(path)
+        if version is None:
+            manifest = KBManifest.load(path)
+            if manifest is None:
+                # Not built yet, or built before manifests were kept
+                return ""
+            version = self.kb_versions[path] = manifest.fingerprint()
+        return version
+
+    def load_kb_index(self):
+        """
+        Load the shared knowledge base index, building it on first use.
+
+        The index is built into a temporary directory that is renamed into place, so concurrent workers never
+        see a half-written knowledge base and only the first finished build is kept.
+
+        Returns:
+            VectorStoreIndex: The shared knowledge base index, or None if it isn't used.
+        """
+        if not (self.config.knowledge_base and self.config.shared_knowledge_base):
+            return None
+        if self.kb_index is not None:
+            return self.kb_index
+
+        with self.kb_lock:
+            if self.kb_index is None:
+                if not NumpyVectorStore.exists(self.kb_path):
+                    tmp_path = f'{self.kb_path}.tmp-{os.getpid()}-{uuid.uuid4().hex}'
+                    self.construct_index_general(None, tmp_path, mode="kb")
+                    try:
+                        os.rename(tmp_path, self.kb_path)
+                    except OSError:
+                        # Another worker finished its build first
+                        shutil.rmtree(tmp_path, ignore_errors=True)
+                self.kb_index = load_index_from_storage(
+                    self.create_storage_context(persist_dir=self.kb_path))
+        return self.kb_index
+
+    async def aload_kb_index(self):
+        """
+        Asynchronously load the shared knowledge base index, building or reading it in a worker thread.
+
+        Returns:
+            VectorStoreIndex: The shared knowledge base index, or None if it isn't used.
+        """
+        if self.kb_index is not None:
+            return self.kb_index
+        return await asyncio.to_thread(self.load_kb_index)
 
     def load_index(self, user_id):
         """
-        Load the user's index from storage or construct a new one if not found.
+        Load the user's index from the in-memory cache, from storage, or construct a new one if not found.
 
         Args:
             user_id (str): Unique identifier for the user.
@@ -124,15 +507,111 @@ class DocIndexer:
         Returns:
             VectorStoreIndex: The loaded or newly constructed index.
         """
-        index_path = f'{self.root_path}/storages/storage_{user_id}'
-        status = os.path.exists(f'{index_path}/vector_store.json')
-        if status:
-            index = load_index_from_storage(
-                StorageContext.from_defaults(persist_dir=index_path))
-        else:
-            index = self.construct_index_general(
-                user_id, index_path, mode="kb")
-        return index
+        index = self.index_cache.get(user_id, version=self._storage_version(user_id))
+        if index is not None:
+            return index
+        return self._load_index_from_storage(user_id)
+
+    def _load_index_from_storage(self, user_id):
+        """
+        Private method to load the user's index from storage, or construct it, and cache it.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            VectorStoreIndex: The loaded or newly constructed index.
+        """
+        with self.user_lock(user_id):
+            # Another thread may have loaded the index while this one waited
+            if user_id in self.index_cache:
+                index = self.index_cache.get(user_id, version=self._storage_version(user_id))
+                if index is not None:
+                    return index
+
+            index_path = f'{self.root_path}/storages/storage_{user_id}'
+            status = NumpyVectorStore.exists(index_path)
+            if status:
+                index = load_index_from_storage(
+                    self.create_storage_context(persist_dir=index_path))
+                if self.incremental_storage:
+                    self.incremental_storage.replay(index, index_path)
+            else:
+                # With a shared knowledge base the user's index only holds conversations
+                mode = "user" if self.config.shared_knowledge_base else "kb"
+                index = self.construct_index_general(
+                    user_id, index_path, mode=mode)
+            self._cache_index(user_id, index)
+            return index
+
+    def _cache_index(self, user_id, index):
+        """
+        Cache a user's index with the version of the storage it was loaded from or last persisted to.
+
+        Call under the user's lock, once the index is persisted.
+        """
+        self.index_cache.put(user_id, index, version=self._storage_version(user_id))
+
+    def _storage_version(self, user_id):
+        """
+        Version of a user's storage directory: the names, sizes and modification times of its files.
+
+        A cached index whose version differs was written meanwhile by something else than this instance, e.g.
+        another process or a `DocIndexer` with the same root path, and is reloaded.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            tuple: The version, empty if the directory doesn't exist.
+        """
+        try:
+            with os.scandir(f'{self.root_path}/storages/storage_{user_id}') as entries:
+                return tuple(sorted((entry.name, stat.st_size, stat.st_mtime_ns)
+                                    for entry in entries if entry.is_file()
+                                    for stat in (entry.stat(),)))
+        except FileNotFoundError:
+            return ()
+
+    def user_lock(self, user_id):
+        """
+        Return the lock guarding the storage directory of a user.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            threading.RLock: The lock for the user.
+        """
+        with self.user_locks_guard:
+            if user_id not in self.user_locks:
+                self.user_locks[user_id] = threading.RLock()
+            return self.user_locks[user_id]
+
+    async def aload_index(self, user_id):
+        """
+        Asynchronously load the user's index. Cached indexes are returned directly, storage is read in a
+        worker thread so the event loop keeps serving other users.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            VectorStoreIndex: The loaded or newly constructed index.
+        """
+        index = self.index_cache.get(user_id, version=self._storage_version(user_id))
+        if index is not None:
+            return index
+        return await asyncio.to_thread(self._load_index_from_storage, user_id)
+
+    def invalidate_index(self, user_id=None):
+        """
+        Drop a user's index from the in-memory cache so the next load reads it from storage.
+
+        Args:
+            user_id (str, optional): Unique identifier for the user. Drops every cached index if None.
+        """
+        self.index_cache.invalidate(user_id)
 
     def update_index(self, user_id, index, retrieved_documents):
         """
@@ -145,6 +624,203 @@ class DocIndexer:
 
         """
         path = f'{self.root_path}/storages/storage_{user_id}'
-        doc = self.load_documents(retrieved_documents)
-        index.insert(doc)
-        index.storage_context.persist(path)
+        docs = [self.load_documents(retrieved_documents)]
+        embedded = embed_documents(index, docs)
+        with self.user_lock(user_id):
+            index = self._unexpired_index(user_id, index, path)
+            self.add_documents(index, path, docs, embedded)
+            # The persisted index replaces whatever was cached for the user
+            self._cache_index(user_id, index)
+
+    def index_conversations(self, user_id, index, conversations):
+        """
+        Add several conversation turns to the user's index and persist it once.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            index (VectorStoreIndex): The user's index.
+            conversations (list): List of (question, response) tuples, oldest first.
+
+        """
+        path = f'{self.root_path}/storages/storage_{user_id}'
+        docs = [self.conversation_document(question, response)
+                for question, response in conversations]
+        # All turns are embedded in one request, before taking any lock
+        embedded = embed_documents(index, docs)
+        with self.user_lock(user_id):
+            index = self._unexpired_index(user_id, index, path)
+            self.add_documents(index, path, docs, embedded)
+            self._cache_index(user_id, index)
+
+    def _unexpired_index(self, user_id, index, path):
+        """
+        Return the index to add a user's new turns to, a new one if `expire_idle_index` deleted the one given
+        since it was loaded: persisting that would bring the expired index back.
+
+        Call under the user's lock.
+        """
+        if os.path.isdir(path):
+            return index
+        return self._load_index_from_storage(user_id)
+
+    def add_documents(self, index, path, documents, embedded=None):
+        """
+        Add documents to a user's index and persist it.
+
+        The nodes are embedded before the index is locked, then added under the index's write lock, so queries
+        never see a half-added node and are only held up for the insertion itself.
+
+        Args:
+            index (VectorStoreIndex): The user's index.
+            path (str): Storage directory of the index.
+            documents (list): The documents to add.
+            embedded (tuple, optional): Their nodes and embeddings, as returned by `embed_documents`.
+                                        Defaults to None (embedded here).
+        """
+        embedded = embedded or embed_documents(index, documents)
+        if self.incremental_storage:
+            self.incremental_storage.append_many(index, path, documents, embedded)
+        else:
+            insert_embedded(index, documents, *embedded)
+            with index_lock(index).read():
+                index.storage_context.persist(path)
+
+    def fold_conversations(self, user_id, summarize, now=None):
+        """
+        Apply the retention policy to the user's index: fold the conversations beyond `index_max_turns` and
+        those older than `index_max_age` seconds into a summary node, and delete them from the index.
+
+        The previous summary is folded into the new one, so each user keeps at most one summary node and the
+        index stays bounded. Conversations indexed before they were stamped with a creation time only count
+        towards `index_max_turns`. The index stays usable while the summary is written. When another compaction
+        of the user finishes first, this one's summary is dropped and nothing is folded.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            summarize (function): Returns the summary of a text, e.g. built on `CreateContext.summarize_memories`.
+            now (float, optional): Current time as a Unix timestamp. Defaults to the current time.
+
+        Returns:
+            int: Number of folded conversations.
+        """
+        max_turns, max_age = self.config.index_max_turns, self.config.index_max_age
+        if not (max_turns or max_age):
+            return 0
+        now = time.time() if now is None else now
+        path = f'{self.root_path}/storages/storage_{user_id}'
+
+        index = self.load_index(user_id)
+        with self.user_lock(user_id):
+            folded, summaries = self._expired_conversations(
+                index, max_turns, now - max_age if max_age else None)
+            if not folded:
+                return 0
+            text = "\n".join(self._ref_doc_text(index, ref_doc_id) for ref_doc_id in summaries + folded)
+
+        # Summarizing calls the LLM, so it runs outside of the user's lock
+        summary = Document(text=f"SUMMARY OF EARLIER CONVERSATIONS: {summarize(text)}",
+                           doc_id=f"{SUMMARY_PREFIX}{str(uuid.uuid4())}",
+                           metadata={"kind": "summary", "created_at": now},
+                           excluded_embed_metadata_keys=RETENTION_METADATA,
+                           excluded_llm_metadata_keys=RETENTION_METADATA)
+        embedded = embed_documents(index, [summary])
+
+        with self.user_lock(user_id):
+            # Another compaction folded this user meanwhile, its summary already covers these conversations
+            current = [ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith(SUMMARY_PREFIX)]
+            if sorted(current) != sorted(summaries):
+                return 0
+            # Skip documents another compaction deleted meanwhile
+            deleted = [ref_doc_id for ref_doc_id in summaries + folded
+                       if index.docstore.get_ref_doc_info(ref_doc_id) is not None]
+            if self.incremental_storage:
+                self.incremental_storage.append_many(index, path, [summary], embedded)
+                self.incremental_storage.delete(index, path, deleted)
+            else:
+                with index_lock(index).write():
+                    insert_embedded(index, [summary], *embedded)
+                    for ref_doc_id in deleted:
+                        index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+                    index.storage_context.persist(path)
+            self._cache_index(user_id, index)
+        return len(folded)
+
+    @staticmethod
+    def _expired_conversations(index, max_turns, cutoff):
+        """
+        Find the conversations the retention policy folds, oldest first, and the existing summaries.
+        """
+        conversations, summaries = [], []
+        for ref_doc_id, ref_doc_info in index.ref_doc_info.items():
+            if ref_doc_id.startswith(SUMMARY_PREFIX):
+                summaries.append(ref_doc_id)
+            elif ref_doc_id.startswith(CONVERSATION_PREFIX) and ref_doc_info.node_ids:
+                node = index.docstore.get_node(ref_doc_info.node_ids[0])
+                conversations.append((node.metadata.get("created_at"), ref_doc_id))
+
+        # Unstamped conversations were indexed first, the sort is stable
+        conversations.sort(key=lambda item: item[0] or 0)
+        excess = max(len(conversations) - max_turns, 0) if max_turns else 0
+        folded = [ref_doc_id for position, (created_at, ref_doc_id) in enumerate(conversations)
+                  if position < excess or (cutoff is not None and created_at is not None and created_at < cutoff)]
+        return folded, summaries
+
+    @staticmethod
+    def _ref_doc_text(index, ref_doc_id):
+        ref_doc_info = index.docstore.get_ref_doc_info(ref_doc_id)
+        return "\n".join(index.docstore.get_node(node_id).get_content() for node_id in ref_doc_info.node_ids)
+
+    def expire_idle_index(self, user_id, now=None):
+        """
+        Delete the user's index if it wasn't updated for `index_idle_ttl` seconds.
+
+        Turns indexed later with the deleted index go into a new one instead of bringing it back.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            now (float, optional): Current time as a Unix timestamp. Defaults to the current time.
+
+        Returns:
+            bool: True if the index was deleted.
+        """
+        if not self.config.index_idle_ttl:
+            return False
+        now = time.time() if now is None else now
+        path = f'{self.root_path}/storages/storage_{user_id}'
+        with self.user_lock(user_id):
+            if not os.path.isdir(path):
+                return False
+            updated = max((os.path.getmtime(os.path.join(directory, name))
+                           for directory, _, files in os.walk(path) for name in files),
+                          default=os.path.getmtime(path))
+            if now - updated < self.config.index_idle_ttl:
+                return False
+            shutil.rmtree(path, ignore_errors=True)
+            self.index_cache.invalidate(user_id)
+        return True
+
+    def stored_user_ids(self):
+        """
+        List the users that have an index in storage.
+
+        Returns:
+            list: The user ids, as strings.
+        """
+        storages = f'{self.root_path}/storages'
+        if not os.path.isdir(storages):
+            return []
+        return sorted(name[len("storage_"):] for name in os.listdir(storages)
+                      if name.startswith("storage_") and ".tmp-" not in name
+                      and os.path.isdir(os.path.join(storages, name)))
+
+    async def aupdate_index(self, user_id, index, retrieved_documents):
+        """
+        Asynchronously update the user's index, embedding and persisting in a worker thread.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            index (VectorStoreIndex): The user's index.
+            retrieved_documents (list): List of dictionaries containing user's chat history.
+
+        """
+        await asyncio.to_thread(self.update_index, user_id, index, retrieved_documents)
@@ -0,0 +1,263 @@
+import os
+import threading
+
+import numpy as np
+
+IVF_FNAME = "ivf_index.npz"
+# Rows assigned to centroids at a time, bounds the size of the similarity block
+ASSIGN_BLOCK_ROWS = 4096
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def assign(vectors, centroids):
+    """
+    Return the index of the most similar centroid of each vector.
+
+    Args:
+        vectors (np.ndarray): Normalized vectors, one per row.
+        centroids (np.ndarray): Normalized centroids, one per row.
+
+    Returns:
+        np.ndarray: Centroid index of each vector.
+    """
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        end = min(start + ASSIGN_BLOCK_ROWS, len(vectors))
+        labels[start:end] = np.argmax(vectors[start:end] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors, nlist, iterations=10, seed=0):
+    """
+    Cluster normalized vectors by cosine similarity.
+
+    Args:
+        vectors (np.ndarray): Normalized vectors, one per row.
+        nlist (int): Number of clusters.
+        iterations (int): Number of assignment and update rounds. Defaults to 10.
+        seed (int): Seed of the random initialization. Defaults to 0.
+
+    Returns:
+        np.ndarray: Normalized centroids, one per row.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=nlist)
+        # Sum the members of each cluster with one reduceat over the vectors sorted by cluster
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(vectors[order], starts[filled], axis=0)
+        # Restart empty clusters from random vectors
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted file index over the rows of a NumpyVectorStore.
+
+    Vectors are clustered with spherical k-means and every row is filed under its nearest centroid. A query
+    only scores the rows of its `nprobe` nearest centroids, so its cost grows with `nprobe / nlist` of the
+    store instead of the whole store. Rows added after training are filed under their nearest centroid.
+    The store owns the vectors: it trains the index with `fit` and `reset`, and reports row changes.
+
+    Args:
+        nlist (int): Number of centroids. 0 picks the square root of the number of trained vectors.
+        train_sample_size (int): Number of centroids times this is the maximum number of vectors used for
+                                 training. Defaults to 64.
+        seed (int): Seed of the k-means initialization. Defaults to 0.
+
+    Attributes:
+        centroids (np.ndarray): Normalized centroids, None until trained.
+        trained_size (int): Number of rows when the index was trained.
+
+    """
+
+    def __init__(self, nlist: int = 0, train_sample_size: int = 64, seed: int = 0):
+        self.nlist = nlist
+        self.train_sample_size = train_sample_size
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self._labels = np.zeros(0, dtype=np.int32)
+        self._positions = np.zeros(0, dtype=np.int64)
+        self._lists = []
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def sample_rows(self, count):
+        """
+        Pick the rows used for training.
+
+        Args:
+            count (int): Number of rows of the store.
+
+        Returns:
+            np.ndarray: Sorted row numbers.
+        """
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(count, self.nlist_for(count) * self.train_sample_size)
+        return np.sort(rng.choice(count, sample_size, replace=False))
+
+    def nlist_for(self, count):
+        return min(self.nlist or max(1, int(np.sqrt(count))), count)
+
+    def fit(self, sample, count):
+        """
+        Compute the centroids from a sample of the store's vectors.
+
+        Args:
+            sample (np.ndarray): Normalized vectors of the rows picked by `sample_rows`.
+            count (int): Number of rows of the store.
+        """
+        nlist = min(self.nlist_for(count), len(sample))
+        self.centroids = spherical_kmeans(sample, nlist, seed=self.seed)
+        self.trained_size = count
+
+    def assign(self, vectors):
+        """
+        Return the index of the nearest centroid of each vector.
+
+        Args:
+            vectors (np.ndarray): Normalized vectors.
+
+        Returns:
+            np.ndarray: Centroid index of each vector.
+        """
+        return assign(vectors, self.centroids)
+
+    def reset(self, labels):
+        """
+        File every row of the store under the given centroids.
+
+        Args:
+            labels (np.ndarray): Centroid index of each row, in row order.
+        """
+        count = len(labels)
+        self._labels = np.zeros(0, dtype=np.int32)
+        self._positions = np.zeros(0, dtype=np.int64)
+        self._reserve(count)
+        self._labels[:count] = labels
+        self._lists = [[] for _ in range(len(self.centroids))]
+        for row, label in enumerate(labels.tolist()):
+            self._positions[row] = len(self._lists[label])
+            self._lists[label].append(row)
+
+    def add(self, start, vectors):
+        """
+        File new rows under their nearest centroid.
+
+        Args:
+            start (int): Row of the first vector.
+            vectors (np.ndarray): Normalized vectors of the new rows.
+        """
+        labels = self.assign(vectors)
+        end = start + len(labels)
+        self._reserve(end)
+        for row, label in enumerate(labels.tolist(), start):
+            self._labels[row] = label
+            self._positions[row] = len(self._lists[label])
+            self._lists[label].append(row)
+
+    def remove(self, row, last):
+        """
+        Drop a row, mirroring the store moving its last row into the freed slot.
+
+        Args:
+            row (int): The removed row.
+            last (int): The last row of the store.
+        """
+        self._unfile(row)
+        if row != last:
+            label = self._labels[last]
+            position = self._positions[last]
+            self._lists[label][position] = row
+            self._labels[row] = label
+            self._positions[row] = position
+
+    def probe(self, query_embedding, nprobe):
+        """
+        Return the rows filed under the centroids most similar to the query.
+
+        Args:
+            query_embedding (np.ndarray): The query embedding.
+            nprobe (int): Number of centroids to visit.
+
+        Returns:
+            np.ndarray: Candidate rows.
+        """
+        similarities = self.centroids @ normalize(query_embedding)
+        nprobe = min(nprobe, len(self.centroids))
+        nearest = np.argpartition(-similarities, nprobe - 1)[:nprobe]
+        return np.concatenate([np.asarray(self._lists[label], dtype=np.int64)
+                               for label in nearest])
+
+    def save(self, path, count):
+        """
+        Write the centroids and row assignments to `path`, through a temporary file and an atomic rename.
+
+        Args:
+            path (str): Path of the `.npz` file.
+            count (int): Number of rows of the store.
+        """
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, labels=self._labels[:count],
+                     trained_size=np.int64(self.trained_size))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, path, count):
+        """
+        Read centroids and row assignments written by `save`.
+
+        Args:
+            path (str): Path of the `.npz` file.
+            count (int): Number of rows of the store.
+
+        Returns:
+            bool: False if the file doesn't match the store and the index needs training.
+        """
+        with np.load(path) as data:
+            labels = data["labels"]
+            if len(labels) != count:
+                return False
+            self.centroids = data["centroids"]
+            self.trained_size = int(data["trained_size"])
+        self.reset(labels)
+        return True
+
+    def _unfile(self, row):
+        rows = self._lists[self._labels[row]]
+        position = self._positions[row]
+        moved = rows[-1]
+        rows[position] = moved
+        self._positions[moved] = position
+        rows.pop()
+
+    def _reserve(self, rows):
+        capacity = len(self._labels)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 16)
+        labels = np.zeros(capacity, dtype=np.int32)
+        positions = np.zeros(capacity, dtype=np.int64)
+        labels[:len(self._labels)] = self._labels
+        positions[:len(self._positions)] = self._positions
+        self._labels = labels
+        self._positions = positions
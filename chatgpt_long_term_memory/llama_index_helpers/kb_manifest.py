@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import uuid
+
+MANIFEST_FNAME = "kb_manifest.json"
+MANIFEST_VERSION = 1
+# Prefix of the doc_ids of knowledge base documents, followed by a digest of the file's path
+KB_PREFIX = "kb_"
+# Bytes read at a time when hashing a file
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """
+    Return the SHA-256 hex digest of a file's content.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        str: The digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def kb_doc_prefix(relpath):
+    """
+    Return the doc_id prefix of the documents read from a knowledge base file.
+
+    Args:
+        relpath (str): Path of the file relative to the data directory.
+
+    Returns:
+        str: The prefix, the same for every build so stale documents of a file can always be found.
+    """
+    return f"{KB_PREFIX}{hashlib.sha1(relpath.encode('utf-8')).hexdigest()[:16]}_"
+
+
+class KBManifest:
+    """
+    Ingestion manifest of a knowledge base index, stored as `kb_manifest.json` in the index's storage directory.
+
+    For every file of the data directory the manifest records its size, modification time and content
+    digest, and the doc_ids of the documents it was read into. Comparing it with the directory tells which
+    files were added, modified or removed since the index was last updated: files whose size and
+    modification time didn't change are taken as unchanged without being read, the others are hashed, and
+    only those whose content changed need to be parsed and embedded again.
+
+    Files are listed like `SimpleDirectoryReader` does by default: the top level of the directory, without
+    hidden files.
+
+    Args:
+        files (dict, optional): Relative path -> {"size", "mtime_ns", "sha256", "ref_doc_ids"}.
+
+    """
+
+    def __init__(self, files=None):
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the manifest of a storage directory.
+
+        Args:
+            path (str): Storage directory of the index.
+
+        Returns:
+            KBManifest: The manifest, or None if the directory has none.
+        """
+        manifest_path = os.path.join(path, MANIFEST_FNAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(data["files"])
+
+    def save(self, path):
+        """
+        Write the manifest to a storage directory, replacing the previous one atomically.
+
+        Args:
+            path (str): Storage directory of the index.
+        """
+        manifest_path = os.path.join(path, MANIFEST_FNAME)
+        tmp_path = f"{manifest_path}.tmp-{os.getpid()}-{uuid.uuid4().hex}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
+
+    def fingerprint(self):
+        """
+        Digest the content of the knowledge base the manifest describes.
+
+        Returns:
+            str: A digest of the paths and content digests of the files, the same for every copy built from
+                 the same files.
+        """
+        digest = hashlib.sha256()
+        for relpath in sorted(self.files):
+            digest.update(f"{relpath}\0{self.files[relpath]['sha256']}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def list_files(data_path):
+        """
+        List the files of the data directory that are indexed.
+
+        Args:
+            data_path (str): The knowledge base data directory.
+
+        Returns:
+            list: Paths relative to the data directory, sorted.
+        """
+        return sorted(entry.name for entry in os.scandir(data_path)
+                      if entry.is_file() and not entry.name.startswith("."))
+
+    def diff(self, data_path):
+        """
+        Compare the manifest with the data directory.
+
+        Args:
+            data_path (str): The knowledge base data directory.
+
+        Returns:
+            tuple: Relative paths of the (added, modified, removed, unchanged) files, and the new entries of
+                   the added, modified and touched files, without their "ref_doc_ids".
+        """
+        added, modified, unchanged = [], [], []
+        entries = {}
+        present = self.list_files(data_path)
+        for relpath in present:
+            stat = os.stat(os.path.join(data_path, relpath))
+            entry = self.files.get(relpath)
+            if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                unchanged.append(relpath)
+                continue
+            new_entry = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": file_digest(os.path.join(data_path, relpath))
+            }
+            entries[relpath] = new_entry
+            if entry is None:
+                added.append(relpath)
+            elif entry["sha256"] != new_entry["sha256"]:
+                modified.append(relpath)
+            else:
+                # Touched without changing the content, only the recorded stat changes
+                unchanged.append(relpath)
+        removed = sorted(set(self.files) - set(present))
+        return added, modified, removed, unchanged, entries
@@ -0,0 +1,776 @@
+import argparse
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+from llama_index.vector_stores.types import (DEFAULT_PERSIST_DIR,
+                                             DEFAULT_PERSIST_FNAME,
+                                             VectorStore, VectorStoreQuery,
+                                             VectorStoreQueryMode,
+                                             VectorStoreQueryResult)
+
+from chatgpt_long_term_memory.llama_index_helpers.ivf_index import (IVF_FNAME,
+                                                                    IVFIndex)
+
+BINARY_FNAME = "vector_store.bin"
+BINARY_MAGIC = b"NPVSTORE"
+BINARY_VERSION = 2
+# Version 1 files always hold the vectors, version 2 files of "int8" stores may hold only their codes
+READABLE_VERSIONS = (1, 2)
+# magic, format version, header length
+BINARY_PREFIX = struct.Struct("<8sII")
+BINARY_ALIGNMENT = 64
+BINARY_DTYPES = ("float32", "float16")
+QUANTIZATIONS = ("none", "float16", "int8")
+INDEX_TYPES = ("flat", "ivf")
+# An IVF index trained on n rows is retrained once the store holds this many times more
+IVF_RETRAIN_GROWTH = 4
+# Rows converted to float32 at a time when scanning a float16 or int8 matrix
+SCAN_BLOCK_ROWS = 4096
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store keeping all embeddings in one contiguous float32 NumPy matrix.
+
+    Norms are computed once when a vector is added, so a query is a single matrix-vector product followed by
+    `argpartition` for the top k, instead of scoring Python lists one pair at a time.
+
+    Two on-disk formats are supported. "json" is the `vector_store.json` layout of llama_index's
+    SimpleVectorStore, so both stores can read each other's files. "binary" writes `vector_store.bin`: a small
+    JSON header with the node ids, then the raw embedding matrix and its norms. Binary files are opened with
+    `np.memmap`, so a cold load only parses the header and worker processes share the OS page cache; the matrix
+    is copied into memory on the first write. A store loaded from a directory holding a `vector_store.json`
+    keeps writing it next to `vector_store.bin`, so older releases and SimpleVectorStore can still read the
+    directory, until `convert_to_binary` removes it.
+
+    Quantization shrinks the vectors a store holds and a query has to scan. "float16" keeps the matrix itself in
+    half precision. "int8" keeps int8 codes with one scale per vector instead of the matrix, about a quarter of
+    its float32 size in memory and on disk, and queries score the codes. With a `rerank_factor` above 1 an
+    "int8" store also keeps a float16 copy of the vectors, on which the best `rerank_factor * top_k` candidates
+    are re-scored: that costs 3 bytes per dimension instead of 1, but the copy can stay memory-mapped and
+    mostly paged out. `memory_stats` reports what a store actually holds.
+
+    The "ivf" index type adds an approximate nearest-neighbour search for large stores: once the store holds
+    `ivf_min_train_size` vectors they are clustered, and queries only score the vectors of the `nprobe`
+    clusters nearest to them. The clustering is saved to `ivf_index.npz` next to the vector store. Training,
+    and retraining once the store has grown, runs in a background thread that only takes the store's lock
+    for short steps, queries keep scanning every vector, or the previous clusters, until it is done.
+
+    Args:
+        embedding_dict (dict, optional): Mapping of node ids to embeddings to start with.
+        text_id_to_ref_doc_id (dict, optional): Mapping of node ids to the id of their source document.
+        persist_format (str): Format written by `persist`, "json" or "binary". Defaults to "json".
+        dtype (str): Embedding dtype of the binary format, "float32" or "float16". Defaults to "float32".
+        quantization (str): "none", "float16" or "int8". Defaults to "none".
+        rerank_factor (int): Candidates re-scored on a float16 copy per requested result in "int8" mode, 1
+                             keeps no copy and doesn't re-score. Defaults to 1.
+        index_type (str): "flat" scores every vector, "ivf" only the nearest clusters. Defaults to "flat".
+        ivf_nlist (int): Number of IVF clusters, 0 for the square root of the number of vectors. Defaults to 0.
+        ivf_min_train_size (int): Number of vectors below which "ivf" stores still score every vector.
+                                  Defaults to 4096.
+        ivf_nprobe (int): Clusters visited by a query that doesn't pass `nprobe`. Defaults to 8.
+
+    """
+
+    stores_text = False
+
+    def __init__(self, embedding_dict=None, text_id_to_ref_doc_id=None,
+                 persist_format="json", dtype="float32", quantization="none", rerank_factor=1,
+                 index_type="flat", ivf_nlist=0, ivf_min_train_size=4096, ivf_nprobe=8, **kw):
+        super().__init__(**kw)
+        assert persist_format in ("json", "binary"), \
+            f"Unknown persist format '{persist_format}'!"
+        assert dtype in BINARY_DTYPES, f"Unsupported dtype '{dtype}'!"
+        assert quantization in QUANTIZATIONS, \
+            f"Unknown quantization '{quantization}'!"
+        assert rerank_factor >= 1, "rerank_factor must be at least 1!"
+        assert index_type in INDEX_TYPES, f"Unknown index type '{index_type}'!"
+        self.persist_format = persist_format
+        # Also write vector_store.json in the "binary" format, set when the store is loaded from one
+        self.keep_json = False
+        self.quantization = quantization
+        # An "int8" store only keeps vectors besides its codes to re-score candidates
+        self._keeps_matrix = quantization != "int8" or rerank_factor > 1
+        # A float16 store has nothing else to write, the re-scoring copy of an int8 store is float16 too
+        self.dtype = "float16" if quantization != "none" else dtype
+        self.rerank_factor = rerank_factor
+        self.index_type = index_type
+        self.ivf_min_train_size = ivf_min_train_size
+        self.ivf_nprobe = ivf_nprobe
+        self._ivf = IVFIndex(nlist=ivf_nlist) if index_type == "ivf" else None
+        # Serializes IVF trainings, which run without holding the store's lock
+        self._train_lock = threading.Lock()
+        # Counts row removals, a training that saw one started on rows that have moved since
+        self._removals = 0
+        self._training_scheduled = False
+        self._matrix_dtype = np.float32 if quantization == "none" else np.float16
+        self._mapped = False
+        self._dim = 0
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, 0), dtype=self._matrix_dtype)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._codes = np.zeros((0, 0), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._ids = []
+        self._ref_doc_ids = []
+        self._rows = {}
+        self._ref_doc_nodes = {}
+
+        embedding_dict = embedding_dict or {}
+        text_id_to_ref_doc_id = text_id_to_ref_doc_id or {}
+        if embedding_dict:
+            ids = list(embedding_dict.keys())
+            self._add_rows(
+                ids,
+                [text_id_to_ref_doc_id.get(node_id) for node_id in ids],
+                np.asarray([embedding_dict[node_id] for node_id in ids], dtype=np.float32))
+
+    @staticmethod
+    def exists(persist_dir):
+        """
+        Check whether a storage directory holds a persisted vector store in either format.
+
+        Args:
+            persist_dir (str): The storage directory.
+
+        Returns:
+            bool: True if a vector store file exists.
+        """
+        return os.path.exists(os.path.join(persist_dir, BINARY_FNAME)) or \
+            os.path.exists(os.path.join(persist_dir, DEFAULT_PERSIST_FNAME))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir, fs=None, **kw):
+        """
+        Load the store from a storage directory, preferring the binary format when both files exist.
+
+        Args:
+            persist_dir (str): The storage directory.
+            fs (fsspec.AbstractFileSystem, optional): Unused, kept for llama_index compatibility.
+            **kw: Arguments of the store, like `persist_format` and `dtype`.
+
+        Returns:
+            NumpyVectorStore: The loaded store.
+        """
+        binary_path = os.path.join(persist_dir, BINARY_FNAME)
+        json_path = os.path.join(persist_dir, DEFAULT_PERSIST_FNAME)
+        if os.path.exists(binary_path):
+            store = cls.from_binary_path(binary_path, **kw)
+        else:
+            store = cls.from_persist_path(json_path, **kw)
+        store.keep_json = os.path.exists(json_path)
+        ivf_path = os.path.join(persist_dir, IVF_FNAME)
+        if store._ivf is not None and os.path.exists(ivf_path):
+            # A file that doesn't match the store is ignored, the index is trained again when needed
+            store._ivf.load(ivf_path, store.count)
+        return store
+
+    @classmethod
+    def from_persist_path(cls, persist_path, fs=None, **kw):
+        """
+        Load the store from a `vector_store.json` file.
+
+        Args:
+            persist_path (str): Path of the file.
+            fs (fsspec.AbstractFileSystem, optional): Unused, kept for llama_index compatibility.
+            **kw: Arguments of the store, like `persist_format` and `dtype`.
+
+        Returns:
+            NumpyVectorStore: The loaded store.
+        """
+        with open(persist_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(embedding_dict=data.get("embedding_dict"),
+                   text_id_to_ref_doc_id=data.get("text_id_to_ref_doc_id"), **kw)
+
+    @classmethod
+    def from_binary_path(cls, binary_path, **kw):
+        """
+        Open a `vector_store.bin` file without reading the embeddings into memory.
+
+        Args:
+            binary_path (str): Path of the file.
+            **kw: Arguments of the store, like `persist_format` and `dtype`.
+
+        Returns:
+            NumpyVectorStore: The loaded store, backed by memory maps of the file.
+        """
+        with open(binary_path, "rb") as f:
+            magic, version, header_length = BINARY_PREFIX.unpack(
+                f.read(BINARY_PREFIX.size))
+            if magic != BINARY_MAGIC or version not in READABLE_VERSIONS:
+                raise ValueError(
+                    f"'{binary_path}' is not a version {BINARY_VERSION} vector store file.")
+            header = json.loads(f.read(header_length))
+
+        kw.setdefault("persist_format", "binary")
+        kw.setdefault("dtype", header["dtype"])
+        store = cls(**kw)
+        count, dim = header["count"], header["dim"]
+        store._ids = header["ids"]
+        store._ref_doc_ids = header["ref_doc_ids"]
+        for row, (node_id, ref_doc_id) in enumerate(zip(store._ids, store._ref_doc_ids)):
+            store._rows[node_id] = row
+            store._ref_doc_nodes.setdefault(ref_doc_id, set()).add(node_id)
+        if count:
+            store._dim = dim
+            store._norms = np.memmap(binary_path, dtype=np.float32, mode="r",
+                                     offset=header["norms_offset"], shape=(count,))
+            store._mapped = True
+            vectors = codes = scales = None
+            if "vectors_offset" in header:
+                vectors = np.memmap(binary_path, dtype=header["dtype"], mode="r",
+                                    offset=header["vectors_offset"], shape=(count, dim))
+            if "codes_offset" in header:
+                codes = np.memmap(binary_path, dtype=np.int8, mode="r",
+                                  offset=header["codes_offset"], shape=(count, dim))
+                scales = np.memmap(binary_path, dtype=np.float32, mode="r",
+                                   offset=header["scales_offset"], shape=(count,))
+            # Files written with another quantization are converted in memory
+            if store.quantization == "int8":
+                if codes is None:
+                    codes, scales = store._quantize(vectors)
+                store._codes, store._scales = codes, scales
+            if store._keeps_matrix:
+                if vectors is None:
+                    vectors = store._dequantize(codes, scales).astype(store._matrix_dtype)
+                store._matrix = vectors
+        return store
+
+    @property
+    def client(self):
+        """Get client."""
+        return None
+
+    @property
+    def count(self):
+        """Number of stored embeddings."""
+        return len(self._ids)
+
+    def build_ann_index(self, attempts=3):
+        """
+        Train the IVF index of an "ivf" store on its current vectors.
+
+        The new index is trained on the side and swapped in, queries and updates go on meanwhile. A training
+        during which rows were removed is started over.
+
+        Args:
+            attempts (int): Number of trainings tried before giving up. Defaults to 3.
+
+        Returns:
+            bool: True if the index was trained.
+        """
+        with self._train_lock:
+            for _ in range(attempts):
+                trained = self._train_ann_index()
+                if trained is not None:
+                    return trained
+            return False
+
+    def _train_ann_index(self):
+        # Returns None if rows were removed during the training
+        with self._lock:
+            count = len(self._ids)
+            if self._ivf is None or count == 0:
+                return False
+            removals = self._removals
+            ivf = IVFIndex(nlist=self._ivf.nlist, train_sample_size=self._ivf.train_sample_size,
+                           seed=self._ivf.seed)
+            sample = self._normalized(ivf.sample_rows(count))
+        ivf.fit(sample, count)
+        labels = np.empty(count, dtype=np.int32)
+        for start in range(0, count, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, count)
+            with self._lock:
+                if self._removals != removals:
+                    return None
+                vectors = self._normalized(np.arange(start, end))
+            labels[start:end] = ivf.assign(vectors)
+        with self._lock:
+            if self._removals != removals:
+                return None
+            ivf.reset(labels)
+            # File the rows added during the training
+            if len(self._ids) > count:
+                ivf.add(count, self._normalized(np.arange(count, len(self._ids))))
+            self._ivf = ivf
+        return True
+
+    def _schedule_ann_training(self):
+        # Called with the store's lock held, starts at most one background training at a time
+        if self._training_scheduled:
+            return
+        self._training_scheduled = True
+        threading.Thread(target=self._background_training, daemon=True,
+                         name="ivf-training").start()
+
+    def _background_training(self):
+        try:
+            with self._lock:
+                stale = self._ann_stale()
+            if stale:
+                self.build_ann_index()
+        finally:
+            with self._lock:
+                self._training_scheduled = False
+
+    def memory_stats(self):
+        """
+        Return the bytes the store's vectors take compared to a float32 matrix.
+
+        Returns:
+            dict: Number and dimension of the vectors, bytes scanned by an exact query, bytes of every array
+                  the store holds, as written by the binary format, bytes of the same vectors in float32, the
+                  relative savings of the stored bytes, bytes allocated in memory, which is 0 while the store is
+                  memory-mapped, and whether it is memory-mapped.
+        """
+        with self._lock:
+            count = len(self._ids)
+            dim = self._dim
+            int8 = self.quantization == "int8"
+            matrix_bytes = count * dim * np.dtype(self._matrix_dtype).itemsize if self._keeps_matrix else 0
+            codes_bytes = count * dim + count * 4 if int8 else 0
+            norms_bytes = count * 4
+            scan_bytes = (codes_bytes if int8 else matrix_bytes) + norms_bytes
+            stored_bytes = matrix_bytes + codes_bytes + norms_bytes
+            float32_bytes = count * dim * 4 + count * 4
+            resident_bytes = 0 if self._mapped else sum(
+                array.nbytes for array in (self._matrix, self._norms, self._codes, self._scales))
+            return {
+                "count": count,
+                "dim": dim,
+                "quantization": self.quantization,
+                "scan_bytes": scan_bytes,
+                "stored_bytes": stored_bytes,
+                "float32_bytes": float32_bytes,
+                "savings": 1 - stored_bytes / float32_bytes if float32_bytes else 0.0,
+                "resident_bytes": resident_bytes,
+                "mapped": self._mapped
+            }
+
+    def get(self, text_id):
+        """
+        Return the embedding of a node.
+
+        Args:
+            text_id (str): The node id.
+
+        Returns:
+            list: The embedding.
+        """
+        with self._lock:
+            return self._vectors([self._rows[text_id]])[0].tolist()
+
+    def add(self, embedding_results):
+        """
+        Add embedding results to the store, replacing the embeddings of node ids already present.
+
+        Args:
+            embedding_results (list): List of NodeWithEmbedding.
+
+        Returns:
+            list: The ids of the added nodes.
+        """
+        if not embedding_results:
+            return []
+        ids = [result.id for result in embedding_results]
+        with self._lock:
+            self._materialize()
+            for node_id in ids:
+                if node_id in self._rows:
+                    self._remove_row(self._rows[node_id])
+            self._add_rows(
+                ids,
+                [result.ref_doc_id for result in embedding_results],
+                np.asarray([result.embedding for result in embedding_results], dtype=np.float32))
+            if self._ann_stale():
+                self._schedule_ann_training()
+        return ids
+
+    def delete(self, ref_doc_id, **delete_kwargs):
+        """
+        Delete the nodes of a source document.
+
+        Args:
+            ref_doc_id (str): The doc_id of the document to delete.
+        """
+        with self._lock:
+            self._materialize()
+            for node_id in list(self._ref_doc_nodes.get(ref_doc_id, ())):
+                self._remove_row(self._rows[node_id])
+
+    def query(self, query: VectorStoreQuery, **kwargs):
+        """
+        Return the top k nodes by cosine similarity to the query embedding.
+
+        Args:
+            query (VectorStoreQuery): The query.
+            **kwargs: `nprobe`, the number of clusters visited by "ivf" stores.
+
+        Returns:
+            VectorStoreQueryResult: Ids and similarities of the top nodes, best first.
+        """
+        if query.filters is not None:
+            raise ValueError(
+                "Metadata filters not implemented for NumpyVectorStore yet.")
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+
+        query_embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return VectorStoreQueryResult(similarities=[], ids=[])
+            query_norm = float(np.linalg.norm(query_embedding))
+            rows = self._allowed_rows(query)
+            if rows is None and self._ann_ready():
+                rows = self._ivf.probe(query_embedding, kwargs.get("nprobe", self.ivf_nprobe))
+            top_rows, similarities = self._search(
+                rows, query_embedding, query_norm, query.similarity_top_k)
+            ids = [self._ids[row] for row in top_rows]
+        return VectorStoreQueryResult(similarities=similarities.tolist(), ids=ids)
+
+    def persist(self, persist_path=os.path.join(DEFAULT_PERSIST_DIR, DEFAULT_PERSIST_FNAME), fs=None):
+        """
+        Persist the store in its configured format.
+
+        The "binary" format is written to `vector_store.bin` next to the given path, through a temporary file
+        and an atomic rename, and to the given path too if `keep_json` is set. The "json" format removes the
+        `vector_store.bin`, which the loader would prefer to it.
+
+        Args:
+            persist_path (str): Path of the `vector_store.json` file.
+            fs (fsspec.AbstractFileSystem, optional): Unused, kept for llama_index compatibility.
+        """
+        dirpath = os.path.dirname(persist_path)
+        if dirpath and not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        binary_path = os.path.join(dirpath, BINARY_FNAME)
+        if self.persist_format == "binary":
+            self._write_binary(binary_path)
+        if self.persist_format == "json" or self.keep_json:
+            with open(persist_path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f)
+        if self.persist_format == "json" and os.path.exists(binary_path):
+            os.remove(binary_path)
+
+        ivf_path = os.path.join(dirpath, IVF_FNAME)
+        with self._lock:
+            if self._ivf is not None and self._ivf.trained:
+                self._ivf.save(ivf_path, len(self._ids))
+            elif os.path.exists(ivf_path):
+                os.remove(ivf_path)
+
+    def to_dict(self):
+        """
+        Return the store in SimpleVectorStore's dict layout.
+
+        Returns:
+            dict: The embeddings and ref doc ids keyed by node id.
+        """
+        with self._lock:
+            count = len(self._ids)
+            vectors = self._vectors(np.arange(count)).tolist()
+            return {
+                "embedding_dict": dict(zip(self._ids, vectors)),
+                "text_id_to_ref_doc_id": dict(zip(self._ids, self._ref_doc_ids))
+            }
+
+    def _write_binary(self, binary_path):
+        with self._lock:
+            count = len(self._ids)
+            dim = self._dim
+            header = {
+                "dtype": self.dtype,
+                "dim": dim,
+                "count": count,
+                "ids": self._ids,
+                "ref_doc_ids": self._ref_doc_ids
+            }
+            # Offsets depend on the header length, which depends on the offsets: reserve room for them first
+            header["norms_offset"] = 0
+            if self._keeps_matrix:
+                header["vectors_offset"] = 0
+            if self.quantization == "int8":
+                header["codes_offset"] = header["scales_offset"] = 0
+            header_length = len(json.dumps(header).encode("utf-8")) + 128
+            data_offset = self._align(BINARY_PREFIX.size + header_length)
+            vectors_size = 0
+            if self._keeps_matrix:
+                header["vectors_offset"] = data_offset
+                vectors_size = count * dim * np.dtype(self.dtype).itemsize
+            header["norms_offset"] = self._align(data_offset + vectors_size)
+            if self.quantization == "int8":
+                header["codes_offset"] = self._align(header["norms_offset"] + count * 4)
+                header["scales_offset"] = self._align(header["codes_offset"] + count * dim)
+            header_bytes = json.dumps(header).encode("utf-8").ljust(header_length)
+
+            tmp_path = f"{binary_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "wb") as f:
+                f.write(BINARY_PREFIX.pack(BINARY_MAGIC, BINARY_VERSION, header_length))
+                f.write(header_bytes)
+                if self._keeps_matrix:
+                    f.seek(header["vectors_offset"])
+                    f.write(np.ascontiguousarray(self._matrix[:count], dtype=self.dtype).tobytes())
+                f.seek(header["norms_offset"])
+                f.write(np.ascontiguousarray(self._norms[:count], dtype=np.float32).tobytes())
+                if self.quantization == "int8":
+                    f.seek(header["codes_offset"])
+                    f.write(np.ascontiguousarray(self._codes[:count]).tobytes())
+                    f.seek(header["scales_offset"])
+                    f.write(np.ascontiguousarray(self._scales[:count]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, binary_path)
+
+    @staticmethod
+    def _align(offset):
+        return (offset + BINARY_ALIGNMENT - 1) // BINARY_ALIGNMENT * BINARY_ALIGNMENT
+
+    def _materialize(self):
+        # Copy memory-mapped data into writable arrays before the first change
+        if self._mapped:
+            if self._keeps_matrix:
+                self._matrix = np.array(self._matrix, dtype=self._matrix_dtype)
+            self._norms = np.array(self._norms, dtype=np.float32)
+            if self.quantization == "int8":
+                self._codes = np.array(self._codes, dtype=np.int8)
+                self._scales = np.array(self._scales, dtype=np.float32)
+            self._mapped = False
+
+    @staticmethod
+    def _quantize(vectors):
+        # Symmetric per-vector scaling onto [-127, 127]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127 if len(vectors) else \
+            np.zeros(0, dtype=np.float32)
+        safe = np.where(scales > 0, scales, 1).astype(np.float32)
+        codes = np.rint(vectors / safe[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    @staticmethod
+    def _dequantize(codes, scales):
+        return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+    def _vectors(self, rows):
+        # float32 vectors of rows, decoded from the codes when the store keeps no matrix
+        if self._keeps_matrix:
+            return self._matrix[rows].astype(np.float32)
+        return self._dequantize(self._codes[rows], self._scales[rows])
+
+    @staticmethod
+    def _dots(matrix, query_embedding, count):
+        if matrix.dtype == np.float32:
+            return matrix[:count] @ query_embedding
+        # Convert small blocks so a float16 or int8 scan never materializes a float32 copy of the matrix
+        dots = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, count)
+            dots[start:end] = matrix[start:end].astype(np.float32) @ query_embedding
+        return dots
+
+    def _ann_stale(self):
+        # Whether the store is large enough for an IVF index that isn't trained, or outgrew its training
+        if self._ivf is None or len(self._ids) < self.ivf_min_train_size:
+            return False
+        return not self._ivf.trained or len(self._ids) >= self._ivf.trained_size * IVF_RETRAIN_GROWTH
+
+    def _ann_ready(self):
+        if self._ivf is None or len(self._ids) < self.ivf_min_train_size:
+            return False
+        if self._ann_stale():
+            # E.g. a store loaded without its ivf_index.npz, scan every vector until the training is done
+            self._schedule_ann_training()
+        return self._ivf.trained
+
+    def _search(self, rows, query_embedding, query_norm, top_k):
+        # Score every row, or only the given rows, and return the best rows with their similarities
+        int8 = self.quantization == "int8"
+        if rows is None:
+            count = len(self._ids)
+            matrix = self._codes if int8 else self._matrix
+            dots = self._dots(matrix, query_embedding, count)
+            if int8:
+                dots *= self._scales[:count]
+            scores = self._cosine(dots, np.arange(count), query_norm)
+            rows = np.arange(count)
+        else:
+            scores = self._gathered_scores(rows, query_embedding, query_norm, approximate=int8)
+        top_k = min(top_k, len(rows))
+        if not (int8 and self._keeps_matrix):
+            best = self._top_k(scores, top_k)
+            return rows[best], scores[best]
+        # Re-score the best candidates of the int8 scan on the float16 copy
+        candidates = rows[self._top_k(scores, min(top_k * self.rerank_factor, len(rows)))]
+        exact = self._gathered_scores(candidates, query_embedding, query_norm)
+        order = np.argsort(-exact, kind="stable")[:top_k]
+        return candidates[order], exact[order]
+
+    def _gathered_scores(self, rows, query_embedding, query_norm, approximate=False):
+        # Gather the rows in file order so reads of a mapped matrix stay sequential
+        order = np.argsort(rows)
+        sorted_rows = rows[order]
+        dots = np.empty(len(rows), dtype=np.float32)
+        if approximate:
+            dots[order] = (self._codes[sorted_rows].astype(np.float32) @ query_embedding) * \
+                self._scales[sorted_rows]
+        else:
+            dots[order] = self._matrix[sorted_rows].astype(np.float32) @ query_embedding
+        return self._cosine(dots, rows, query_norm)
+
+    def _cosine(self, dots, rows, query_norm):
+        denominators = self._norms[rows] * query_norm
+        return np.divide(dots, denominators, out=np.zeros_like(dots),
+                         where=denominators > 0)
+
+    def _normalized(self, rows):
+        vectors = self._vectors(rows)
+        norms = self._norms[rows][:, None]
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def _allowed_rows(self, query):
+        if not query.node_ids and not query.doc_ids:
+            return None
+        rows = set()
+        for node_id in query.node_ids or ():
+            if node_id in self._rows:
+                rows.add(self._rows[node_id])
+        for doc_id in query.doc_ids or ():
+            rows.update(self._rows[node_id]
+                        for node_id in self._ref_doc_nodes.get(doc_id, ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    @staticmethod
+    def _top_k(scores, k):
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < len(scores):
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(len(scores))
+        return rows[np.argsort(-scores[rows], kind="stable")]
+
+    def _reserve(self, rows, dim):
+        if self._dim == 0:
+            self._dim = dim
+            self._matrix = np.zeros((0, dim), dtype=self._matrix_dtype)
+            self._codes = np.zeros((0, dim), dtype=np.int8)
+        if self._dim != dim:
+            raise ValueError(
+                f"Embedding dimension {dim} doesn't match the store's dimension {self._dim}.")
+        capacity = len(self._norms)
+        if rows <= capacity:
+            return
+        # Grow geometrically so appends stay amortized O(1)
+        capacity = max(rows, capacity * 2, 16)
+        norms = np.zeros(capacity, dtype=np.float32)
+        count = len(self._ids)
+        norms[:count] = self._norms[:count]
+        self._norms = norms
+        if self._keeps_matrix:
+            matrix = np.zeros((capacity, dim), dtype=self._matrix_dtype)
+            matrix[:count] = self._matrix[:count]
+            self._matrix = matrix
+        if self.quantization == "int8":
+            codes = np.zeros((capacity, dim), dtype=np.int8)
+            scales = np.zeros(capacity, dtype=np.float32)
+            codes[:count] = self._codes[:count]
+            scales[:count] = self._scales[:count]
+            self._codes = codes
+            self._scales = scales
+
+    def _add_rows(self, ids, ref_doc_ids, vectors):
+        vectors = np.atleast_2d(vectors)
+        start = len(self._ids)
+        end = start + len(ids)
+        self._reserve(end, vectors.shape[1])
+        if self.quantization == "int8":
+            self._codes[start:end], self._scales[start:end] = self._quantize(vectors)
+            # The codes approximate the original vectors, whose norms keep the similarities in scale
+            self._norms[start:end] = np.linalg.norm(vectors, axis=1)
+        if self._keeps_matrix:
+            self._matrix[start:end] = vectors
+        if self.quantization != "int8":
+            # Norms of the stored values, so float16 rounding doesn't skew the similarities
+            self._norms[start:end] = np.linalg.norm(
+                self._matrix[start:end].astype(np.float32), axis=1)
+        if self._ivf is not None and self._ivf.trained:
+            self._ivf.add(start, self._normalized(np.arange(start, end)))
+        for row, (node_id, ref_doc_id) in enumerate(zip(ids, ref_doc_ids), start):
+            self._ids.append(node_id)
+            self._ref_doc_ids.append(ref_doc_id)
+            self._rows[node_id] = row
+            self._ref_doc_nodes.setdefault(ref_doc_id, set()).add(node_id)
+
+    def _remove_row(self, row):
+        # Move the last row into the freed slot to keep the matrix contiguous
+        last = len(self._ids) - 1
+        node_id = self._ids[row]
+        ref_doc_id = self._ref_doc_ids[row]
+        self._removals += 1
+        if self._ivf is not None and self._ivf.trained:
+            self._ivf.remove(row, last)
+        if row != last:
+            if self._keeps_matrix:
+                self._matrix[row] = self._matrix[last]
+            self._norms[row] = self._norms[last]
+            if self.quantization == "int8":
+                self._codes[row] = self._codes[last]
+                self._scales[row] = self._scales[last]
+            self._ids[row] = self._ids[last]
+            self._ref_doc_ids[row] = self._ref_doc_ids[last]
+            self._rows[self._ids[row]] = row
+        self._ids.pop()
+        self._ref_doc_ids.pop()
+        del self._rows[node_id]
+        nodes = self._ref_doc_nodes.get(ref_doc_id)
+        if nodes is not None:
+            nodes.discard(node_id)
+            if not nodes:
+                del self._ref_doc_nodes[ref_doc_id]
+
+
+def convert_to_binary(persist_dir, dtype="float32", quantization="none"):
+    """
+    Convert the `vector_store.json` of a storage directory to the memory-mapped `vector_store.bin` format.
+
+    The `vector_store.json` is removed, so older releases and SimpleVectorStore can't read the directory anymore.
+
+    Args:
+        persist_dir (str): The storage directory.
+        dtype (str): Embedding dtype of the binary file, "float32" or "float16". Defaults to "float32".
+        quantization (str): Quantization of the stored vectors, "none", "float16" or "int8". Defaults to "none".
+
+    Returns:
+        int: Number of converted embeddings.
+    """
+    json_path = os.path.join(persist_dir, DEFAULT_PERSIST_FNAME)
+    store = NumpyVectorStore.from_persist_path(
+        json_path, persist_format="binary", dtype=dtype, quantization=quantization)
+    store.persist(json_path)
+    os.remove(json_path)
+    return store.count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert JSON persisted indexes to the binary vector store format.")
+    parser.add_argument("paths", nargs="+",
+                        help="Storage directories, or a `storages` root holding several of them.")
+    parser.add_argument("--dtype", choices=BINARY_DTYPES, default="float32")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="none")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        for dirpath, _, filenames in os.walk(path):
+            if DEFAULT_PERSIST_FNAME in filenames:
+                count = convert_to_binary(dirpath, dtype=args.dtype,
+                                          quantization=args.quantization)
+                print(f"{dirpath}: converted {count} embeddings")
+
+
+if __name__ == "__main__":
+    main()
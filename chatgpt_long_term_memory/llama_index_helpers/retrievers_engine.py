@@ -1,20 +1,30 @@
-import os
+import asyncio
+import time
 
 import openai
 from llama_index.indices.query.schema import QueryBundle
 from llama_index.retrievers import VectorIndexRetriever
 
+from chatgpt_long_term_memory.llama_index_helpers.concurrent_index import \
+    index_lock
 from chatgpt_long_term_memory.llama_index_helpers.config import \
     RetrieversConfig
-from chatgpt_long_term_memory.openai_engine.config import TokenCounterConfig
+from chatgpt_long_term_memory.llama_index_helpers.embedding_cache import \
+    batch_query_embeddings
+from chatgpt_long_term_memory.llama_index_helpers.kb_manifest import KB_PREFIX
+from chatgpt_long_term_memory.llama_index_helpers.semantic_cache import \
+    SemanticCache
+from chatgpt_long_term_memory.openai_engine.config import (MODELS_MAX_TOKENS,
+                                                           TokenCounterConfig)
+from chatgpt_long_term_memory.openai_engine.credentials import \
+    set_openai_api_key
+from chatgpt_long_term_memory.openai_engine.error_handler import \
+    retry_on_openai_errors
+from chatgpt_long_term_memory.openai_engine.rate_limiter import rate_limiter
+from chatgpt_long_term_memory.openai_engine.streaming import (
+    acreate_stream, astream_content, create_stream, stream_content)
 from chatgpt_long_term_memory.openai_engine.token_counter import TokenCounter
 
-KEY = os.getenv("OPENAI_API_KEY",
-                "")
-
-openai.api_kEY = KEY
-os.environ["OPENAI_API_KEY"] = KEY
-
 
 class Retrievers:
     """
@@ -27,6 +37,12 @@ class Retrievers:
     Attributes:
         top_k (int): The number of top results to retrieve from the index.
         max_tokens (int): The maximum number of tokens allowed for a response.
+        nprobe (int): Number of clusters searched in indexes using the "ivf" index type.
+        model_name (str): The chat model answering the questions.
+        context_budget (int): Maximum number of tokens of retrieved context in a prompt, 0 fills the model's
+                              context window.
+        min_truncated_tokens (int): Smallest piece of a node kept when the node is truncated to fit the budget.
+        semantic_cache (SemanticCache): Cache of past answers looked up by question similarity, None if disabled.
         token_counter (TokenCounter): An instance of the TokenCounter class for counting tokens.
         prompt_template (str): A template for the conversation prompt used for generating responses.
 
@@ -35,8 +51,23 @@ class Retrievers:
     def __init__(self, retrieve_config: RetrieversConfig, **kw):
         super().__init__(**kw)
         self.config = retrieve_config
+        set_openai_api_key()
         self.top_k = self.config.top_k
         self.max_tokens = self.config.max_tokens
+        self.nprobe = self.config.nprobe
+        self.model_name = self.config.model_name
+        self.context_budget = self.config.context_budget
+        self.min_truncated_tokens = self.config.min_truncated_tokens
+        assert self.model_name in MODELS_MAX_TOKENS, f"Unknown model '{self.model_name}'!"
+
+        self.semantic_cache = None
+        if self.config.semantic_cache:
+            self.semantic_cache = SemanticCache(
+                threshold=self.config.semantic_cache_threshold,
+                max_entries=self.config.semantic_cache_size,
+                ttl=self.config.semantic_cache_ttl,
+                scope=self.config.semantic_cache_scope
+            )
 
         self.token_counter = TokenCounter(
             token_counter_config=TokenCounterConfig())
@@ -53,30 +84,156 @@ class Retrievers:
         Human: {question}
         Assistant:"""
 
-    def _answer_generator(self, question, retrieved_nodes):
+    def _answer_messages(self, question, retrieved_nodes):
         """
-        Private method to generate a response using the GPT-3.5 model.
+        Private method to build the chat messages of an answer from the retrieved nodes.
+
+        The nodes are packed into the tokens the model's context window leaves for them, so the prompt and the
+        answer always fit.
 
         Args:
             question (str): The user's question or input.
             retrieved_nodes (list): A list of retrieved nodes from the index.
 
         Returns:
-            str: The response generated by the GPT-3.5 model.
+            tuple: The messages to send to the chat model and the number of tokens of the prompt.
         """
-        context = "\n".join(retrieved_nodes)
+        # Room left for the context once the template, the question and the answer are accounted for
+        budget = MODELS_MAX_TOKENS[self.model_name] - self.max_tokens - \
+            self.token_counter.template_token_counter(self.prompt_template, context="", question=question)
+        assert budget > 0, "Reached max tokens limit!"
+        if self.context_budget:
+            budget = min(budget, self.context_budget)
+
+        packed_nodes = self.pack_nodes(retrieved_nodes, budget)
         prompt = self.prompt_template.format(
-            context=context, question=question)
+            context="\n".join(packed_nodes), question=question)
         messages = [
             {"role": "system", "content": prompt},
         ]
-        total_token = self.token_counter.token_counter(prompt)
-        check_token = 16384 - (
-            self.max_tokens + total_token)
+        total_token = self.token_counter.template_token_counter(
+            self.prompt_template, context=packed_nodes, question=question)
+        return messages, total_token
+
+    def pack_nodes(self, retrieved_nodes, budget):
+        """
+        Select the retrieved nodes that fit in a token budget.
+
+        Nodes are taken greedily in retrieval order, best score first. A node that doesn't fit in the
+        remaining budget is truncated to it, if at least `min_truncated_tokens` are left, and dropped
+        otherwise; smaller nodes further down can still fill the rest.
+
+        Args:
+            retrieved_nodes (list): Texts of the retrieved nodes, best score first.
+            budget (int): Maximum number of tokens of the joined nodes.
+
+        Returns:
+            list: The texts to put in the prompt, best score first.
+        """
+        packed = []
+        remaining = budget
+        for text in retrieved_nodes:
+            # One more token for the newline joining the nodes
+            tokens = self.token_counter.prompt_token_counter(text) + 1
+            if tokens <= remaining:
+                packed.append(text)
+                remaining -= tokens
+            elif remaining - 1 >= self.min_truncated_tokens:
+                packed.append(self.token_counter.truncate(text, remaining - 1))
+                remaining = 0
+            if remaining <= 0:
+                break
+        return packed
+
+    @retry_on_openai_errors(max_retry=3)
+    def _answer_generator(self, question, retrieved_nodes):
+        """
+        Private method to generate a response using the GPT-3.5 model.
+
+        Args:
+            question (str): The user's question or input.
+            retrieved_nodes (list): A list of retrieved nodes from the index.
+
+        Returns:
+            str: The response generated by the GPT-3.5 model.
+        """
+        messages, total_token = self._answer_messages(question, retrieved_nodes)
+        rate_limiter.acquire(total_token + self.max_tokens)
+        response = openai.ChatCompletion.create(**self._answer_kwargs(messages))
+
+        bot_response = response["choices"][0]["message"].to_dict()
+        return bot_response['content']
+
+    @retry_on_openai_errors(max_retry=3)
+    async def _aanswer_generator(self, question, retrieved_nodes):
+        """
+        Private method to generate a response using the GPT-3.5 model without blocking the event loop.
+
+        Args:
+            question (str): The user's question or input.
+            retrieved_nodes (list): A list of retrieved nodes from the index.
+
+        Returns:
+            str: The response generated by the GPT-3.5 model.
+        """
+        messages, total_token = self._answer_messages(question, retrieved_nodes)
+        await rate_limiter.aacquire(total_token + self.max_tokens)
+        response = await openai.ChatCompletion.acreate(**self._answer_kwargs(messages))
+
+        bot_response = response["choices"][0]["message"].to_dict()
+        return bot_response['content']
+
+    def _answer_stream(self, question, retrieved_nodes, started=None):
+        """
+        Private method to stream a response of the GPT-3.5 model as it is generated.
 
-        assert check_token > 0, "Reached max tokens limit!"
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo-16k",
+        Args:
+            question (str): The user's question or input.
+            retrieved_nodes (list): A list of retrieved nodes from the index.
+            started (float, optional): `time.perf_counter()` value the time to first token is measured from.
+                                       Defaults to the start of the request.
+
+        Returns:
+            generator: The response text pieces.
+        """
+        started = started or time.perf_counter()
+        messages, total_token = self._answer_messages(question, retrieved_nodes)
+        rate_limiter.acquire(total_token + self.max_tokens)
+        response = create_stream(**self._answer_kwargs(messages))
+        yield from stream_content(response, started)
+
+    async def _aanswer_stream(self, question, retrieved_nodes, started=None):
+        """
+        Private method to stream a response of the GPT-3.5 model without blocking the event loop.
+
+        Args:
+            question (str): The user's question or input.
+            retrieved_nodes (list): A list of retrieved nodes from the index.
+            started (float, optional): `time.perf_counter()` value the time to first token is measured from.
+                                       Defaults to the start of the request.
+
+        Returns:
+            async generator: The response text pieces.
+        """
+        started = started or time.perf_counter()
+        messages, total_token = self._answer_messages(question, retrieved_nodes)
+        await rate_limiter.aacquire(total_token + self.max_tokens)
+        response = await acreate_stream(**self._answer_kwargs(messages))
+        async for content in astream_content(response, started):
+            yield content
+
+    def _answer_kwargs(self, messages):
+        """
+        Private method to build the chat completion request of an answer.
+
+        Args:
+            messages (list): The messages to send to the chat model.
+
+        Returns:
+            dict: The keyword arguments of `openai.ChatCompletion.create`.
+        """
+        return dict(
+            model=self.model_name,
             messages=messages,
             max_tokens=self.max_tokens,
             temperature=0.7,
@@ -85,19 +242,15 @@ class Retrievers:
             frequency_penalty=0,
         )
 
-        messages.append(
-            {"role": "assistant", "content": response["choices"][0]["message"].content})
-
-        bot_response = response["choices"][0]["message"].to_dict()
-        return bot_response['content']
-
-    def query(self, index, question):
+    def query(self, index, question, kb_index=None, embedding=None):
         """
         Query the index with a given question to retrieve relevant responses.
 
         Args:
             index: The index to query.
             question (str): The user's question or input.
+            kb_index (optional): The shared knowledge base index to query alongside. Defaults to None.
+            embedding (list, optional): The question's embedding, if already computed. Defaults to None.
 
         Returns:
             str: The response retrieved from the index based on the input question.
@@ -105,29 +258,289 @@ class Retrievers:
 
         # Configure the vector retriever
 
-        retrieved_nodes = self.get_nodes(question=question, index=index)
+        retrieved_nodes = self.get_nodes(
+            question=question, index=index, kb_index=kb_index, embedding=embedding)
         response = self._answer_generator(question, retrieved_nodes)
         return response
 
-    def get_nodes(self, question, index):
+    async def aquery(self, index, question, kb_index=None, embedding=None):
+        """
+        Asynchronously query the index with a given question to retrieve relevant responses.
+
+        Args:
+            index: The index to query.
+            question (str): The user's question or input.
+            kb_index (optional): The shared knowledge base index to query alongside. Defaults to None.
+            embedding (list, optional): The question's embedding, if already computed. Defaults to None.
+
+        Returns:
+            str: The response retrieved from the index based on the input question.
+        """
+        retrieved_nodes = await self.aget_nodes(
+            question=question, index=index, kb_index=kb_index, embedding=embedding)
+        return await self._aanswer_generator(question, retrieved_nodes)
+
+    def get_nodes(self, question, index, kb_index=None, embedding=None):
         """
         Retrieve nodes from the index using the VectorIndexRetriever.
 
+        When a shared knowledge base index is given, both indexes are queried with the same query embedding
+        and the results are merged by score.
+
         Args:
             question (str): The user's question or input.
             index: The index to query.
+            kb_index (optional): The shared knowledge base index to query alongside. Defaults to None.
+            embedding (list, optional): The question's embedding, if already computed. Defaults to None.
 
         Returns:
             list: A list of retrieved nodes (text) from the index.
         """
+        nodes = self.retrieve_nodes(question, index, kb_index=kb_index, embedding=embedding)
+        retrieved_nodes = [i.node.text for i in nodes]
+        return retrieved_nodes
+
+    async def aget_nodes(self, question, index, kb_index=None, embedding=None):
+        """
+        Asynchronously retrieve nodes from the index and the shared knowledge base.
+
+        Args:
+            question (str): The user's question or input.
+            index: The index to query.
+            kb_index (optional): The shared knowledge base index to query alongside. Defaults to None.
+            embedding (list, optional): The question's embedding, if already computed. Defaults to None.
 
+        Returns:
+            list: A list of retrieved nodes (text) from the index.
+        """
+        nodes = await self.aretrieve_nodes(question, index, kb_index=kb_index, embedding=embedding)
+        return [i.node.text for i in nodes]
+
+    def retrieve_nodes(self, question, index, kb_index=None, embedding=None):
+        """
+        Retrieve the scored nodes of the index and the shared knowledge base, like `get_nodes`.
+
+        Args:
+            question (str): The user's question or input.
+            index: The index to query.
+            kb_index (optional): The shared knowledge base index to query alongside. Defaults to None.
+            embedding (list, optional): The question's embedding, if already computed. Defaults to None.
+
+        Returns:
+            list: A list of NodeWithScore sorted by descending score.
+        """
+        # The first retriever stores the query embedding in the bundle, the second one reuses it
+        query_bundle = QueryBundle(question, embedding=embedding)
+        nodes = self._retrieve(query_bundle, index)
+        if kb_index is not None:
+            nodes = self._merge_nodes(
+                nodes, self._retrieve(query_bundle, kb_index))
+        return nodes
+
+    async def aretrieve_nodes(self, question, index, kb_index=None, embedding=None):
+        """
+        Asynchronous version of `retrieve_nodes`.
+
+        The query embedding is requested without blocking the event loop, then both similarity searches run
+        concurrently in worker threads.
+
+        Args:
+            question (str): The user's question or input.
+            index: The index to query.
+            kb_index (optional): The shared knowledge base index to query alongside. Defaults to None.
+            embedding (list, optional): The question's embedding, if already computed. Defaults to None.
+
+        Returns:
+            list: A list of NodeWithScore sorted by descending score.
+        """
+        if embedding is None:
+            embedding = await self.aquery_embedding(index, question)
+        query_bundle = QueryBundle(question, embedding=embedding)
+
+        indexes = [index] if kb_index is None else [index, kb_index]
+        results = await asyncio.gather(*[
+            asyncio.to_thread(self._retrieve, query_bundle, i) for i in indexes])
+        return self._merge_nodes(*results) if kb_index is not None else results[0]
+
+    @staticmethod
+    def kb_only(nodes):
+        """
+        Check that retrieved nodes all come from knowledge base documents, so an answer built from them holds
+        nothing private to the user and may be shared with other users.
+
+        Args:
+            nodes (list): A list of NodeWithScore.
+
+        Returns:
+            bool: False if a node comes from the user's conversations, summaries or any other document.
+        """
+        return all((i.node.ref_doc_id or "").startswith(KB_PREFIX) for i in nodes)
+
+    def query_embedding(self, index, question):
+        """
+        Compute the embedding of a question with the index's embedding model.
+
+        Args:
+            index: The index the question is asked to.
+            question (str): The user's question or input.
+
+        Returns:
+            list: The question's embedding.
+        """
+        return index.service_context.embed_model.get_query_embedding(question)
+
+    async def aquery_embedding(self, index, question):
+        """
+        Asynchronously compute the embedding of a question with the index's embedding model.
+
+        Args:
+            index: The index the question is asked to.
+            question (str): The user's question or input.
+
+        Returns:
+            list: The question's embedding.
+        """
+        embed_model = index.service_context.embed_model
+        if hasattr(embed_model, "aget_query_embedding"):
+            return await embed_model.aget_query_embedding(question)
+        return await asyncio.to_thread(embed_model.get_query_embedding, question)
+
+    def cached_answer(self, question, user_id, index, answer, version=None):
+        """
+        Answer a question from the semantic cache, or with `answer` on a miss and cache the result.
+
+        The question is embedded once; `answer` gets the embedding so retrieval doesn't compute it again.
+        Without a semantic cache `answer` is called with None. With the "kb" scope only the answers `answer`
+        reports as shareable are cached, see `kb_only`.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            index: The user's index.
+            answer (callable): Called as `answer(embedding)` to produce the response on a miss,
+                                and returns it with whether it may be shared between users.
+            version (str, optional): Knowledge base fingerprint, cached answers are dropped when it changes.
+
+        Returns:
+            str: The response.
+        """
+        if self.semantic_cache is None:
+            return answer(None)[0]
+        started = time.perf_counter()
+        if version is not None:
+            self.semantic_cache.check_version(version)
+        embedding = self.query_embedding(index, question)
+        response = self.semantic_cache.lookup(user_id, embedding)
+        if response is None:
+            response, shareable = answer(embedding)
+            # With the "kb" scope every user sees the entry, only answers without private context go in
+            if shareable or self.semantic_cache.scope == "user":
+                self.semantic_cache.put(
+                    user_id, question, embedding, response, time.perf_counter() - started)
+        return response
+
+    async def acached_answer(self, question, user_id, index, answer, version=None):
+        """
+        Asynchronous version of `cached_answer`, `answer` is a coroutine function.
+
+        Args:
+            question (str): The user's question or input.
+            user_id (str): Unique identifier for the user.
+            index: The user's index.
+            answer (callable): Awaited as `answer(embedding)` to produce the response on a miss,
+                                and returns it with whether it may be shared between users.
+            version (str, optional): Knowledge base fingerprint, cached answers are dropped when it changes.
+
+        Returns:
+            str: The response.
+        """
+        if self.semantic_cache is None:
+            return (await answer(None))[0]
+        started = time.perf_counter()
+        if version is not None:
+            self.semantic_cache.check_version(version)
+        embedding = await self.aquery_embedding(index, question)
+        response = self.semantic_cache.lookup(user_id, embedding)
+        if response is None:
+            response, shareable = await answer(embedding)
+            # With the "kb" scope every user sees the entry, only answers without private context go in
+            if shareable or self.semantic_cache.scope == "user":
+                self.semantic_cache.put(
+                    user_id, question, embedding, response, time.perf_counter() - started)
+        return response
+
+    def get_nodes_many(self, questions, indexes, kb_index=None):
+        """
+        Retrieve nodes for several questions, embedding all questions in a single batch.
+
+        Args:
+            questions (list): The questions.
+            indexes (list): The index to query for each question.
+            kb_index (optional): The shared knowledge base index to query alongside. Defaults to None.
+
+        Returns:
+            list: One list of retrieved nodes (text) per question.
+        """
+        if not questions:
+            return []
+        embed_model = indexes[0].service_context.embed_model
+        embeddings = batch_query_embeddings(embed_model, list(questions))
+        retrieved = []
+        for question, embedding, index in zip(questions, embeddings, indexes):
+            query_bundle = QueryBundle(question, embedding=embedding)
+            nodes = self._retrieve(query_bundle, index)
+            if kb_index is not None:
+                nodes = self._merge_nodes(
+                    nodes, self._retrieve(query_bundle, kb_index))
+            retrieved.append([i.node.text for i in nodes])
+        return retrieved
+
+    def _retrieve(self, query_bundle, index):
+        """
+        Private method to run a similarity search on one index.
+
+        Args:
+            query_bundle (QueryBundle): The query, with its embedding once computed.
+            index: The index to query.
+
+        Returns:
+            list: A list of NodeWithScore sorted by descending score.
+        """
+        # Embed the question before locking, the lock only covers the search
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self.query_embedding(index, query_bundle.query_str)
         # Configure the vector retriever
         retriever = VectorIndexRetriever(
             index=index,
             similarity_top_k=self.top_k,
+            vector_store_kwargs={"nprobe": self.nprobe}
         )
-        # Perform the query and retrieve the response
-        query_bundle = QueryBundle(question)
-        nodes = retriever.retrieve(query_bundle)
-        retrieved_nodes = [i.node.text for i in nodes]
-        return retrieved_nodes
+        # Perform the query and retrieve the response, updates of the index wait for it
+        with index_lock(index).read():
+            return retriever.retrieve(query_bundle)
+
+    def _merge_nodes(self, *results):
+        """
+        Private method to merge several retrieval results into the top_k nodes by score.
+
+        Nodes with the same text are kept once, which covers user indexes that still hold a copy of the
+        knowledge base.
+
+        Args:
+            *results (list): Lists of NodeWithScore.
+
+        Returns:
+            list: The merged list of NodeWithScore sorted by descending score.
+        """
+        merged = sorted((node for result in results for node in result),
+                        key=lambda x: x.score or 0.0, reverse=True)
+        seen = set()
+        nodes = []
+        for node in merged:
+            if node.node.text in seen:
+                continue
+            seen.add(node.node.text)
+            nodes.append(node)
+            if len(nodes) == self.top_k:
+                break
+        return nodes
@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+SCOPES = ("kb", "user")
+# Scope key of the answers shared by every user
+KB_SCOPE = "__kb__"
+
+
+class ScopeVectors:
+    """
+    Normalized question embeddings of one cache scope, one row per entry, kept in one matrix so a lookup is
+    a single matrix-vector product.
+
+    """
+
+    def __init__(self, dim):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.ids = []
+        self.rows = {}
+
+    def add(self, entry_id, vector):
+        row = len(self.ids)
+        if row == len(self.vectors):
+            vectors = np.zeros((2 * row, self.vectors.shape[1]), dtype=np.float32)
+            vectors[:row] = self.vectors
+            self.vectors = vectors
+        self.vectors[row] = vector
+        self.ids.append(entry_id)
+        self.rows[entry_id] = row
+
+    def remove(self, entry_id):
+        # Move the last row into the freed one
+        row = self.rows.pop(entry_id)
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.vectors[row] = self.vectors[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+
+    def best(self, query):
+        """
+        Return the id and similarity of the entry most similar to the query, or (None, None) if empty.
+        """
+        if not self.ids:
+            return None, None
+        similarities = self.vectors[:len(self.ids)] @ query
+        row = int(np.argmax(similarities))
+        return self.ids[row], float(similarities[row])
+
+
+class SemanticCache:
+    """
+    Cache of past answers looked up by the similarity of the question embeddings.
+
+    A question whose embedding has a cosine similarity of at least `threshold` with a cached question gets
+    the cached answer back. Answers are kept per scope: with the "user" scope each user has their own cache,
+    with the "kb" scope every user shares one, which only suits answers built from the knowledge base alone.
+    The least recently used answers are evicted first, answers older than `ttl` seconds are ignored, and
+    the whole cache is cleared when the knowledge base version changes.
+
+    Args:
+        threshold (float): Minimum cosine similarity of a hit. Defaults to 0.95.
+        max_entries (int): Maximum number of cached answers over all scopes. Defaults to 10000.
+        ttl (float): Seconds an answer stays valid, 0 keeps answers until they are evicted. Defaults to 0.
+        scope (str): "user" to keep answers per user, "kb" to share them between users. Defaults to "user".
+
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 10000, ttl: float = 0,
+                 scope: str = "user"):
+        assert scope in SCOPES, f"Unknown semantic cache scope '{scope}'!"
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.scope = scope
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._lock = threading.Lock()
+        # Entry id -> (scope key, question, answer, latency, time stored), least recently used first
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._next_id = 0
+
+    def scope_key(self, user_id):
+        return KB_SCOPE if self.scope == "kb" else str(user_id)
+
+    def check_version(self, version):
+        """
+        Clear the cache if the knowledge base changed since the answers were cached.
+
+        Args:
+            version (str): Fingerprint of the current knowledge base.
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self._scopes.clear()
+                self.version = version
+
+    def lookup(self, user_id, embedding):
+        """
+        Return the cached answer of the most similar question, if similar enough.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            embedding (list): Embedding of the question.
+
+        Returns:
+            str: The cached answer, or None on a miss.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            vectors = self._scopes.get(self.scope_key(user_id))
+            while vectors is not None:
+                entry_id, similarity = vectors.best(query)
+                if entry_id is None or similarity < self.threshold:
+                    break
+                _, _, answer, latency, stored = self._entries[entry_id]
+                if self.ttl and time.time() - stored > self.ttl:
+                    # Expired entries are dropped when they would be hit, or evicted as least recently used
+                    self._remove(entry_id)
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                self.latency_saved += latency
+                return answer
+            self.misses += 1
+            return None
+
+    def put(self, user_id, question, embedding, answer, latency=0.0):
+        """
+        Cache the answer of a question.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            question (str): The question.
+            embedding (list): Embedding of the question.
+            answer (str): The answer.
+            latency (float): Seconds it took to answer, counted as saved on every hit. Defaults to 0.
+        """
+        vector = self._normalize(embedding)
+        scope_key = self.scope_key(user_id)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope_key, question, answer, latency, time.time())
+            if scope_key not in self._scopes:
+                self._scopes[scope_key] = ScopeVectors(len(vector))
+            self._scopes[scope_key].add(entry_id, vector)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id=None):
+        """
+        Drop cached answers.
+
+        Args:
+            user_id (str, optional): Only drop the answers of this user's scope. Defaults to None (all).
+        """
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._scopes.clear()
+                return
+            vectors = self._scopes.pop(self.scope_key(user_id), None)
+            if vectors is not None:
+                for entry_id in vectors.ids:
+                    del self._entries[entry_id]
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: Number of cached answers, hits, misses, hit rate and total seconds saved by hits.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved": self.latency_saved
+            }
+
+    def _remove(self, entry_id):
+        scope_key = self._entries.pop(entry_id)[0]
+        vectors = self._scopes[scope_key]
+        vectors.remove(entry_id)
+        if not vectors.ids:
+            del self._scopes[scope_key]
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
@@ -1,7 +1,21 @@
-from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
-from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+from typing import TYPE_CHECKING
+
+from chatgpt_long_term_memory._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
+    from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+
+# Public names are imported on first access, so importing the package doesn't load llama_index,
+# openai, tiktoken or redis until they are needed
+_EXPORTS = {
+    "ChatMemory": "chatgpt_long_term_memory.memory.chat_memory",
+    "ChatMemoryConfig": "chatgpt_long_term_memory.memory.config"
+}
 
 __all__ = [
     "ChatMemory",
     "ChatMemoryConfig"
 ]
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -1,8 +1,18 @@
+import json
+import time
 from datetime import datetime
 
+import redis
+import redis.asyncio
 from redis_chatgpt.manager import RedisManager
 
 from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+from chatgpt_long_term_memory.memory.connection_pool import (
+    async_connection_pool, shared_connection_pool)
+from chatgpt_long_term_memory.memory.history_backend import (
+    AsyncRedisListHistory, RedisListHistory)
+from chatgpt_long_term_memory.memory.history_codec import (TIMESTAMP_FORMAT,
+                                                           HistoryCodec)
 
 
 class ChatMemory:
@@ -12,14 +22,58 @@ class ChatMemory:
     Args:
         redis_host (str): Host address of the Redis server.
         redis_port (int): Port number of the Redis server.
+        history_backend (str): "list" keeps each user's history in a Redis list with O(1) appends,
+                               "legacy" keeps it as a single JSON value under `{user_id}_data`.
+        history_codec (str): "json" or "binary", how the list backend serializes new entries. Entries written
+                             with either codec stay readable. The binary codec needs Redis clients that don't
+                             decode responses.
+        history_compression (str): "none", "zlib" or "zstd" compression of binary entries.
+        history_compression_threshold (int): Binary entries up to this many bytes aren't compressed.
+        history_max_turns (int): Number of newest conversations `trim_history` keeps, 0 keeps all of them.
+        history_max_age (float): Seconds after which `trim_history` drops a conversation, 0 keeps them forever.
+        history_idle_ttl (int): Seconds after the last conversation when Redis drops a user's history and
+                                summary, 0 keeps them forever.
+        redis_max_connections (int): Size of the connection pool shared by the memories of the process.
+        redis_pool_timeout (float): Seconds to wait for a free pooled connection.
+        redis_socket_timeout (float): Seconds to wait for a Redis reply.
+        redis_socket_connect_timeout (float): Seconds to wait for a Redis connection.
+        redis_client (redis.Redis, optional): Client to use instead of one on the shared pool, e.g. a
+                                              fakeredis client in tests.
+        async_redis_client (redis.asyncio.Redis, optional): Asyncio client to use instead of a pooled one.
 
     """
 
-    def __init__(self, memory_config: ChatMemoryConfig, **kw):
+    def __init__(self, memory_config: ChatMemoryConfig, redis_client=None, async_redis_client=None, **kw):
         super().__init__(**kw)
         self.config = memory_config
+        # Mixed into clients whose other bases overwrite `config`
+        self.memory_config = memory_config
         self.redis_db = RedisManager(
-            host=self.config.redis_host, port=self.config.redis_port)
+            host=self.memory_config.redis_host, port=self.memory_config.redis_port)
+        # Every memory of the process talks to Redis through the same bounded pool
+        self.redis_db.redis_con = redis_client or redis.StrictRedis(
+            connection_pool=shared_connection_pool(self.config))
+
+        assert self.memory_config.history_backend in ("list", "legacy"), \
+            f"Unknown history backend '{self.memory_config.history_backend}'!"
+        self.history_codec = HistoryCodec(self.memory_config.history_codec, self.memory_config.history_compression,
+                                          self.memory_config.history_compression_threshold)
+        # Keys that expire together with an idle user's history
+        related_keys = (self.summary_key("{user_id}"), self.offset_key("{user_id}"))
+        self.history_store = None
+        if self.memory_config.history_backend == "list":
+            self.history_store = RedisListHistory(self.redis_db.redis_con, self.history_codec,
+                                                  self.memory_config.history_idle_ttl, related_keys)
+
+        # The asyncio client connects lazily, on the event loop of the first async call
+        self.async_redis_con = async_redis_client or redis.asyncio.StrictRedis(
+            connection_pool=async_connection_pool(self.config))
+        self.async_history_store = None
+        if self.memory_config.history_backend == "list":
+            self.async_history_store = AsyncRedisListHistory(self.async_redis_con, self.history_codec,
+                                                             self.memory_config.history_idle_ttl, related_keys)
+        # Last seen history offset of each user
+        self._offsets = {}
 
     def get(self, user_id):
         """
@@ -31,26 +85,290 @@ class ChatMemory:
         Returns:
             list: List of dictionaries representing the user's chat history.
         """
+        if self.history_store:
+            return self.history_store.range(user_id)
+
         redis_key = f"{user_id}_data"
         retrieved_documents = self.redis_db.get_data(redis_key)
         return retrieved_documents
 
-    def add_conversation(self, user_id: str, conversation: tuple):
+    def get_latest(self, user_id, n=1):
+        """
+        Retrieve only the newest conversations of a user, oldest first.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            n (int): Number of conversations to return. Defaults to 1.
+
+        Returns:
+            list: List of dictionaries with at most n of the user's latest conversations.
+        """
+        if n <= 0:
+            return []
+        if self.history_store:
+            return self.history_store.range(user_id, -n, -1)
+        return self.get(user_id)[-n:]
+
+    def get_range(self, user_id, since, page_size=50):
+        """
+        Retrieve the conversations of a user stored at or after a given time, oldest first.
+
+        The history is read backwards from the newest entry in pages of `page_size`, so only the requested
+        tail is fetched from Redis.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            since (datetime or str): UTC time of the oldest conversation to return.
+            page_size (int): Number of entries fetched per round trip. Defaults to 50.
+
+        Returns:
+            list: List of dictionaries representing the user's conversations since the given time.
+        """
+        if isinstance(since, datetime):
+            since = since.strftime(TIMESTAMP_FORMAT)
+
+        if not self.history_store:
+            return [entry for entry in self.get(user_id)
+                    if list(entry.keys())[0] >= since]
+
+        tail = []
+        offset = 0
+        while True:
+            page = self.history_store.range(
+                user_id, -(offset + page_size), -(offset + 1))
+            for position, entry in enumerate(reversed(page)):
+                if list(entry.keys())[0] < since:
+                    kept = page[len(page) - position:]
+                    return kept + tail
+            tail = page + tail
+            if len(page) < page_size:
+                return tail
+            offset += page_size
+
+    def get_since(self, user_id, start):
+        """
+        Retrieve the conversations of a user from a position in the history onwards, oldest first.
+
+        Positions count every conversation ever stored, including those dropped by `trim_history`, so a
+        position stays valid when older conversations are trimmed.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            start (int): Index of the first conversation to return.
+
+        Returns:
+            list: List of dictionaries with the conversations from `start` on.
+        """
+        if self.history_store:
+            self.history_store.migrate(user_id)
+            key = self.history_store.key(user_id)
+            offset = self._offsets.get(user_id, 0)
+            while True:
+                # The offset is read in the same transaction and the range is read again if it moved
+                with self.redis_db.redis_con.pipeline() as pipe:
+                    pipe.get(self.offset_key(user_id))
+                    pipe.lrange(key, max(start - offset, 0), -1)
+                    stored_offset, items = pipe.execute()
+                stored_offset = int(stored_offset or 0)
+                if stored_offset == offset:
+                    break
+                offset = stored_offset
+            self._offsets[user_id] = offset
+            return [self.history_codec.decode(item) for item in items]
+        try:
+            offset = int(self.redis_db.redis_con.get(self.offset_key(user_id)) or 0)
+            return self.get(user_id)[max(start - offset, 0):]
+        except Exception:
+            return []
+
+    def history_length(self, user_id):
+        """
+        Return the number of conversations in the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Number of conversations.
+        """
+        if self.history_store:
+            return self.history_store.length(user_id)
+        try:
+            return len(self.get(user_id))
+        except Exception:
+            return 0
+
+    @staticmethod
+    def summary_key(user_id):
+        return f"{user_id}_summary"
+
+    @staticmethod
+    def offset_key(user_id):
+        return f"{user_id}_history_offset"
+
+    def trim_history(self, user_id, now=None, page_size=50):
+        """
+        Apply the retention policy to the user's history: drop the oldest conversations beyond
+        `history_max_turns` and those older than `history_max_age` seconds.
+
+        The number of dropped conversations is added to the user's history offset and the rolling summary's
+        watermark is moved past them in the same transaction, so positions used with `get_since` stay valid.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            now (float, optional): Current time as a Unix timestamp. Defaults to the current time.
+            page_size (int): Number of entries read per round trip when looking for aged conversations.
+                             Defaults to 50.
+
+        Returns:
+            int: Number of dropped conversations.
+        """
+        max_turns, max_age = self.memory_config.history_max_turns, self.memory_config.history_max_age
+        if not (max_turns or max_age):
+            return 0
+        cutoff = None
+        if max_age:
+            now = time.time() if now is None else now
+            cutoff = datetime.utcfromtimestamp(now - max_age).strftime(TIMESTAMP_FORMAT)
+
+        if self.history_store:
+            self.history_store.migrate(user_id)
+            key = self.history_store.key(user_id)
+        else:
+            key = f"{user_id}_data"
+        offset_key, summary_key = self.offset_key(user_id), self.summary_key(user_id)
+        with self.redis_db.redis_con.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key, offset_key, summary_key)
+                    if self.history_store:
+                        dropped = self._expired_list_entries(pipe, key, max_turns, cutoff, page_size)
+                    else:
+                        data = pipe.get(key)
+                        history = json.loads(data) if data is not None else []
+                        dropped = self._expired_entries(history, max_turns, cutoff)
+                    if not dropped:
+                        pipe.unwatch()
+                        return 0
+
+                    offset = int(pipe.get(offset_key) or 0) + dropped
+                    data = pipe.get(summary_key)
+                    summary = json.loads(data) if data is not None else {"watermark": 0, "summary": ""}
+                    # The dropped conversations can't be summarized any more
+                    summary["watermark"] = max(summary["watermark"], offset)
+                    ttl = self.memory_config.history_idle_ttl or None
+
+                    pipe.multi()
+                    if self.history_store:
+                        pipe.ltrim(key, dropped, -1)
+                    else:
+                        pipe.set(key, json.dumps(history[dropped:]), ex=ttl)
+                    pipe.set(offset_key, offset, ex=ttl)
+                    pipe.set(summary_key, json.dumps(summary), ex=ttl)
+                    pipe.execute()
+                    self._offsets[user_id] = offset
+                    return dropped
+                except redis.WatchError:
+                    # A conversation was added or trimmed meanwhile, look again
+                    continue
+
+    def _expired_list_entries(self, pipe, key, max_turns, cutoff, page_size):
+        """
+        Count the conversations at the head of a history list that the retention policy drops.
+        """
+        length = pipe.llen(key)
+        dropped = max(length - max_turns, 0) if max_turns else 0
+        while cutoff is not None and dropped < length:
+            page = [self.history_codec.decode(item)
+                    for item in pipe.lrange(key, dropped, dropped + page_size - 1)]
+            aged = self._expired_entries(page, 0, cutoff)
+            dropped += aged
+            if aged < len(page) or not page:
+                break
+        return dropped
+
+    @staticmethod
+    def _expired_entries(history, max_turns, cutoff):
+        """
+        Count the conversations at the head of a history that the retention policy drops.
+        """
+        dropped = max(len(history) - max_turns, 0) if max_turns else 0
+        if cutoff is not None:
+            while dropped < len(history) and list(history[dropped].keys())[0] < cutoff:
+                dropped += 1
+        return dropped
+
+    def get_summary(self, user_id):
+        """
+        Retrieve the rolling summary of the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            dict: The summary under "summary" and the number of conversations it covers under "watermark",
+                  or None if the user has no summary yet.
+        """
+        data = self.redis_db.redis_con.get(self.summary_key(user_id))
+        return json.loads(data) if data is not None else None
+
+    def set_summary(self, user_id, watermark, summary):
+        """
+        Store the rolling summary of the user's history, unless a summary covering more conversations is
+        already stored.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            watermark (int): Number of conversations the summary covers.
+            summary (str): The summary.
+
+        Returns:
+            bool: True if the summary was stored.
+        """
+        key = self.summary_key(user_id)
+        with self.redis_db.redis_con.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    data = pipe.get(key)
+                    if data is not None and json.loads(data)["watermark"] >= watermark:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.set(key, json.dumps({"watermark": watermark, "summary": summary}),
+                             ex=self.memory_config.history_idle_ttl or None)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    # Another turn stored a summary meanwhile, compare again
+                    continue
+
+    def add_conversation(self, user_id: str, conversation: tuple, tail: int = 0):
         """
         Add a new conversation to the user's chat history in Redis.
 
         Args:
             user_id (str): Unique identifier for the user.
             conversation (tuple): A tuple containing the user's question and the bot's response.
+            tail (int): Number of the newest conversations to read back in the same round trip as the append.
+                        Defaults to 0.
 
+        Returns:
+            list: The newest `tail` conversations after the append, oldest first, or None if tail is 0.
         """
-        redis_key = f"{user_id}_data"
         data = {
-            f"{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}": {
+            f"{datetime.utcnow().strftime(TIMESTAMP_FORMAT)}": {
                 "user_query": conversation[0],
                 "bot_response": conversation[1]
             }
         }
+        if self.history_store:
+            if tail > 0:
+                return self.history_store.append_tail(user_id, data, tail)
+            self.history_store.append(user_id, data)
+            return None
+
+        redis_key = f"{user_id}_data"
         try:
             # Retrieve the existing chat history for the user from Redis
             history = self.redis_db.get_data(redis_key)
@@ -60,3 +378,176 @@ class ChatMemory:
             history = [data]
         # Update the user's chat history in Redis
         self.redis_db.set_data(redis_key, history)
+        if self.memory_config.history_idle_ttl:
+            with self.redis_db.redis_con.pipeline() as pipe:
+                for key in (redis_key, self.summary_key(user_id), self.offset_key(user_id)):
+                    pipe.expire(key, self.memory_config.history_idle_ttl)
+                pipe.execute()
+        return history[-tail:] if tail > 0 else None
+
+    async def aget(self, user_id):
+        """
+        Asynchronously retrieve the chat history for a specific user from Redis.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            list: List of dictionaries representing the user's chat history.
+        """
+        if self.async_history_store:
+            return await self.async_history_store.range(user_id)
+
+        data = await self.async_redis_con.get(f"{user_id}_data")
+        return json.loads(data) if data is not None else None
+
+    async def aget_latest(self, user_id, n=1):
+        """
+        Asynchronously retrieve only the newest conversations of a user, oldest first.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            n (int): Number of conversations to return. Defaults to 1.
+
+        Returns:
+            list: List of dictionaries with at most n of the user's latest conversations.
+        """
+        if n <= 0:
+            return []
+        if self.async_history_store:
+            return await self.async_history_store.range(user_id, -n, -1)
+        return (await self.aget(user_id) or [])[-n:]
+
+    async def aget_since(self, user_id, start):
+        """
+        Asynchronously retrieve the conversations of a user from a position in the history onwards.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            start (int): Index of the first conversation to return, counting trimmed conversations.
+
+        Returns:
+            list: List of dictionaries with the conversations from `start` on.
+        """
+        if self.async_history_store:
+            await self.async_history_store.migrate(user_id)
+            key = RedisListHistory.key(user_id)
+            offset = self._offsets.get(user_id, 0)
+            while True:
+                async with self.async_redis_con.pipeline() as pipe:
+                    pipe.get(self.offset_key(user_id))
+                    pipe.lrange(key, max(start - offset, 0), -1)
+                    stored_offset, items = await pipe.execute()
+                stored_offset = int(stored_offset or 0)
+                if stored_offset == offset:
+                    break
+                offset = stored_offset
+            self._offsets[user_id] = offset
+            return [self.history_codec.decode(item) for item in items]
+        offset = int(await self.async_redis_con.get(self.offset_key(user_id)) or 0)
+        return (await self.aget(user_id) or [])[max(start - offset, 0):]
+
+    async def ahistory_length(self, user_id):
+        """
+        Asynchronously return the number of conversations in the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Number of conversations.
+        """
+        if self.async_history_store:
+            return await self.async_history_store.length(user_id)
+        return len(await self.aget(user_id) or [])
+
+    async def aget_summary(self, user_id):
+        """
+        Asynchronously retrieve the rolling summary of the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            dict: The summary and its watermark, or None if the user has no summary yet.
+        """
+        data = await self.async_redis_con.get(self.summary_key(user_id))
+        return json.loads(data) if data is not None else None
+
+    async def aset_summary(self, user_id, watermark, summary):
+        """
+        Asynchronously store the rolling summary of the user's history, unless a summary covering more
+        conversations is already stored.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            watermark (int): Number of conversations the summary covers.
+            summary (str): The summary.
+
+        Returns:
+            bool: True if the summary was stored.
+        """
+        key = self.summary_key(user_id)
+        async with self.async_redis_con.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    data = await pipe.get(key)
+                    if data is not None and json.loads(data)["watermark"] >= watermark:
+                        await pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.set(key, json.dumps({"watermark": watermark, "summary": summary}),
+                             ex=self.memory_config.history_idle_ttl or None)
+                    await pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    async def aadd_conversation(self, user_id: str, conversation: tuple, tail: int = 0):
+        """
+        Asynchronously add a new conversation to the user's chat history in Redis.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            conversation (tuple): A tuple containing the user's question and the bot's response.
+            tail (int): Number of the newest conversations to read back in the same round trip as the append.
+                        Defaults to 0.
+
+        Returns:
+            list: The newest `tail` conversations after the append, oldest first, or None if tail is 0.
+        """
+        data = {
+            f"{datetime.utcnow().strftime(TIMESTAMP_FORMAT)}": {
+                "user_query": conversation[0],
+                "bot_response": conversation[1]
+            }
+        }
+        if self.async_history_store:
+            if tail > 0:
+                return await self.async_history_store.append_tail(user_id, data, tail)
+            await self.async_history_store.append(user_id, data)
+            return None
+
+        redis_key = f"{user_id}_data"
+        history = await self.aget(user_id) or []
+        history.append(data)
+        async with self.async_redis_con.pipeline() as pipe:
+            pipe.set(redis_key, json.dumps(history))
+            if self.memory_config.history_idle_ttl:
+                for key in (redis_key, self.summary_key(user_id), self.offset_key(user_id)):
+                    pipe.expire(key, self.memory_config.history_idle_ttl)
+            await pipe.execute()
+        return history[-tail:] if tail > 0 else None
+
+    def migrate_histories(self):
+        """
+        Move every legacy `{user_id}_data` history into the list backend in one go.
+
+        Users are also migrated lazily on first access, this is meant for a one-shot migration job.
+
+        Returns:
+            int: Number of migrated users.
+        """
+        assert self.history_store, "Migration needs the 'list' history backend!"
+        return self.history_store.migrate_all()
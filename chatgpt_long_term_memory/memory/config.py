@@ -1,6 +1,24 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
 class ChatMemoryConfig(BaseModel):
     redis_host: str = Field(default="172.16.0.2")
     redis_port: int = Field(default=6379)
+    history_backend: str = Field(default="list")
+    # Serialization of list backend entries, "json" or "binary"; entries of either codec are always readable
+    history_codec: str = Field(default="json")
+    history_compression: str = Field(default="zlib")
+    history_compression_threshold: int = Field(default=512)
+    # Retention of raw history: `trim_history` keeps the newest turns and drops aged ones, 0 disables a limit
+    history_max_turns: int = Field(default=0)
+    history_max_age: float = Field(default=0)
+    # Seconds of inactivity after which Redis drops a user's history, 0 keeps it forever
+    history_idle_ttl: int = Field(default=0)
+    # Connections of the pool shared by every ChatMemory of the process with the same settings
+    redis_max_connections: int = Field(default=50)
+    # Seconds to wait for a free pooled connection before failing
+    redis_pool_timeout: Optional[float] = Field(default=20)
+    redis_socket_timeout: Optional[float] = Field(default=None)
+    redis_socket_connect_timeout: Optional[float] = Field(default=None)
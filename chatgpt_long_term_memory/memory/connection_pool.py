@@ -0,0 +1,59 @@
+import threading
+
+import redis
+import redis.asyncio
+
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+
+# One pool per server and settings, shared by every ChatMemory of the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_kwargs(config: ChatMemoryConfig):
+    return dict(
+        host=config.redis_host,
+        port=config.redis_port,
+        max_connections=config.redis_max_connections,
+        timeout=config.redis_pool_timeout,
+        socket_timeout=config.redis_socket_timeout,
+        socket_connect_timeout=config.redis_socket_connect_timeout
+    )
+
+
+def shared_connection_pool(config: ChatMemoryConfig):
+    """
+    Return the process-wide blocking connection pool for the Redis server and settings of a config.
+
+    Callers beyond `redis_max_connections` wait up to `redis_pool_timeout` seconds for a free connection, so
+    the number of connections stays bounded however many clients are created.
+
+    Args:
+        config (ChatMemoryConfig): The Redis settings.
+
+    Returns:
+        redis.BlockingConnectionPool: The shared pool.
+    """
+    kwargs = _pool_kwargs(config)
+    key = tuple(sorted(kwargs.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = redis.BlockingConnectionPool(**kwargs)
+        return pool
+
+
+def async_connection_pool(config: ChatMemoryConfig):
+    """
+    Return a new asyncio blocking connection pool with the settings of a config.
+
+    Asyncio connections are bound to the event loop they were opened on, so async pools aren't shared
+    between ChatMemory instances, which may be used from different loops.
+
+    Args:
+        config (ChatMemoryConfig): The Redis settings.
+
+    Returns:
+        redis.asyncio.BlockingConnectionPool: The pool.
+    """
+    return redis.asyncio.BlockingConnectionPool(**_pool_kwargs(config))
@@ -0,0 +1,327 @@
+import json
+
+import redis
+
+from chatgpt_long_term_memory.memory.history_codec import HistoryCodec
+
+
+class RedisListHistory:
+    """
+    Chat history storage built on native Redis lists, one list per user.
+
+    Every conversation entry is an item of the `{user_id}_history` list, serialized by the history codec, so
+    appending a turn is a single RPUSH and reads can fetch any slice with LRANGE instead of downloading the
+    whole history. With a `ttl`, every append also resets the expiry of the list and of the user's related keys,
+    so the history of a user who stays idle that long is dropped by Redis.
+    Histories written by the legacy backend as one JSON blob under `{user_id}_data` are moved into the list
+    the first time a user is accessed.
+
+    Args:
+        redis_con (redis.Redis): Redis connection used for all commands.
+        codec (HistoryCodec, optional): Serialization of the entries. Defaults to JSON.
+        ttl (int): Seconds an idle user's history is kept, 0 keeps it forever. Defaults to 0.
+        related_keys (tuple): Templates like "{user_id}_summary" of keys expiring together with the history.
+
+    """
+
+    def __init__(self, redis_con, codec: HistoryCodec = None, ttl: int = 0, related_keys: tuple = (), **kw):
+        super().__init__(**kw)
+        self.redis_con = redis_con
+        self.codec = codec or HistoryCodec()
+        self.ttl = ttl
+        self.related_keys = related_keys
+        self._migrated = set()
+
+    @staticmethod
+    def key(user_id):
+        return f"{user_id}_history"
+
+    @staticmethod
+    def legacy_key(user_id):
+        return f"{user_id}_data"
+
+    def append(self, user_id, entry):
+        """
+        Append one conversation entry to the end of the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            entry (dict): The conversation entry.
+
+        Returns:
+            int: Length of the history after the append.
+        """
+        self.migrate(user_id)
+        if not self.ttl:
+            return self.redis_con.rpush(self.key(user_id), self.codec.encode(entry))
+        with self.redis_con.pipeline() as pipe:
+            pipe.rpush(self.key(user_id), self.codec.encode(entry))
+            self.expire(pipe, user_id)
+            return pipe.execute()[0]
+
+    def append_tail(self, user_id, entry, n=1):
+        """
+        Append one conversation entry and read back the newest entries in a single round trip.
+
+        Both commands run in one MULTI/EXEC transaction, so the returned tail ends with the appended entry.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            entry (dict): The conversation entry.
+            n (int): Number of newest entries to return. Defaults to 1.
+
+        Returns:
+            list: The newest n entries after the append, oldest first.
+        """
+        self.migrate(user_id)
+        with self.redis_con.pipeline() as pipe:
+            pipe.rpush(self.key(user_id), self.codec.encode(entry))
+            pipe.lrange(self.key(user_id), -n, -1)
+            self.expire(pipe, user_id)
+            items = pipe.execute()[1]
+        return [self.codec.decode(item) for item in items]
+
+    def expire(self, pipe, user_id):
+        """
+        Queue the commands resetting the expiry of the user's history and related keys on a pipeline.
+
+        Args:
+            pipe (redis.client.Pipeline): The pipeline.
+            user_id (str): Unique identifier for the user.
+        """
+        if not self.ttl:
+            return
+        pipe.expire(self.key(user_id), self.ttl)
+        for template in self.related_keys:
+            pipe.expire(template.format(user_id=user_id), self.ttl)
+
+    def range(self, user_id, start=0, end=-1):
+        """
+        Read a slice of the user's history, oldest first. Negative indexes count from the newest entry.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            start (int): Index of the first entry. Defaults to 0.
+            end (int): Index of the last entry, inclusive. Defaults to -1.
+
+        Returns:
+            list: List of conversation entries.
+        """
+        self.migrate(user_id)
+        items = self.redis_con.lrange(self.key(user_id), start, end)
+        return [self.codec.decode(item) for item in items]
+
+    def length(self, user_id):
+        """
+        Return the number of entries in the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Number of entries.
+        """
+        self.migrate(user_id)
+        return self.redis_con.llen(self.key(user_id))
+
+    def migrate(self, user_id):
+        """
+        Move a legacy `{user_id}_data` history into the user's list, once per user and process.
+
+        The legacy entries are pushed in front of anything already in the list and the legacy key is deleted
+        in the same transaction, so concurrent migrations and appends can't duplicate or reorder entries.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Number of migrated entries.
+        """
+        if user_id in self._migrated:
+            return 0
+
+        legacy_key = self.legacy_key(user_id)
+        migrated = 0
+        with self.redis_con.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(legacy_key)
+                    data = pipe.get(legacy_key)
+                    if data is None:
+                        pipe.unwatch()
+                        break
+                    entries = json.loads(data) or []
+                    pipe.multi()
+                    if entries:
+                        pipe.lpush(self.key(user_id),
+                                   *[self.codec.encode(entry) for entry in reversed(entries)])
+                    pipe.delete(legacy_key)
+                    pipe.execute()
+                    migrated = len(entries)
+                    break
+                except redis.WatchError:
+                    # Someone else touched the legacy key, read it again
+                    continue
+        self._migrated.add(user_id)
+        return migrated
+
+    def migrate_all(self):
+        """
+        Migrate every legacy `*_data` history found in Redis.
+
+        Returns:
+            int: Number of migrated users.
+        """
+        users = 0
+        for key in self.redis_con.scan_iter(match="*_data"):
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            user_id = key[:-len("_data")]
+            self._migrated.discard(user_id)
+            if self.migrate(user_id):
+                users += 1
+        return users
+
+
+class AsyncRedisListHistory:
+    """
+    Asyncio counterpart of RedisListHistory for use with a `redis.asyncio` client.
+
+    It reads and writes the same `{user_id}_history` lists, so sync and async callers can share histories.
+
+    Args:
+        redis_con (redis.asyncio.Redis): Async Redis connection used for all commands.
+        codec (HistoryCodec, optional): Serialization of the entries. Defaults to JSON.
+        ttl (int): Seconds an idle user's history is kept, 0 keeps it forever. Defaults to 0.
+        related_keys (tuple): Templates like "{user_id}_summary" of keys expiring together with the history.
+
+    """
+
+    def __init__(self, redis_con, codec: HistoryCodec = None, ttl: int = 0, related_keys: tuple = (), **kw):
+        super().__init__(**kw)
+        self.redis_con = redis_con
+        self.codec = codec or HistoryCodec()
+        self.ttl = ttl
+        self.related_keys = related_keys
+        self._migrated = set()
+
+    async def append(self, user_id, entry):
+        """
+        Append one conversation entry to the end of the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            entry (dict): The conversation entry.
+
+        Returns:
+            int: Length of the history after the append.
+        """
+        await self.migrate(user_id)
+        if not self.ttl:
+            return await self.redis_con.rpush(RedisListHistory.key(user_id), self.codec.encode(entry))
+        async with self.redis_con.pipeline() as pipe:
+            pipe.rpush(RedisListHistory.key(user_id), self.codec.encode(entry))
+            self.expire(pipe, user_id)
+            return (await pipe.execute())[0]
+
+    async def append_tail(self, user_id, entry, n=1):
+        """
+        Append one conversation entry and read back the newest entries in a single round trip.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            entry (dict): The conversation entry.
+            n (int): Number of newest entries to return. Defaults to 1.
+
+        Returns:
+            list: The newest n entries after the append, oldest first.
+        """
+        await self.migrate(user_id)
+        key = RedisListHistory.key(user_id)
+        async with self.redis_con.pipeline() as pipe:
+            pipe.rpush(key, self.codec.encode(entry))
+            pipe.lrange(key, -n, -1)
+            self.expire(pipe, user_id)
+            items = (await pipe.execute())[1]
+        return [self.codec.decode(item) for item in items]
+
+    def expire(self, pipe, user_id):
+        """
+        Queue the commands resetting the expiry of the user's history and related keys on a pipeline.
+
+        Args:
+            pipe (redis.asyncio.client.Pipeline): The pipeline.
+            user_id (str): Unique identifier for the user.
+        """
+        if not self.ttl:
+            return
+        pipe.expire(RedisListHistory.key(user_id), self.ttl)
+        for template in self.related_keys:
+            pipe.expire(template.format(user_id=user_id), self.ttl)
+
+    async def range(self, user_id, start=0, end=-1):
+        """
+        Read a slice of the user's history, oldest first. Negative indexes count from the newest entry.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            start (int): Index of the first entry. Defaults to 0.
+            end (int): Index of the last entry, inclusive. Defaults to -1.
+
+        Returns:
+            list: List of conversation entries.
+        """
+        await self.migrate(user_id)
+        items = await self.redis_con.lrange(RedisListHistory.key(user_id), start, end)
+        return [self.codec.decode(item) for item in items]
+
+    async def length(self, user_id):
+        """
+        Return the number of entries in the user's history.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Number of entries.
+        """
+        await self.migrate(user_id)
+        return await self.redis_con.llen(RedisListHistory.key(user_id))
+
+    async def migrate(self, user_id):
+        """
+        Move a legacy `{user_id}_data` history into the user's list, once per user and process.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Number of migrated entries.
+        """
+        if user_id in self._migrated:
+            return 0
+
+        legacy_key = RedisListHistory.legacy_key(user_id)
+        migrated = 0
+        async with self.redis_con.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(legacy_key)
+                    data = await pipe.get(legacy_key)
+                    if data is None:
+                        await pipe.unwatch()
+                        break
+                    entries = json.loads(data) or []
+                    pipe.multi()
+                    if entries:
+                        pipe.lpush(RedisListHistory.key(user_id),
+                                   *[self.codec.encode(entry) for entry in reversed(entries)])
+                    pipe.delete(legacy_key)
+                    await pipe.execute()
+                    migrated = len(entries)
+                    break
+                except redis.WatchError:
+                    # Someone else touched the legacy key, read it again
+                    continue
+        self._migrated.add(user_id)
+        return migrated
@@ -0,0 +1,157 @@
+import calendar
+import json
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+CODECS = ("json", "binary")
+COMPRESSIONS = ("none", "zlib", "zstd")
+
+# First byte of a version 1 binary entry, JSON entries start with "{"
+BINARY_V1 = 0x01
+# Flags of the second byte, telling how the record is compressed
+FLAG_ZLIB = 0x01
+FLAG_ZSTD = 0x02
+# Epoch seconds of the timestamp, byte length of the user query, byte length of the bot response
+RECORD = struct.Struct(">qII")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("The 'zstd' history compression needs the zstandard package: pip install zstandard")
+    return zstandard
+
+
+class HistoryCodec:
+    """
+    Serialization of chat history entries stored in Redis.
+
+    The "json" codec stores an entry as the JSON text of `{timestamp: {"user_query": ..., "bot_response": ...}}`.
+    The "binary" codec stores it as a versioned record: a version byte, a flags byte, the timestamp as epoch
+    seconds and the lengths of the two texts packed with `struct`, then the UTF-8 texts, compressed with zlib or
+    zstd if the record is longer than `compression_threshold` bytes and compression makes it smaller. Entries
+    that don't have the conversation shape are stored as JSON by both codecs.
+
+    Decoding tells the formats apart by their first byte, so entries written with any codec can be read
+    whatever codec is configured, and a history can mix them.
+
+    Args:
+        codec (str): "json" or "binary". Defaults to "json".
+        compression (str): "none", "zlib" or "zstd" (needs the zstandard package). Only used by the binary
+                           codec. Defaults to "zlib".
+        compression_threshold (int): Records up to this many bytes are stored uncompressed. Defaults to 512.
+
+    """
+
+    def __init__(self, codec: str = "json", compression: str = "zlib", compression_threshold: int = 512):
+        assert codec in CODECS, f"Unknown history codec '{codec}'!"
+        assert compression in COMPRESSIONS, f"Unknown history compression '{compression}'!"
+        self.codec = codec
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        # zstandard (de)compressors can't be shared between threads, each thread gets its own
+        self._zstd_local = threading.local()
+        if codec == "binary" and compression == "zstd":
+            _zstd()
+
+    def encode(self, entry):
+        """
+        Serialize one history entry.
+
+        Args:
+            entry (dict): The conversation entry.
+
+        Returns:
+            bytes or str: The stored value.
+        """
+        if self.codec == "binary":
+            record = self._pack(entry)
+            if record is not None:
+                return self._compress(record)
+        return json.dumps(entry)
+
+    def decode(self, data):
+        """
+        Deserialize one history entry written by any codec.
+
+        Args:
+            data (bytes or str): The stored value.
+
+        Returns:
+            dict: The conversation entry.
+        """
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data or data[0] != BINARY_V1:
+            return json.loads(data)
+
+        flags = data[1]
+        record = data[2:]
+        if flags & FLAG_ZLIB:
+            record = zlib.decompress(record)
+        elif flags & FLAG_ZSTD:
+            record = self._zstd_decompressor().decompress(record)
+
+        seconds, query_length, response_length = RECORD.unpack_from(record)
+        start = RECORD.size
+        user_query = record[start:start + query_length].decode("utf-8")
+        start += query_length
+        bot_response = record[start:start + response_length].decode("utf-8")
+        timestamp = time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds))
+        return {timestamp: {"user_query": user_query, "bot_response": bot_response}}
+
+    @staticmethod
+    def _pack(entry):
+        """
+        Pack a conversation entry into a record, or return None if it doesn't have the conversation shape.
+        """
+        if len(entry) != 1:
+            return None
+        timestamp, conversation = next(iter(entry.items()))
+        if not isinstance(conversation, dict) or set(conversation) != {"user_query", "bot_response"}:
+            return None
+        user_query, bot_response = conversation["user_query"], conversation["bot_response"]
+        if not isinstance(user_query, str) or not isinstance(bot_response, str):
+            return None
+        # fromisoformat is much faster than strptime, the round trip rejects the other ISO forms it accepts
+        if not isinstance(timestamp, str) or len(timestamp) != 19:
+            return None
+        try:
+            seconds = calendar.timegm(datetime.fromisoformat(timestamp).timetuple())
+        except ValueError:
+            return None
+        if time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds)) != timestamp:
+            return None
+
+        user_query = user_query.encode("utf-8")
+        bot_response = bot_response.encode("utf-8")
+        return RECORD.pack(seconds, len(user_query), len(bot_response)) + user_query + bot_response
+
+    def _zstd_compressor(self):
+        compressor = getattr(self._zstd_local, "compressor", None)
+        if compressor is None:
+            compressor = self._zstd_local.compressor = _zstd().ZstdCompressor()
+        return compressor
+
+    def _zstd_decompressor(self):
+        decompressor = getattr(self._zstd_local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._zstd_local.decompressor = _zstd().ZstdDecompressor()
+        return decompressor
+
+    def _compress(self, record):
+        flags = 0
+        if self.compression != "none" and len(record) > self.compression_threshold:
+            if self.compression == "zlib":
+                compressed, flag = zlib.compress(record), FLAG_ZLIB
+            else:
+                compressed, flag = self._zstd_compressor().compress(record), FLAG_ZSTD
+            if len(compressed) < len(record):
+                record, flags = compressed, flag
+        return bytes((BINARY_V1, flags)) + record
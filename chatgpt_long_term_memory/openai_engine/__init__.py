@@ -1,12 +1,43 @@
-from chatgpt_long_term_memory.openai_engine.config import (OpenAIChatConfig,
-                                                           TokenCounterConfig)
-from chatgpt_long_term_memory.openai_engine.error_handler import \
-    retry_on_openai_errors
-from chatgpt_long_term_memory.openai_engine.openai_chatbot import OpenAIChatBot
+from typing import TYPE_CHECKING
+
+from chatgpt_long_term_memory._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from chatgpt_long_term_memory.openai_engine.config import (
+        OpenAIChatConfig, RateLimitConfig, TokenCounterConfig)
+    from chatgpt_long_term_memory.openai_engine.error_handler import \
+        retry_on_openai_errors
+    from chatgpt_long_term_memory.openai_engine.openai_chatbot import \
+        OpenAIChatBot
+    from chatgpt_long_term_memory.openai_engine.rate_limiter import (
+        RateLimiter, configure_rate_limiter)
+    from chatgpt_long_term_memory.openai_engine.streaming import (
+        StreamMetrics, stream_metrics)
+
+# Public names are imported on first access, so importing the package doesn't load llama_index,
+# openai, tiktoken or redis until they are needed
+_EXPORTS = {
+    "OpenAIChatConfig": "chatgpt_long_term_memory.openai_engine.config",
+    "RateLimitConfig": "chatgpt_long_term_memory.openai_engine.config",
+    "TokenCounterConfig": "chatgpt_long_term_memory.openai_engine.config",
+    "retry_on_openai_errors": "chatgpt_long_term_memory.openai_engine.error_handler",
+    "OpenAIChatBot": "chatgpt_long_term_memory.openai_engine.openai_chatbot",
+    "RateLimiter": "chatgpt_long_term_memory.openai_engine.rate_limiter",
+    "configure_rate_limiter": "chatgpt_long_term_memory.openai_engine.rate_limiter",
+    "StreamMetrics": "chatgpt_long_term_memory.openai_engine.streaming",
+    "stream_metrics": "chatgpt_long_term_memory.openai_engine.streaming"
+}
 
 __all__ = [
     "OpenAIChatConfig",
     "OpenAIChatBot",
+    "RateLimitConfig",
+    "RateLimiter",
+    "configure_rate_limiter",
     "retry_on_openai_errors",
+    "StreamMetrics",
+    "stream_metrics",
     "TokenCounterConfig"
 ]
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
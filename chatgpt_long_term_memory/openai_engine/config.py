@@ -1,5 +1,13 @@
 from pydantic import BaseModel, Field
 
+# Context window of each chat model, in tokens
+MODELS_MAX_TOKENS = {
+    'gpt-4': 8192,
+    'gpt-4-32k': 32768,
+    'gpt-3.5-turbo': 4096,
+    'gpt-3.5-turbo-16k': 16384
+}
+
 
 class OpenAIChatConfig(BaseModel):
     model_name: str = Field(default="gpt-4")
@@ -26,6 +34,16 @@ class ContextConfig(OpenAIChatConfig):
     chunk_overlap = Field(default=0)
     max_summary_token = Field(default=256)
     summary_temperature = Field(default=0.7)
+    summary_workers = Field(default=4)
+    summary_target_tokens = Field(default=2048)
+
+
+class RateLimitConfig(BaseModel):
+    requests_per_minute: int = Field(default=0)
+    tokens_per_minute: int = Field(default=0)
+    base_delay: float = Field(default=1.0)
+    max_delay: float = Field(default=60.0)
+
 
 class TokenCounterConfig(BaseModel):
     encoding_model: str = Field(default="cl100k_base")
@@ -1,16 +1,14 @@
-import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 import openai
 
 from chatgpt_long_term_memory.openai_engine.config import ContextConfig
+from chatgpt_long_term_memory.openai_engine.credentials import \
+    set_openai_api_key
 from chatgpt_long_term_memory.openai_engine.error_handler import \
     retry_on_openai_errors
-
-# Set the OpenAI API kEY using the environment variable or a default kEY
-KEY = os.getenv("OPENAI_API_KEY",
-                "")
-openai.api_key = KEY
-os.environ["OPENAI_API_KEY"] = KEY
+from chatgpt_long_term_memory.openai_engine.rate_limiter import rate_limiter
 
 
 class CreateContext:
@@ -40,6 +38,8 @@ class CreateContext:
 
         summarize_memories(self, memories, tt_encoding):
             Summarizes a list of memories using the GPT-3.5 Chat model from OpenAI.
+            Chunks are summarized concurrently by up to `summary_workers` threads, then the summaries are
+            summarized again until they fit in `summary_target_tokens`.
 
             Args:
                 memories (List[str]): List of memories to be summarized.
@@ -65,6 +65,8 @@ class CreateContext:
         """
         super().__init__(**kw)
         self.config = context_config
+        # Set the OpenAI API key using the environment variable or a default key
+        set_openai_api_key()
 
         # like llama index summary prompt
         self.default_summary_prompt_tmpl = (
@@ -98,36 +100,133 @@ class CreateContext:
             chunks.append(tt_encoding.decode(chunk))
         return chunks
 
-    @retry_on_openai_errors(max_retry=3)
     def summarize_memories(self, memories, tt_encoding):
         """
         Summarize a list of memories using the GPT-3.5 Chat model from OpenAI.
 
+        The chunks are summarized concurrently (map), then the joined summaries are chunked and summarized
+        again (reduce) until they fit in `summary_target_tokens`. Chunk order is preserved and a failed
+        chunk request only retries that chunk.
+
         :param memories: List of memories to be summarized.
         :param tt_encoding: Tokenizer used for encoding the prompt.
         :return: The summarized text.
         """
         chuncks = self.create_gpt_chunks(
             memories, tt_encoding)
-        final_responses = []
-        for chunck in chuncks:
-            prompt = self.default_summary_prompt_tmpl.format(
-                context_str=chunck)
-            messages = [
-                {"role": "system", "content": prompt},
-            ]
-            user_massagge = {"role": "user", "content": ''}
-            messages.append(user_massagge)
-            response = openai.ChatCompletion.create(
-                model=self.config.model_name,
-                messages=messages,
-                max_tokens=self.config.max_summary_token,
-                temperature=self.config.summary_temperature,
-                top_p=self.config.top_p,
-                presence_penalty=self.config.presence_penalty,
-                frequency_penalty=self.config.frequency_penalty,
-            )
-            text = response["choices"][0]["message"]["content"].strip()
-            final_responses.append(text)
-        text = ' '.join(final_responses)
+        with ThreadPoolExecutor(max_workers=self.config.summary_workers) as executor:
+            summaries = list(executor.map(
+                lambda chunck: self._summarize_chunk(chunck, tt_encoding), chuncks))
+            text = ' '.join(summaries)
+            while self._needs_reduce(summaries, text, tt_encoding):
+                summaries = list(executor.map(
+                    lambda chunck: self._summarize_chunk(chunck, tt_encoding),
+                    self.create_gpt_chunks(text, tt_encoding)))
+                text, previous = ' '.join(summaries), text
+                if len(tt_encoding.encode(text)) >= len(tt_encoding.encode(previous)):
+                    # The summaries stopped shrinking
+                    break
         return text
+
+    async def asummarize_memories(self, memories, tt_encoding):
+        """
+        Asynchronous version of `summarize_memories`, using `openai.ChatCompletion.acreate`.
+
+        :param memories: List of memories to be summarized.
+        :param tt_encoding: Tokenizer used for encoding the prompt.
+        :return: The summarized text.
+        """
+        # Bounds the concurrent requests like the thread pool of summarize_memories
+        semaphore = asyncio.Semaphore(self.config.summary_workers)
+
+        async def summarize(chunck):
+            async with semaphore:
+                return await self._asummarize_chunk(chunck, tt_encoding)
+
+        chuncks = self.create_gpt_chunks(
+            memories, tt_encoding)
+        summaries = await asyncio.gather(*[summarize(chunck) for chunck in chuncks])
+        text = ' '.join(summaries)
+        while self._needs_reduce(summaries, text, tt_encoding):
+            summaries = await asyncio.gather(*[
+                summarize(chunck) for chunck in self.create_gpt_chunks(text, tt_encoding)])
+            text, previous = ' '.join(summaries), text
+            if len(tt_encoding.encode(text)) >= len(tt_encoding.encode(previous)):
+                break
+        return text
+
+    @retry_on_openai_errors(max_retry=3)
+    def _summarize_chunk(self, chunck, tt_encoding):
+        """
+        Summarize one chunk.
+
+        :param chunck: The text chunk to summarize.
+        :param tt_encoding: Tokenizer used for encoding the prompt.
+        :return: The summary of the chunk.
+        """
+        request = self._summary_kwargs(chunck)
+        rate_limiter.acquire(self._request_tokens(request, tt_encoding))
+        response = openai.ChatCompletion.create(**request)
+        return response["choices"][0]["message"]["content"].strip()
+
+    @retry_on_openai_errors(max_retry=3)
+    async def _asummarize_chunk(self, chunck, tt_encoding):
+        """
+        Asynchronously summarize one chunk.
+
+        :param chunck: The text chunk to summarize.
+        :param tt_encoding: Tokenizer used for encoding the prompt.
+        :return: The summary of the chunk.
+        """
+        request = self._summary_kwargs(chunck)
+        await rate_limiter.aacquire(self._request_tokens(request, tt_encoding))
+        response = await openai.ChatCompletion.acreate(**request)
+        return response["choices"][0]["message"]["content"].strip()
+
+    def _needs_reduce(self, summaries, text, tt_encoding):
+        """
+        Check whether the joined summaries need another reduce round.
+
+        :param summaries: The summaries of the last round.
+        :param text: The joined summaries.
+        :param tt_encoding: Tokenizer used for encoding the prompt.
+        :return: True if there are several summaries and they exceed `summary_target_tokens`.
+        """
+        return len(summaries) > 1 and \
+            len(tt_encoding.encode(text)) > self.config.summary_target_tokens
+
+    def _summary_kwargs(self, chunck):
+        """
+        Build the chat completion request summarizing one chunk.
+
+        :param chunck: The text chunk to summarize.
+        :return: The keyword arguments of `openai.ChatCompletion.create`.
+        """
+        prompt = self.default_summary_prompt_tmpl.format(
+            context_str=chunck)
+        messages = [
+            {"role": "system", "content": prompt},
+        ]
+        user_massagge = {"role": "user", "content": ''}
+        messages.append(user_massagge)
+        return dict(
+            model=self.config.model_name,
+            messages=messages,
+            max_tokens=self.config.max_summary_token,
+            temperature=self.config.summary_temperature,
+            top_p=self.config.top_p,
+            presence_penalty=self.config.presence_penalty,
+            frequency_penalty=self.config.frequency_penalty,
+        )
+
+    def _request_tokens(self, request, tt_encoding):
+        """
+        Estimate the tokens a summary request takes from the rate limit budget.
+
+        :param request: The keyword arguments of `openai.ChatCompletion.create`.
+        :param tt_encoding: Tokenizer used for encoding the prompt.
+        :return: The prompt tokens plus the maximum summary tokens.
+        """
+        prompt_tokens = sum(len(tt_encoding.encode(message["content"]))
+                            for message in request["messages"])
+        return prompt_tokens + request["max_tokens"]
@@ -0,0 +1,28 @@
+import os
+
+
+def set_openai_api_key(api_key: str = None):
+    """
+    Set the OpenAI API key used by the openai package and llama_index.
+
+    Called by the classes talking to OpenAI when they are created, instead of on import, so that importing
+    the package leaves the process environment alone.
+
+    A key the application already set on `openai.api_key` is kept, and the environment only ever receives a
+    non-empty key.
+
+    Args:
+        api_key (str, optional): The API key. Defaults to None, which keeps `openai.api_key` if it is set and
+                                 otherwise uses the environment variable 'OPENAI_API_KEY', if any.
+    """
+    import openai
+
+    if api_key is None:
+        if openai.api_key:
+            return
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return
+    openai.api_key = api_key
+    if api_key:
+        os.environ["OPENAI_API_KEY"] = api_key
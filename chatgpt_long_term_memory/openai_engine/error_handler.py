@@ -1,26 +1,105 @@
+import asyncio
 import functools
+import logging
+import random
+import time
 
 import openai.error
 
+from chatgpt_long_term_memory.openai_engine.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# InvalidRequestError, AuthenticationError and PermissionError fail the same way on every attempt
+RETRYABLE_ERRORS = (openai.error.RateLimitError, openai.error.Timeout, openai.error.APIError,
+                    openai.error.APIConnectionError, openai.error.ServiceUnavailableError,
+                    openai.error.TryAgain)
+
+
+def is_retryable(error):
+    """
+    Tell whether a failed OpenAI request can succeed when sent again.
+
+    :param error: the raised exception
+    :return: True for rate limits, timeouts, connection errors and server side errors
+    """
+    if not isinstance(error, RETRYABLE_ERRORS):
+        return False
+    if isinstance(error, openai.error.APIError) and error.http_status is not None:
+        return error.http_status == 429 or error.http_status >= 500
+    return True
+
+
+def retry_delay(error, retry):
+    """
+    Seconds to wait before the next attempt: the server's Retry-After hint when there is one, otherwise an
+    exponential backoff with full jitter. Rate limit errors also pause the shared rate limiter for that long.
+
+    :param error: the raised exception
+    :param retry: number of the retry, starting at 1
+    :return: the delay in seconds
+    """
+    headers = getattr(error, "headers", None) or {}
+    delay = None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            delay = float(headers.get("retry-after-ms")) / 1000
+        elif headers.get("retry-after") is not None:
+            delay = float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        # Retry-After can also be an HTTP date, fall back to the backoff
+        delay = None
+    if delay is None:
+        delay = random.uniform(0, min(rate_limiter.max_delay, rate_limiter.base_delay * 2 ** (retry - 1)))
+    if isinstance(error, openai.error.RateLimitError):
+        rate_limiter.pause(delay)
+    return delay
+
 
 def retry_on_openai_errors(max_retry):
     """
-    this function retries the function that it decorates in case of openai errors (RateLimitError, Timeout, APIError, APIConnectionError, ServiceUnavailableError, InvalidRequestError)`
-    :param max_retry: the maximum number of retries
+    this function retries the function that it decorates in case of openai errors that can succeed on retry
+    (RateLimitError, Timeout, APIConnectionError, ServiceUnavailableError, TryAgain and APIError with a 429 or 5xx status)
+    each retry waits for the server's Retry-After hint or a jittered exponential backoff
+    coroutine functions are awaited and retried the same way, sleeping without blocking the event loop
+    :param max_retry: the maximum number of attempts
     :return: the decorator
     """
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                retry = 0
+                while True:
+                    try:
+                        return await func(*args, **kwargs)
+                    except RETRYABLE_ERRORS as error:
+                        if not is_retryable(error):
+                            raise
+                        retry += 1
+                        if retry >= max_retry:
+                            raise Exception(f"Reached maximum number of retries ({max_retry})") from error
+                        delay = retry_delay(error, retry)
+                        logger.warning("Retrying %s in %.1fs (%d/%d) due to error: %s",
+                                       func.__qualname__, delay, retry, max_retry - 1, error)
+                        await asyncio.sleep(delay)
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             retry = 0
-            while retry < max_retry:
+            while True:
                 try:
                     return func(*args, **kwargs)
-                except (openai.error.RateLimitError, openai.error.Timeout, openai.error.APIError,
-                        openai.error.APIConnectionError, openai.error.ServiceUnavailableError,
-                        openai.error.InvalidRequestError) as error:
+                except RETRYABLE_ERRORS as error:
+                    if not is_retryable(error):
+                        raise
                     retry += 1
-                    print(f"Retrying {retry} time due to error: {error}")
-            raise Exception(f"Reached maximum number of retries ({max_retry})")
+                    if retry >= max_retry:
+                        raise Exception(f"Reached maximum number of retries ({max_retry})") from error
+                    delay = retry_delay(error, retry)
+                    logger.warning("Retrying %s in %.1fs (%d/%d) due to error: %s",
+                                   func.__qualname__, delay, retry, max_retry - 1, error)
+                    time.sleep(delay)
         return wrapper
     return decorator
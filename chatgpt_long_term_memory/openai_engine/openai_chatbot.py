@@ -1,11 +1,17 @@
+import time
+
 import openai
 
-from chatgpt_long_term_memory.openai_engine.config import (ContextConfig,
+from chatgpt_long_term_memory.openai_engine.config import (MODELS_MAX_TOKENS,
+                                                           ContextConfig,
                                                            OpenAIChatConfig,
                                                            TokenCounterConfig)
 from chatgpt_long_term_memory.openai_engine.create_context import CreateContext
 from chatgpt_long_term_memory.openai_engine.error_handler import \
     retry_on_openai_errors
+from chatgpt_long_term_memory.openai_engine.rate_limiter import rate_limiter
+from chatgpt_long_term_memory.openai_engine.streaming import (
+    acreate_stream, astream_content, create_stream, stream_content)
 from chatgpt_long_term_memory.openai_engine.token_counter import TokenCounter
 
 
@@ -46,21 +52,17 @@ class OpenAIChatBot:
             token_counter_config=TokenCounterConfig())
         self.create_context = CreateContext(context_config=ContextConfig())
 
-        self.models_max_tokens = {
-            'gpt-4': 8192,
-            'gpt-4-32k': 32768,
-            'gpt-3.5-turbo': 4096,
-            'gpt-3.5-turbo-16k': 16384
-        }
+        self.models_max_tokens = dict(MODELS_MAX_TOKENS)
 
     @retry_on_openai_errors(max_retry=3)
-    def chat(self, user_input, chat_history=[]):
+    def chat(self, user_input, chat_history=[], user_id=None):
         """
         This function serves as a wrapper for the OpenAI API, allowing the chatbot to generate a response to a user's query.
         The chatbot uses the specified language model and the provided chat history to generate context-aware responses.
 
         :param user_input: The user's query, a string containing the input text for the chatbot.
         :param chat_history: (Optional) The chat history with the user as a list of dictionaries, where each dictionary contains the 'role' (e.g., "user", "assistant") and 'content' (the content of the message). Defaults to an empty list.
+        :param user_id: (Optional) The user's id, passed on to `history_summary`. Defaults to None.
         :return: A string representing the chatbot's response to the user's input.
 
         The chatbot follows these steps during the response generation:
@@ -68,37 +70,179 @@ class OpenAIChatBot:
         2. The 'prompt' attribute in the chatbot's configuration is used to format the user's query within the context.
         3. The total number of tokens in the formatted prompt is counted using the 'token_counter' instance.
         4. The available token limit for the language model is calculated, considering the model's maximum token limit and the maximum token limit set for the chatbot.
-        5. If the available token limit is insufficient to accommodate the response, the chatbot summarizes the chat history using the 'create_context' instance and updates the prompt accordingly.
+        5. If the available token limit is insufficient to accommodate the response, the chatbot summarizes the chat history with 'history_summary' and updates the prompt accordingly.
         6. The chatbot sends a request to the OpenAI API using the 'openai.ChatCompletion.create()' method, passing the formatted prompt and other configuration settings.
         7. The API returns a response that contains the generated message from the language model.
         8. The chatbot extracts the assistant's response from the API response and returns it as the final output.
         """
 
+        prompt, prompt_tokens = self._chat_prompt(user_input, chat_history, user_id)
+
+        rate_limiter.acquire(prompt_tokens + self.max_tokens)
+        response = openai.ChatCompletion.create(**self._completion_kwargs(prompt))
+
+        bot_response = response["choices"][0]["message"].to_dict()
+
+        return bot_response["content"]
+
+    @retry_on_openai_errors(max_retry=3)
+    async def achat(self, user_input, chat_history=[], user_id=None):
+        """
+        Asynchronous version of `chat`, using `openai.ChatCompletion.acreate` so the event loop keeps serving
+        other users while the model answers.
+
+        :param user_input: The user's query, a string containing the input text for the chatbot.
+        :param chat_history: (Optional) The chat history with the user as a list of strings. Defaults to an empty list.
+        :param user_id: (Optional) The user's id, passed on to `ahistory_summary`. Defaults to None.
+        :return: A string representing the chatbot's response to the user's input.
+        """
+        prompt, prompt_tokens = await self._achat_prompt(user_input, chat_history, user_id)
+
+        await rate_limiter.aacquire(prompt_tokens + self.max_tokens)
+        response = await openai.ChatCompletion.acreate(**self._completion_kwargs(prompt))
+
+        bot_response = response["choices"][0]["message"].to_dict()
+
+        return bot_response["content"]
+
+    def chat_stream(self, user_input, chat_history=[], user_id=None, started=None):
+        """
+        Streaming version of `chat`, yielding the response as the model generates it.
+
+        :param user_input: The user's query, a string containing the input text for the chatbot.
+        :param chat_history: (Optional) The chat history with the user as a list of strings. Defaults to an empty list.
+        :param user_id: (Optional) The user's id, passed on to `history_summary`. Defaults to None.
+        :param started: (Optional) `time.perf_counter()` value the time to first token is measured from. Defaults to
+                        the start of the request.
+        :return: A generator of response text pieces.
+        """
+        started = started or time.perf_counter()
+        prompt, prompt_tokens = self._chat_prompt(user_input, chat_history, user_id)
+
+        rate_limiter.acquire(prompt_tokens + self.max_tokens)
+        response = create_stream(**self._completion_kwargs(prompt))
+        yield from stream_content(response, started)
+
+    async def achat_stream(self, user_input, chat_history=[], user_id=None, started=None):
+        """
+        Asynchronous version of `chat_stream`.
+
+        :param user_input: The user's query, a string containing the input text for the chatbot.
+        :param chat_history: (Optional) The chat history with the user as a list of strings. Defaults to an empty list.
+        :param user_id: (Optional) The user's id, passed on to `ahistory_summary`. Defaults to None.
+        :param started: (Optional) `time.perf_counter()` value the time to first token is measured from. Defaults to
+                        the start of the request.
+        :return: An async generator of response text pieces.
+        """
+        started = started or time.perf_counter()
+        prompt, prompt_tokens = await self._achat_prompt(user_input, chat_history, user_id)
+
+        await rate_limiter.aacquire(prompt_tokens + self.max_tokens)
+        response = await acreate_stream(**self._completion_kwargs(prompt))
+        async for content in astream_content(response, started):
+            yield content
+
+    def _chat_prompt(self, user_input, chat_history, user_id):
+        """
+        Private method to build the prompt of a chat request, summarizing the history if it doesn't fit.
+
+        :return: A tuple of the prompt and its number of tokens.
+        """
+        history, prompt = self._prompt(user_input, chat_history)
+        prompt_tokens = self.token_counter.template_token_counter(
+            self.prompt, list(chat_history or []), user_input)
+
+        if not self._fits(prompt_tokens):
+            summary_context = self.history_summary(history, user_id, user_input)
+            prompt = self.prompt.format(
+                summary_context, user_input)
+            prompt_tokens = self.token_counter.template_token_counter(
+                self.prompt, summary_context, user_input)
+        return prompt, prompt_tokens
+
+    async def _achat_prompt(self, user_input, chat_history, user_id):
+        """
+        Asynchronous version of `_chat_prompt`.
+
+        :return: A tuple of the prompt and its number of tokens.
+        """
+        history, prompt = self._prompt(user_input, chat_history)
+        prompt_tokens = self.token_counter.template_token_counter(
+            self.prompt, list(chat_history or []), user_input)
+
+        if not self._fits(prompt_tokens):
+            summary_context = await self.ahistory_summary(history, user_id, user_input)
+            prompt = self.prompt.format(
+                summary_context, user_input)
+            prompt_tokens = self.token_counter.template_token_counter(
+                self.prompt, summary_context, user_input)
+        return prompt, prompt_tokens
+
+    def history_summary(self, history, user_id=None, user_input=""):
+        """
+        Summarize the chat history when it doesn't fit in the model's context.
+
+        Clients that keep the user's history override this to reuse an incremental summary.
+
+        :param history: The joined chat history.
+        :param user_id: (Optional) The user's id. Defaults to None.
+        :param user_input: (Optional) The user's query, which shares the prompt with the summary. Defaults to "".
+        :return: The summary used as the prompt's history.
+        """
+        return self.create_context.summarize_memories(
+            history, self.token_counter.tt_encoding)
+
+    async def ahistory_summary(self, history, user_id=None, user_input=""):
+        """
+        Asynchronous version of `history_summary`.
+
+        :param history: The joined chat history.
+        :param user_id: (Optional) The user's id. Defaults to None.
+        :param user_input: (Optional) The user's query. Defaults to "".
+        :return: The summary used as the prompt's history.
+        """
+        return await self.create_context.asummarize_memories(
+            history, self.token_counter.tt_encoding)
+
+    def _prompt(self, user_input, chat_history):
+        """
+        Private method to format the prompt from the chat history and the user's query.
+
+        :return: A tuple of the joined history and the formatted prompt.
+        """
         if chat_history:
             history = "\n".join(chat_history)
         else:
             history = ""
         prompt = self.prompt.format(
             history, user_input)
+        return history, prompt
+
+    def _fits(self, total_token):
+        """
+        Private method to check that the prompt leaves room for the answer in the model's context.
 
+        :param total_token: The number of tokens of the prompt.
+        :return: False if the history needs to be summarized.
+        """
         # check token to avoid max token limit error
-        total_token = self.token_counter.prompt_token_counter(prompt)
         output_token = self.models_max_tokens[self.config.model_name] - (
             self.max_tokens + total_token)
+        return not (output_token < 0 or output_token < self.max_tokens)
 
-        if output_token < 0 or output_token < self.max_tokens:
-            summary_context = self.create_context.summarize_memories(
-                history, self.token_counter.tt_encoding)
-            prompt = self.prompt.format(
-                summary_context, user_input)
+    def _completion_kwargs(self, prompt):
+        """
+        Private method to build the chat completion request for a prompt.
 
+        :return: The keyword arguments of `openai.ChatCompletion.create`.
+        """
         messages = [
             {"role": "system", "content": prompt},
         ]
 
         messages.append({"role": "user", "content": ""})
 
-        response = openai.ChatCompletion.create(
+        return dict(
             model=self.config.model_name,
             messages=messages,
             max_tokens=self.max_tokens,
@@ -107,9 +251,3 @@ class OpenAIChatBot:
             presence_penalty=self.presence_penalty,
             frequency_penalty=self.frequency_penalty,
         )
-        messages.append(
-            {"role": "assistant", "content": response["choices"][0]["message"].content})
-
-        bot_response = response["choices"][0]["message"].to_dict()
-
-        return bot_response["content"]
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+
+from chatgpt_long_term_memory.openai_engine.config import RateLimitConfig
+
+
+class RateLimiter:
+    """
+    Client-side limiter keeping OpenAI requests within a requests-per-minute and a tokens-per-minute budget.
+
+    Both budgets are token buckets refilled continuously, each holding at most one minute of budget. Every
+    request takes one request and its estimated number of tokens (prompt plus maximum completion) from the
+    buckets, waiting until they hold enough. After a rate limit error `pause` holds back every caller
+    sharing the limiter until the server's retry hint has passed, instead of letting each of them retry.
+    A budget of 0 is unlimited.
+
+    The limiter is thread-safe and can be shared by threads and event loops.
+
+    Args:
+        requests_per_minute (int): Request budget per minute. Defaults to 0 (unlimited).
+        tokens_per_minute (int): Token budget per minute. Defaults to 0 (unlimited).
+        base_delay (float): First retry delay in seconds, doubled on every retry. Defaults to 1.
+        max_delay (float): Longest retry delay in seconds. Defaults to 60.
+
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self._lock = threading.Lock()
+        self.configure(requests_per_minute, tokens_per_minute, base_delay, max_delay)
+
+    def configure(self, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                  base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Set the budgets and retry delays. The buckets start full.
+        """
+        with self._lock:
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self.base_delay = base_delay
+            self.max_delay = max_delay
+            self._requests = float(requests_per_minute)
+            self._tokens = float(tokens_per_minute)
+            self._updated = time.monotonic()
+            self._paused_until = 0.0
+
+    def acquire(self, tokens: int = 0):
+        """
+        Block until the budgets allow one request of `tokens` tokens, and take them.
+
+        Args:
+            tokens (int): Estimated tokens of the request.
+        """
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        """
+        Asynchronous version of `acquire`, waiting without blocking the event loop.
+
+        Args:
+            tokens (int): Estimated tokens of the request.
+        """
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Hold back every request for `seconds`, e.g. after the server answered with a rate limit error.
+
+        Args:
+            seconds (float): How long to wait before the next request.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _reserve(self, tokens):
+        """
+        Take the budget of one request if available.
+
+        Returns:
+            float: 0 if the budget was taken, otherwise the seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+
+            wait = 0.0
+            if self.requests_per_minute and self._requests < 1:
+                wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                # A request larger than the whole budget waits for a full bucket
+                tokens = min(tokens, self.tokens_per_minute)
+                if self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+            if wait > 0:
+                return wait
+
+            if self.requests_per_minute:
+                self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+            return 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(float(self.requests_per_minute),
+                             self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(float(self.tokens_per_minute),
+                           self._tokens + elapsed * self.tokens_per_minute / 60)
+
+
+# Shared by every OpenAI call of the process
+rate_limiter = RateLimiter()
+
+
+def configure_rate_limiter(config: RateLimitConfig):
+    """
+    Configure the rate limiter shared by the chat, summary and retriever completions.
+
+    Args:
+        config (RateLimitConfig): The budgets and retry delays.
+    """
+    rate_limiter.configure(config.requests_per_minute, config.tokens_per_minute,
+                           config.base_delay, config.max_delay)
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+
+import openai
+
+from chatgpt_long_term_memory.openai_engine.error_handler import \
+    retry_on_openai_errors
+
+logger = logging.getLogger(__name__)
+
+
+class StreamMetrics:
+    """
+    Thread-safe time-to-first-token and duration statistics of streamed completions.
+
+    Times are measured from the moment the caller started handling the request, e.g. when `converse` was
+    called, so they include retrieval and the completion request itself.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.streams = 0
+            self.last_ttft = None
+            self.total_ttft = 0.0
+            self.max_ttft = 0.0
+            self.total_duration = 0.0
+
+    def record(self, ttft, duration):
+        """
+        Record one finished stream.
+
+        Args:
+            ttft (float): Seconds until the first token, None if no token arrived.
+            duration (float): Seconds until the stream ended.
+        """
+        with self._lock:
+            self.streams += 1
+            self.total_duration += duration
+            if ttft is not None:
+                self.last_ttft = ttft
+                self.total_ttft += ttft
+                self.max_ttft = max(self.max_ttft, ttft)
+
+    def stats(self):
+        """
+        Return the stream statistics.
+
+        Returns:
+            dict: Number of streams, last, mean and maximum time to first token, and mean stream duration,
+                  in seconds.
+        """
+        with self._lock:
+            return {
+                "streams": self.streams,
+                "last_ttft": self.last_ttft,
+                "mean_ttft": self.total_ttft / self.streams if self.streams else None,
+                "max_ttft": self.max_ttft,
+                "mean_duration": self.total_duration / self.streams if self.streams else None
+            }
+
+
+# Shared by every streamed completion of the process
+stream_metrics = StreamMetrics()
+
+
+@retry_on_openai_errors(max_retry=3)
+def create_stream(**kwargs):
+    """
+    Start a streamed chat completion. Only starting the request is retried, not a stream that broke off.
+
+    :param kwargs: the keyword arguments of `openai.ChatCompletion.create`
+    :return: the iterator of completion chunks
+    """
+    return openai.ChatCompletion.create(stream=True, **kwargs)
+
+
+@retry_on_openai_errors(max_retry=3)
+async def acreate_stream(**kwargs):
+    """
+    Asynchronous version of `create_stream`.
+
+    :param kwargs: the keyword arguments of `openai.ChatCompletion.acreate`
+    :return: the async iterator of completion chunks
+    """
+    return await openai.ChatCompletion.acreate(stream=True, **kwargs)
+
+
+def _delta(chunk):
+    return chunk["choices"][0].get("delta", {}).get("content")
+
+
+def stream_content(response, started):
+    """
+    Yield the text of a streamed completion as it arrives and record its time to first token.
+
+    :param response: the iterator returned by `create_stream`
+    :param started: `time.perf_counter()` value the times are measured from
+    :return: a generator of text pieces
+    """
+    ttft = None
+    for chunk in response:
+        content = _delta(chunk)
+        if not content:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - started
+            logger.debug("First token after %.3fs", ttft)
+        yield content
+    stream_metrics.record(ttft, time.perf_counter() - started)
+
+
+async def astream_content(response, started):
+    """
+    Asynchronous version of `stream_content`.
+
+    :param response: the async iterator returned by `acreate_stream`
+    :param started: `time.perf_counter()` value the times are measured from
+    :return: an async generator of text pieces
+    """
+    ttft = None
+    async for chunk in response:
+        content = _delta(chunk)
+        if not content:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - started
+            logger.debug("First token after %.3fs", ttft)
+        yield content
+    stream_metrics.record(ttft, time.perf_counter() - started)
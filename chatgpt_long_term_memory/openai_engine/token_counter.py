@@ -1,16 +1,81 @@
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from string import Formatter
+
 import tiktoken
 
 from chatgpt_long_term_memory.openai_engine.config import TokenCounterConfig
 
 
+@functools.lru_cache(maxsize=None)
+def get_encoding(encoding_model):
+    """
+    Return the process-wide tiktoken encoding of a model, loading it on first use.
+
+    Args:
+        encoding_model (str): Name of the tiktoken encoding.
+
+    Returns:
+        tiktoken.Encoding: The shared encoding.
+    """
+    return tiktoken.get_encoding(encoding_model)
+
+
+class TokenCountCache:
+    """
+    Thread-safe LRU cache of token counts keyed by a hash of the counted text.
+
+    Args:
+        max_entries (int): Maximum number of cached counts.
+
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text):
+        # A digest keeps long texts from being held in memory by the cache
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def put(self, key, count):
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+
 class TokenCounter:
     """
     This class represents a token counter that calculates the number of tokens in a given prompt.
 
+    Token counts are cached by a hash of the text, and templates are counted from their pre-tokenized
+    literal segments plus the cached counts of the values filled in, so a prompt whose history only gained
+    one turn costs one new encoding instead of a full re-encode. Counters with the same encoding share the
+    encoder and the cache.
+
     Attributes:
         config (TokenCounterConfig): An instance of the TokenCounterConfig class that holds the configuration
                                      parameters for the token counter.
         tt_encoding (tiktoken.Encoding): The token encoding model used to process the prompts and count tokens.
+        cache (TokenCountCache): The token count cache shared by the counters of the same encoding.
 
     Methods:
         __init__(self, token_counter_config: TokenCounterConfig, **kw): Constructor method for TokenCounter.
@@ -18,13 +83,25 @@ class TokenCounter:
         prompt_token_counter(self, prompt: str) -> int: Calculates the number of tokens in the given prompt using
                                                        the specified encoding model.
                                                        Returns the total number of tokens as an integer.
+        lines_token_counter(self, lines, separator: str = "\n") -> int: Calculates the number of tokens of joined
+                                                       lines from the cached count of every line.
+        template_token_counter(self, template: str, *args, **kwargs) -> int: Calculates the number of tokens of
+                                                       a formatted template from cached segment counts.
+        truncate(self, text: str, max_tokens: int) -> str: Cuts the text down to its first max_tokens tokens.
     """
 
+    # One cache per encoding, shared by every counter of the process
+    _caches = {}
+    _caches_lock = threading.Lock()
+
     def __init__(self, token_counter_config: TokenCounterConfig, **kw):
         # Initialize the base class (if applicable) and store the configuration.
         super().__init__(**kw)
         self.config = token_counter_config
-        self.tt_encoding = tiktoken.get_encoding(self.config.encoding_model)
+        self.tt_encoding = get_encoding(self.config.encoding_model)
+        with self._caches_lock:
+            self.cache = self._caches.setdefault(
+                self.config.encoding_model, TokenCountCache())
 
     def prompt_token_counter(self, prompt: str) -> int:
         """
@@ -36,6 +113,90 @@ class TokenCounter:
         Returns:
             int: The total number of tokens in the prompt.
         """
-        tokens = self.tt_encoding.encode(prompt)
-        total_tokens = len(tokens)
+        key = self.cache.key(prompt)
+        total_tokens = self.cache.get(key)
+        if total_tokens is None:
+            tokens = self.tt_encoding.encode(prompt)
+            total_tokens = len(tokens)
+            self.cache.put(key, total_tokens)
         return total_tokens
+
+    def lines_token_counter(self, lines, separator: str = "\n") -> int:
+        """
+        Calculate the number of tokens of lines joined by a separator, from the cached count of every line.
+
+        Parameters:
+            lines (list): The lines.
+            separator (str): The string joining the lines. Defaults to a newline.
+
+        Returns:
+            int: The total number of tokens of the joined lines.
+        """
+        if not lines:
+            return 0
+        return sum(self.prompt_token_counter(line) for line in lines) + \
+            self.prompt_token_counter(separator) * (len(lines) - 1)
+
+    def template_token_counter(self, template: str, *args, **kwargs) -> int:
+        """
+        Calculate the number of tokens of `template.format(*args, **kwargs)` without encoding the formatted text.
+
+        The template's literal segments are counted once and cached, each value is counted through the
+        cache, and lists are counted line by line as if joined by newlines. Tokens can't merge across segment
+        boundaries this way, so the result may exceed the exact count by a few tokens but doesn't fall below it
+        in practice.
+
+        Parameters:
+            template (str): A template using `str.format` fields.
+            *args: Positional values of the template.
+            **kwargs: Named values of the template.
+
+        Returns:
+            int: The number of tokens of the formatted template.
+        """
+        literals, fields = self._segments(template)
+        total_tokens = sum(self.prompt_token_counter(literal) for literal in literals)
+        position = 0
+        for field in fields:
+            if field == "":
+                value = args[position]
+                position += 1
+            elif field.isdigit():
+                value = args[int(field)]
+            else:
+                value = kwargs[field]
+            if isinstance(value, (list, tuple)):
+                total_tokens += self.lines_token_counter(value)
+            else:
+                total_tokens += self.prompt_token_counter(str(value))
+        return total_tokens
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Cut the text down to its first `max_tokens` tokens.
+
+        Parameters:
+            text (str): The text to truncate.
+            max_tokens (int): The maximum number of tokens to keep.
+
+        Returns:
+            str: The truncated text.
+        """
+        tokens = self.tt_encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.tt_encoding.decode(tokens[:max_tokens])
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _segments(template):
+        """
+        Split a template into its literal segments and the names of its fields.
+        """
+        literals, fields = [], []
+        for literal, field, _, _ in Formatter().parse(template):
+            if literal:
+                literals.append(literal)
+            if field is not None:
+                fields.append(field)
+        return tuple(literals), tuple(fields)
@@ -18,7 +18,9 @@ setup(
         'redis-chatgpt>=0.1.2',
         'llama-index>=0.7.9',
         'openai>=0.27.8',
-        'tiktoken>=0.4.0'
+        'tiktoken>=0.4.0',
+        'numpy>=1.21',
+        'redis>=4.5'
     ],
     project_urls=project_urls,
     long_description=long_description,
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+
+import fakeredis
+import fakeredis.aioredis
+import numpy as np
+import openai
+import pytest
+import tiktoken
+from llama_index.embeddings.base import BaseEmbedding
+from llama_index.indices.service_context import ServiceContext
+from llama_index.llms import MockLLM
+from llama_index.utils import globals_helper
+
+from chatgpt_long_term_memory.conversation import ChatbotClient
+from chatgpt_long_term_memory.llama_index_helpers import index_engine
+from chatgpt_long_term_memory.llama_index_helpers.config import (
+    IndexConfig, RetrieversConfig)
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+from chatgpt_long_term_memory.openai_engine import token_counter
+from chatgpt_long_term_memory.openai_engine.config import OpenAIChatConfig
+
+EMBEDDING_DIM = 64
+
+
+class WordEncoding:
+    """
+    Offline stand-in for a tiktoken encoding: one token per whitespace-separated word.
+    """
+
+    name = "words"
+
+    def encode(self, text, **kw):
+        return [word_token(word) for word in text.split()]
+
+    encode_ordinary = encode
+
+    def decode(self, tokens):
+        return " ".join(f"t{token}" for token in tokens)
+
+
+def word_token(word):
+    return int(hashlib.md5(word.encode("utf-8")).hexdigest()[:6], 16)
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Offline embedding: a bag of hashed words, so texts sharing words are similar.
+    """
+
+    calls = 0
+    # Number of texts of each batched request
+    batches = []
+
+    def _vector(self, text):
+        HashEmbedding.calls += 1
+        vector = np.full(EMBEDDING_DIM, 1e-3)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBEDDING_DIM] += 1
+        return vector.tolist()
+
+    def _get_query_embedding(self, query):
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query):
+        return self._vector(query)
+
+    def _get_text_embedding(self, text):
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts):
+        HashEmbedding.batches.append(len(texts))
+        return [self._vector(text) for text in texts]
+
+
+class Message(dict):
+    @property
+    def content(self):
+        return self["content"]
+
+    def to_dict(self):
+        return dict(self)
+
+
+def completion(messages):
+    return {"choices": [{"message": Message(role="assistant", content="answer: " + messages[0]["content"][-40:])}]}
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """
+    Keep every test off the network: tokenizers, embeddings, the LLM and chat completions are faked.
+    """
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: WordEncoding())
+    token_counter.get_encoding.cache_clear()
+    monkeypatch.setattr(globals_helper, "_tokenizer", lambda text: text.split())
+    monkeypatch.setattr(index_engine, "OpenAIEmbedding", lambda *args, **kw: HashEmbedding())
+
+    from_defaults = ServiceContext.from_defaults.__func__
+
+    def mock_from_defaults(cls, **kw):
+        kw["llm"] = MockLLM(max_tokens=64)
+        return from_defaults(cls, **kw)
+    monkeypatch.setattr(ServiceContext, "from_defaults", classmethod(mock_from_defaults))
+
+    def create(**kw):
+        return completion(kw["messages"])
+
+    async def acreate(**kw):
+        await asyncio.sleep(0)
+        return completion(kw["messages"])
+    monkeypatch.setattr(openai.ChatCompletion, "create", create)
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    HashEmbedding.calls = 0
+    HashEmbedding.batches.clear()
+    yield
+    token_counter.get_encoding.cache_clear()
+
+
+@pytest.fixture
+def embedding_batches():
+    """
+    The number of texts of each batched embedding request made during the test.
+    """
+    return HashEmbedding.batches
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_client(redis_server):
+    return fakeredis.FakeStrictRedis(server=redis_server)
+
+
+@pytest.fixture
+def async_redis_client(redis_server):
+    return fakeredis.aioredis.FakeRedis(server=redis_server)
+
+
+@pytest.fixture
+def root_path(tmp_path):
+    """
+    A root path with a knowledge base of three small files.
+    """
+    data_path = tmp_path / "resources" / "data"
+    data_path.mkdir(parents=True)
+    (data_path / "refunds.txt").write_text("Refunds are paid back within fourteen days of the purchase.")
+    (data_path / "shipping.txt").write_text("Shipping takes three to five working days inside the country.")
+    (data_path / "support.txt").write_text("Support answers emails on working days between nine and five.")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def make_client(root_path, redis_client, async_redis_client):
+    """
+    Build clients on the test's root path and fake Redis server, closing them when the test ends.
+    """
+    clients = []
+
+    def make(cls, index_config=None, retrievers_config=None, memory_config=None, **kw):
+        index_config = (index_config or IndexConfig()).copy(update={"root_path": root_path})
+        args = [index_config, retrievers_config or RetrieversConfig(), memory_config or ChatMemoryConfig()]
+        if cls is ChatbotClient:
+            args.append(kw.pop("openai_chatbot_config", None) or OpenAIChatConfig())
+        client = cls(*args, redis_client=redis_client, async_redis_client=async_redis_client, **kw)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
@@ -0,0 +1,153 @@
+import threading
+import time
+
+from llama_index.callbacks.schema import CBEventType
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.conversation.background_indexer import \
+    BackgroundIndexer
+from chatgpt_long_term_memory.llama_index_helpers.concurrent_index import (
+    ReadWriteLock, ThreadSafeCallbackManager, embed_documents)
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+
+
+def conversation_ids(index):
+    return [ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith("doc_id_")]
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def read():
+        with lock.read():
+            inside.wait()
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    assert not inside.broken
+
+
+def test_writer_excludes_readers():
+    lock = ReadWriteLock()
+    events = []
+
+    def read():
+        with lock.read():
+            events.append("read")
+
+    with lock.write():
+        reader = threading.Thread(target=read)
+        reader.start()
+        time.sleep(0.05)
+        events.append("write")
+        # The writer may take the lock again
+        with lock.read(), lock.write():
+            pass
+    reader.join()
+    assert events == ["write", "read"]
+
+
+def test_callback_traces_are_kept_per_thread():
+    manager = ThreadSafeCallbackManager([])
+    started = threading.Event()
+    errors = []
+
+    def parse():
+        try:
+            event_id = manager.on_event_start(CBEventType.NODE_PARSING)
+            started.set()
+            time.sleep(0.05)
+            manager.on_event_end(CBEventType.NODE_PARSING, event_id=event_id)
+        except Exception as error:
+            errors.append(error)
+
+    parser = threading.Thread(target=parse)
+    parser.start()
+    started.wait(5)
+    # The other thread's event doesn't end this thread's query, nor the other way around
+    with manager.as_trace("query"):
+        event_id = manager.on_event_start(CBEventType.QUERY)
+        manager.on_event_end(CBEventType.QUERY, event_id=event_id)
+        assert len(manager._trace_event_stack) == 1
+    parser.join()
+    assert errors == []
+
+
+def test_documents_are_embedded_in_one_request(make_client, embedding_batches):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    index = client.load_index("u1")
+    documents = [client.conversation_document(f"question {number}", f"answer {number}") for number in range(8)]
+
+    embedding_batches.clear()
+    nodes, embeddings = embed_documents(index, documents)
+    assert embedding_batches == [8]
+    assert len(nodes) == len(embeddings) == 8
+
+
+def test_turns_are_indexed_in_submission_order():
+    indexed = []
+    indexer = BackgroundIndexer(lambda user_id, index, conversations: indexed.extend(conversations),
+                                num_workers=2, batch_size=4)
+    for number in range(20):
+        indexer.submit("u1", None, (f"question {number}", "answer"))
+    indexer.flush()
+
+    assert indexed == [(f"question {number}", "answer") for number in range(20)]
+    stats = indexer.stats()
+    assert stats["submitted"] == stats["indexed"] == 20
+    assert stats["batches"] <= 20
+    indexer.close()
+
+
+def test_failed_batches_are_counted():
+    def index_fn(user_id, index, conversations):
+        if user_id == "broken":
+            raise RuntimeError("boom")
+
+    indexer = BackgroundIndexer(index_fn, num_workers=1)
+    indexer.submit("broken", None, ("question", "answer"))
+    indexer.submit("u1", None, ("question", "answer"))
+    indexer.close()
+
+    assert indexer.stats()["failed"] == 1
+    assert indexer.stats()["indexed"] == 1
+
+
+def test_write_behind_conversations(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(write_behind=True, shared_knowledge_base=True))
+    for number in range(6):
+        client.converse(f"question {number}", f"u{number % 2}")
+    client.flush_index_updates()
+
+    assert len(conversation_ids(client.load_index("u0"))) == 3
+    assert len(conversation_ids(client.load_index("u1"))) == 3
+    client.invalidate_index("u0")
+    assert len(conversation_ids(client.load_index("u0"))) == 3
+
+
+def test_queries_during_updates(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(storage_mode="incremental", shared_knowledge_base=True))
+    index = client.load_index("u1")
+    errors = []
+
+    def query():
+        try:
+            for _ in range(20):
+                client.retrieve_nodes("question", index)
+        except Exception as error:
+            errors.append(error)
+
+    readers = [threading.Thread(target=query) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for number in range(10):
+        client.index_conversations("u1", index, [(f"question {number}", "answer")])
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert len(conversation_ids(index)) == 10
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+from llama_index.vector_stores.types import VectorStoreQuery
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import (
+    BINARY_FNAME, NumpyVectorStore, convert_to_binary)
+
+
+def make_store(count=20, dim=16, **kw):
+    vectors = np.random.default_rng(0).normal(size=(count, dim))
+    ids = [f"node_{row}" for row in range(count)]
+    return NumpyVectorStore(embedding_dict=dict(zip(ids, vectors.tolist())),
+                            text_id_to_ref_doc_id={node_id: f"doc_{node_id}" for node_id in ids}, **kw)
+
+
+def query_ids(store, k=5):
+    query = np.random.default_rng(1).normal(size=store._dim).tolist()
+    return store.query(VectorStoreQuery(query_embedding=query, similarity_top_k=k)).ids
+
+
+def test_binary_round_trip_is_memory_mapped(tmp_path):
+    store = make_store(persist_format="binary")
+    store.persist(os.path.join(tmp_path, "vector_store.json"))
+    assert os.listdir(tmp_path) == [BINARY_FNAME]
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert loaded.memory_stats()["mapped"]
+    assert loaded.memory_stats()["resident_bytes"] == 0
+    assert query_ids(loaded) == query_ids(store)
+    assert np.allclose(loaded.get("node_3"), store.get("node_3"))
+
+
+def test_float16_binary(tmp_path):
+    store = make_store(persist_format="binary", dtype="float16")
+    store.persist(os.path.join(tmp_path, "vector_store.json"))
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert np.allclose(loaded.get("node_3"), store.get("node_3"), atol=1e-2)
+    assert query_ids(loaded) == query_ids(store)
+
+
+def test_writes_to_a_mapped_store(tmp_path):
+    make_store(persist_format="binary").persist(os.path.join(tmp_path, "vector_store.json"))
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    loaded.delete("doc_node_0")
+    loaded.persist(os.path.join(tmp_path, "vector_store.json"))
+
+    assert NumpyVectorStore.from_persist_dir(str(tmp_path)).count == 19
+
+
+def test_json_is_the_default_and_removes_the_binary_file(tmp_path):
+    make_store(persist_format="binary").persist(os.path.join(tmp_path, "vector_store.json"))
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path), persist_format="json")
+    loaded.persist(os.path.join(tmp_path, "vector_store.json"))
+
+    assert os.listdir(tmp_path) == ["vector_store.json"]
+    assert NumpyVectorStore.from_persist_dir(str(tmp_path)).count == 20
+
+
+def test_existing_json_is_kept_in_sync(tmp_path):
+    json_path = os.path.join(tmp_path, "vector_store.json")
+    make_store().persist(json_path)
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path), persist_format="binary")
+    loaded.delete("doc_node_0")
+    loaded.persist(json_path)
+
+    assert sorted(os.listdir(tmp_path)) == [BINARY_FNAME, "vector_store.json"]
+    assert NumpyVectorStore.from_persist_path(json_path).count == 19
+    assert NumpyVectorStore.from_persist_dir(str(tmp_path)).count == 19
+
+
+def test_convert_to_binary(tmp_path):
+    make_store().persist(os.path.join(tmp_path, "vector_store.json"))
+
+    assert convert_to_binary(str(tmp_path)) == 20
+    assert os.listdir(tmp_path) == [BINARY_FNAME]
+    assert NumpyVectorStore.from_persist_dir(str(tmp_path)).count == 20
+
+
+def test_client_storage_formats(make_client):
+    client = make_client(ChatGPTClient)
+    client.converse("hello", "u1")
+    path = f"{client.root_path}/storages/storage_u1"
+    assert not os.path.exists(os.path.join(path, BINARY_FNAME))
+
+    binary = make_client(ChatGPTClient, IndexConfig(persist_format="binary"))
+    binary.converse("hello", "u2")
+    path = f"{binary.root_path}/storages/storage_u2"
+    assert os.path.exists(os.path.join(path, BINARY_FNAME))
+    assert not os.path.exists(os.path.join(path, "vector_store.json"))
+    binary.invalidate_index("u2")
+    assert binary.load_index("u2").vector_store.count == 4
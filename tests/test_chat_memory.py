@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+
+
+def make_memory(redis_client, async_redis_client, **kw):
+    return ChatMemory(ChatMemoryConfig(**kw), redis_client=redis_client, async_redis_client=async_redis_client)
+
+
+def queries(entries):
+    return [list(entry.values())[0]["user_query"] for entry in entries]
+
+
+def legacy_entry(number):
+    return {f"2024-01-01 00:00:{number:02d}": {"user_query": f"old {number}", "bot_response": f"old answer {number}"}}
+
+
+@pytest.fixture
+def memory(redis_client, async_redis_client):
+    return make_memory(redis_client, async_redis_client)
+
+
+def test_conversations_are_list_items(memory, redis_client):
+    for number in range(3):
+        memory.add_conversation("u1", (f"question {number}", f"answer {number}"))
+
+    assert redis_client.type("u1_history") == b"list"
+    assert redis_client.llen("u1_history") == 3
+    assert queries(memory.get("u1")) == ["question 0", "question 1", "question 2"]
+    assert memory.history_length("u1") == 3
+
+
+def test_latest_conversations(memory):
+    for number in range(5):
+        memory.add_conversation("u1", (f"question {number}", f"answer {number}"))
+
+    assert queries(memory.get_latest("u1", 2)) == ["question 3", "question 4"]
+    assert queries(memory.add_conversation("u1", ("question 5", "answer 5"), tail=1)) == ["question 5"]
+    assert memory.get_latest("u1", 0) == []
+
+
+def test_legacy_history_is_migrated(memory, redis_client):
+    redis_client.set("u1_data", json.dumps([legacy_entry(0), legacy_entry(1)]))
+
+    memory.add_conversation("u1", ("new question", "new answer"))
+
+    assert queries(memory.get("u1")) == ["old 0", "old 1", "new question"]
+    assert not redis_client.exists("u1_data")
+
+
+def test_migrate_histories(memory, redis_client):
+    redis_client.set("u1_data", json.dumps([legacy_entry(0)]))
+    redis_client.set("u2_data", json.dumps([legacy_entry(0), legacy_entry(1)]))
+
+    assert memory.migrate_histories() == 2
+    assert redis_client.llen("u1_history") == 1
+    assert redis_client.llen("u2_history") == 2
+    assert not redis_client.keys("*_data")
+
+
+def test_legacy_backend(redis_client, async_redis_client):
+    memory = make_memory(redis_client, async_redis_client, history_backend="legacy")
+    for number in range(2):
+        memory.add_conversation("u1", (f"question {number}", f"answer {number}"))
+
+    assert not redis_client.exists("u1_history")
+    assert queries(memory.get("u1")) == ["question 0", "question 1"]
+    assert queries(memory.get_latest("u1", 1)) == ["question 1"]
+
+
+def test_async_appends(memory):
+    async def converse():
+        for number in range(2):
+            await memory.aadd_conversation("u1", (f"question {number}", f"answer {number}"))
+        return await memory.aget_latest("u1", 2)
+
+    assert queries(asyncio.run(converse())) == ["question 0", "question 1"]
+    assert memory.history_length("u1") == 2
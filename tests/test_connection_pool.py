@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+import redis
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.conversation.callbacks import callback_args
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.memory import connection_pool
+from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+from chatgpt_long_term_memory.memory.connection_pool import (
+    async_connection_pool, shared_connection_pool)
+
+
+@pytest.fixture(autouse=True)
+def pools(monkeypatch):
+    """
+    Keep the pools created by a test out of the process-wide ones.
+    """
+    pools = {}
+    monkeypatch.setattr(connection_pool, "_pools", pools)
+    yield pools
+    for pool in pools.values():
+        pool.disconnect()
+
+
+@pytest.fixture
+def round_trips(monkeypatch, redis_client):
+    """
+    Count the commands sent to Redis one by one and the pipelines executed.
+    """
+    trips = []
+    execute_command = redis_client.execute_command
+    execute = redis.client.Pipeline.execute
+
+    def counting_command(*args, **kw):
+        trips.append(args[0])
+        return execute_command(*args, **kw)
+
+    def counting_execute(pipe, *args, **kw):
+        trips.append("EXEC")
+        return execute(pipe, *args, **kw)
+    monkeypatch.setattr(redis_client, "execute_command", counting_command)
+    monkeypatch.setattr(redis.client.Pipeline, "execute", counting_execute)
+    return trips
+
+
+def test_pool_is_shared_per_settings():
+    pool = shared_connection_pool(ChatMemoryConfig(redis_max_connections=5))
+
+    assert isinstance(pool, redis.BlockingConnectionPool)
+    assert pool.max_connections == 5
+    assert shared_connection_pool(ChatMemoryConfig(redis_max_connections=5)) is pool
+    assert shared_connection_pool(ChatMemoryConfig(redis_max_connections=6)) is not pool
+    assert shared_connection_pool(ChatMemoryConfig(redis_max_connections=5, redis_port=6380)) is not pool
+
+
+def test_memories_share_the_pool():
+    config = ChatMemoryConfig(redis_host="localhost")
+    first = ChatMemory(config)
+    second = ChatMemory(config)
+
+    assert first.redis_db.redis_con.connection_pool is second.redis_db.redis_con.connection_pool
+    # Asyncio connections belong to one event loop, each memory has its own pool
+    assert first.async_redis_con.connection_pool is not second.async_redis_con.connection_pool
+
+
+def test_async_pools_are_not_shared():
+    config = ChatMemoryConfig()
+
+    assert async_connection_pool(config) is not async_connection_pool(config)
+
+
+def test_append_reads_the_tail_in_one_round_trip(redis_client, async_redis_client, round_trips):
+    memory = ChatMemory(ChatMemoryConfig(), redis_client=redis_client, async_redis_client=async_redis_client)
+    memory.add_conversation("u1", ("question 0", "answer 0"))
+
+    round_trips.clear()
+    latest = memory.add_conversation("u1", ("question 1", "answer 1"), tail=2)
+    assert round_trips == ["EXEC"]
+    assert [list(entry.values())[0]["user_query"] for entry in latest] == ["question 0", "question 1"]
+
+
+def test_async_append_reads_the_tail(redis_client, async_redis_client):
+    memory = ChatMemory(ChatMemoryConfig(), redis_client=redis_client, async_redis_client=async_redis_client)
+
+    async def append():
+        await memory.aadd_conversation("u1", ("question 0", "answer 0"))
+        return await memory.aadd_conversation("u1", ("question 1", "answer 1"), tail=1)
+
+    latest = asyncio.run(append())
+    assert [list(entry.values())[0]["user_query"] for entry in latest] == ["question 1"]
+
+
+def test_callback_gets_the_newest_turn(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    received = []
+
+    client.converse_callback("question", "u1", lambda user_id, index, latest: received.append(latest))
+    assert list(received[0][0].values())[0]["user_query"] == "question"
+    # Callbacks taking only the user and the index keep working
+    client.converse_callback("question", "u1", lambda user_id, index: received.append(user_id))
+    assert received[1] == "u1"
+
+
+def test_callback_args():
+    def two(user_id, index):
+        pass
+
+    def three(user_id, index, latest):
+        pass
+
+    def variadic(*args):
+        pass
+
+    assert callback_args(two, "u1", "index", ["turn"]) == ("u1", "index")
+    assert callback_args(three, "u1", "index", ["turn"]) == ("u1", "index", ["turn"])
+    assert callback_args(variadic, "u1", "index", ["turn"]) == ("u1", "index", ["turn"])
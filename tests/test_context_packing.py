@@ -0,0 +1,77 @@
+import pytest
+
+from chatgpt_long_term_memory.llama_index_helpers.config import \
+    RetrieversConfig
+from chatgpt_long_term_memory.llama_index_helpers.retrievers_engine import \
+    Retrievers
+from chatgpt_long_term_memory.openai_engine.config import MODELS_MAX_TOKENS
+
+
+def words(count, word="word"):
+    return " ".join([word] * count)
+
+
+def make_retrievers(**kw):
+    return Retrievers(RetrieversConfig(**kw))
+
+
+def tokens(retrievers, text):
+    return retrievers.token_counter.prompt_token_counter(text)
+
+
+def test_nodes_are_kept_in_score_order():
+    retrievers = make_retrievers()
+    nodes = [words(10, "first"), words(10, "second"), words(10, "third")]
+
+    assert retrievers.pack_nodes(nodes, 100) == nodes
+    # Each node takes one more token for the newline joining it
+    assert retrievers.pack_nodes(nodes, 22) == nodes[:2]
+
+
+def test_node_over_the_budget_is_truncated():
+    retrievers = make_retrievers(min_truncated_tokens=5)
+    nodes = [words(10, "first"), words(50, "second")]
+
+    packed = retrievers.pack_nodes(nodes, 30)
+    assert packed[0] == nodes[0]
+    assert tokens(retrievers, packed[1]) == 30 - 11 - 1
+
+
+def test_small_remainder_drops_the_node():
+    retrievers = make_retrievers(min_truncated_tokens=32)
+    nodes = [words(10, "first"), words(50, "second"), words(5, "third")]
+
+    # The second node can't be cut to a useful size, the smaller third one still fits
+    assert retrievers.pack_nodes(nodes, 30) == [nodes[0], nodes[2]]
+
+
+def test_prompt_fits_whatever_the_retrieval():
+    retrievers = make_retrievers(model_name="gpt-3.5-turbo", max_tokens=1000)
+    nodes = [words(800, f"node{number}") for number in range(20)]
+
+    messages, total_token = retrievers._answer_messages("what is the refund policy?", nodes)
+    assert total_token + retrievers.max_tokens <= MODELS_MAX_TOKENS["gpt-3.5-turbo"]
+    assert messages[0]["role"] == "system"
+    assert "node0" in messages[0]["content"]
+
+
+def test_context_budget_caps_the_context():
+    retrievers = make_retrievers(context_budget=50, min_truncated_tokens=5)
+    nodes = [words(40, "first"), words(40, "second")]
+
+    messages, _ = retrievers._answer_messages("question", nodes)
+    context = messages[0]["content"].split("History: ")[1].split("\n        Human:")[0]
+    assert context.startswith(nodes[0])
+    assert tokens(retrievers, context) <= 50
+
+
+def test_question_leaving_no_room_is_rejected():
+    retrievers = make_retrievers(model_name="gpt-3.5-turbo", max_tokens=1000)
+
+    with pytest.raises(AssertionError):
+        retrievers._answer_messages(words(4000), ["node"])
+
+
+def test_unknown_model_is_rejected():
+    with pytest.raises(AssertionError):
+        make_retrievers(model_name="gpt-unknown")
@@ -0,0 +1,89 @@
+import pytest
+
+from chatgpt_long_term_memory.conversation import (ChatbotClient,
+                                                   ChatGPTClient,
+                                                   ConverseManyError)
+from chatgpt_long_term_memory.conversation.batch import map_settled
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+
+
+def conversation_count(index):
+    return len([ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith("doc_id_")])
+
+
+def fail_on(client, failing_question):
+    generate = client._generate_answer
+
+    def generate_answer(question, *args, **kw):
+        if question == failing_question:
+            raise RuntimeError("boom")
+        return generate(question, *args, **kw)
+    client._generate_answer = generate_answer
+
+
+def test_map_settled_keeps_order_and_errors():
+    def half(value):
+        if value == 3:
+            raise ValueError(value)
+        return value / 2
+
+    results = map_settled(half, 4, range(6))
+    assert results[:3] == [0, 0.5, 1]
+    assert isinstance(results[3], ValueError)
+    assert results[4:] == [2, 2.5]
+
+
+@pytest.mark.parametrize("cls", [ChatGPTClient, ChatbotClient])
+def test_batch_of_several_users(make_client, cls):
+    client = make_client(cls, IndexConfig(shared_knowledge_base=True))
+    items = [(f"question {number}", f"u{number % 3}") for number in range(9)]
+
+    results = client.converse_many(items, max_workers=4)
+
+    assert len(results) == 9
+    assert all(response for _, response in results)
+    for number in range(3):
+        assert conversation_count(client.load_index(f"u{number}")) == 3
+        assert client.history_length(f"u{number}") == 3
+    assert results[0][0] is client.load_index("u0")
+
+
+def test_failed_item_fails_alone(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    fail_on(client, "question 1")
+    items = [(f"question {number}", "u1") for number in range(4)]
+
+    with pytest.raises(ConverseManyError) as raised:
+        client.converse_many(items)
+
+    assert list(raised.value.errors) == [1]
+    assert [type(result).__name__ for result in raised.value.results] == ["tuple", "RuntimeError", "tuple", "tuple"]
+    assert conversation_count(client.load_index("u1")) == 3
+    assert client.history_length("u1") == 3
+
+
+def test_return_exceptions(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    fail_on(client, "question 0")
+
+    results = client.converse_many([("question 0", "u1"), ("question 1", "u2")], return_exceptions=True)
+    assert isinstance(results[0], RuntimeError)
+    assert isinstance(results[1], tuple)
+    assert client.converse_many([]) == []
+
+
+def test_indexing_failure_keeps_the_history(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    index_conversations = client.index_conversations
+
+    def failing_index(user_id, index, conversations):
+        if user_id == "u2":
+            raise OSError("disk full")
+        return index_conversations(user_id, index, conversations)
+    client.index_conversations = failing_index
+
+    results = client.converse_many([("question 0", "u1"), ("question 1", "u2"), ("question 2", "u2")],
+                                   return_exceptions=True)
+    assert isinstance(results[0], tuple)
+    assert all(isinstance(result, OSError) for result in results[1:])
+    assert client.history_length("u2") == 2
@@ -0,0 +1,114 @@
+import json
+import threading
+
+import pytest
+
+from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+from chatgpt_long_term_memory.memory.history_codec import (BINARY_V1,
+                                                           FLAG_ZLIB,
+                                                           FLAG_ZSTD,
+                                                           HistoryCodec)
+
+
+def entry(query="question", response="answer", timestamp="2024-05-01 12:30:45"):
+    return {timestamp: {"user_query": query, "bot_response": response}}
+
+
+@pytest.mark.parametrize("codec", ["json", "binary"])
+@pytest.mark.parametrize("compression", ["none", "zlib", "zstd"])
+def test_round_trip(codec, compression):
+    history_codec = HistoryCodec(codec, compression, compression_threshold=16)
+
+    for value in [entry(), entry("é ü 漢字", "long " * 200), entry("", "")]:
+        assert history_codec.decode(history_codec.encode(value)) == value
+
+
+def test_json_codec_writes_json():
+    assert json.loads(HistoryCodec("json").encode(entry())) == entry()
+
+
+def test_binary_record_is_smaller():
+    value = entry("how long do refunds take?", "Refunds are paid back within fourteen days.")
+
+    encoded = HistoryCodec("binary").encode(value)
+    assert encoded[0] == BINARY_V1
+    assert len(encoded) < len(json.dumps(value))
+
+
+@pytest.mark.parametrize("compression, flag", [("zlib", FLAG_ZLIB), ("zstd", FLAG_ZSTD)])
+def test_long_records_are_compressed(compression, flag):
+    codec = HistoryCodec("binary", compression, compression_threshold=512)
+
+    assert codec.encode(entry())[1] == 0
+    assert codec.encode(entry(response="answer " * 200))[1] == flag
+
+
+def test_incompressible_record_is_stored_as_is():
+    codec = HistoryCodec("binary", "zlib", compression_threshold=0)
+
+    assert codec.encode(entry("q", "a"))[1] == 0
+
+
+@pytest.mark.parametrize("value", [
+    {"2024-05-01 12:30:45": {"user_query": "question"}},
+    {"2024-05-01T12:30:45": {"user_query": "question", "bot_response": "answer"}},
+    {"not a time": {"user_query": "question", "bot_response": "answer"}},
+    {"summary": "text", "watermark": 3},
+])
+def test_other_entries_stay_json(value):
+    encoded = HistoryCodec("binary").encode(value)
+
+    assert isinstance(encoded, str)
+    assert HistoryCodec("binary").decode(encoded) == value
+
+
+def test_any_codec_reads_every_format():
+    values = [HistoryCodec("json").encode(entry("first")),
+              HistoryCodec("binary", "none").encode(entry("second")),
+              HistoryCodec("binary", "zstd", 0).encode(entry("third", "answer " * 100)),
+              json.dumps(entry("fourth")).encode("utf-8")]
+
+    for codec in [HistoryCodec("json"), HistoryCodec("binary", "zlib")]:
+        assert [list(codec.decode(value).values())[0]["user_query"] for value in values] == \
+            ["first", "second", "third", "fourth"]
+
+
+def test_zstd_is_safe_across_threads():
+    codec = HistoryCodec("binary", "zstd", compression_threshold=0)
+    errors = []
+
+    def round_trips(number):
+        try:
+            for turn in range(200):
+                value = entry(f"question {number} {turn}", f"answer {number} " * 50)
+                assert codec.decode(codec.encode(value)) == value
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=round_trips, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(AssertionError):
+        HistoryCodec("pickle")
+    with pytest.raises(AssertionError):
+        HistoryCodec("binary", "lzma")
+
+
+def test_history_mixes_codecs(redis_client, async_redis_client):
+    def memory(codec):
+        return ChatMemory(ChatMemoryConfig(history_codec=codec), redis_client=redis_client,
+                          async_redis_client=async_redis_client)
+
+    memory("json").add_conversation("u1", ("question 0", "answer 0"))
+    memory("binary").add_conversation("u1", ("question 1", "answer 1"))
+
+    for codec in ["json", "binary"]:
+        assert [list(turn.values())[0]["user_query"] for turn in memory(codec).get("u1")] == \
+            ["question 0", "question 1"]
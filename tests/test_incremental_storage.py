@@ -0,0 +1,78 @@
+import os
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.llama_index_helpers.incremental_storage import \
+    LOG_FNAME
+
+
+def storage_path(client, user_id):
+    return f"{client.root_path}/storages/storage_{user_id}"
+
+
+def conversation_ids(index):
+    return sorted(ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith("doc_id_"))
+
+
+def incremental_client(make_client, **kw):
+    return make_client(ChatGPTClient, IndexConfig(storage_mode="incremental", shared_knowledge_base=True, **kw))
+
+
+def test_updates_are_appended_to_the_log(make_client):
+    client = incremental_client(make_client, compaction_threshold=1000)
+    client.load_index("u1")
+    path = storage_path(client, "u1")
+    snapshot = os.path.getmtime(os.path.join(path, "docstore.json"))
+
+    for number in range(3):
+        client.converse(f"question {number}", "u1")
+
+    with open(os.path.join(path, LOG_FNAME), "rb") as f:
+        assert len(f.readlines()) == 3
+    assert os.path.getmtime(os.path.join(path, "docstore.json")) == snapshot
+
+
+def test_log_is_replayed_on_load(make_client):
+    client = incremental_client(make_client, compaction_threshold=1000)
+    for number in range(3):
+        client.converse(f"question {number}", "u1")
+    expected = conversation_ids(client.load_index("u1"))
+
+    client.invalidate_index("u1")
+    reloaded = client.load_index("u1")
+    assert conversation_ids(reloaded) == expected
+    assert reloaded.vector_store.count == len(expected)
+
+
+def test_torn_tail_is_truncated(make_client):
+    client = incremental_client(make_client, compaction_threshold=1000)
+    for number in range(2):
+        client.converse(f"question {number}", "u1")
+    log_path = os.path.join(storage_path(client, "u1"), LOG_FNAME)
+    with open(log_path, "rb") as f:
+        intact = f.read()
+    with open(log_path, "ab") as f:
+        f.write(b'{"op": "insert", "ref_doc_id": "doc_id_torn", "nod')
+
+    client.invalidate_index("u1")
+    index = client.load_index("u1")
+    assert len(conversation_ids(index)) == 2
+    with open(log_path, "rb") as f:
+        assert f.read() == intact
+
+    # Appends after the truncation start on a clean line
+    client.converse("question 2", "u1")
+    client.invalidate_index("u1")
+    assert len(conversation_ids(client.load_index("u1"))) == 3
+
+
+def test_compaction_truncates_the_log(make_client):
+    client = incremental_client(make_client, compaction_threshold=2)
+    client.incremental_storage.background_compaction = False
+    for number in range(3):
+        client.converse(f"question {number}", "u1")
+
+    with open(os.path.join(storage_path(client, "u1"), LOG_FNAME), "rb") as f:
+        assert len(f.readlines()) == 1
+    client.invalidate_index("u1")
+    assert len(conversation_ids(client.load_index("u1"))) == 3
@@ -0,0 +1,72 @@
+import time
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.llama_index_helpers.index_cache import \
+    IndexCache
+
+
+def conversation_ids(index):
+    return sorted(ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith("doc_id_"))
+
+
+def test_lru_eviction():
+    cache = IndexCache(max_size=2)
+    cache.put("a", "index a")
+    cache.put("b", "index b")
+    assert cache.get("a") == "index a"
+    cache.put("c", "index c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "index a"
+    assert cache.get("c") == "index c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = IndexCache(max_size=2, ttl=10)
+    cache.put("a", "index a")
+    now[0] += 5
+    assert cache.get("a") == "index a"
+    now[0] += 10
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+def test_version_mismatch_is_a_miss():
+    cache = IndexCache()
+    cache.put("a", "index a", version=1)
+    assert cache.get("a", version=1) == "index a"
+    assert cache.get("a") == "index a"
+    assert cache.get("a", version=2) is None
+    assert "a" not in cache
+
+
+def test_disabled_cache():
+    cache = IndexCache(max_size=0)
+    cache.put("a", "index a")
+    assert cache.get("a") is None
+
+
+def test_hot_user_is_served_from_memory(make_client):
+    client = make_client(ChatGPTClient)
+    index = client.load_index("u1")
+    client.converse("how long do refunds take", "u1")
+    client.converse("and shipping", "u1")
+
+    assert client.load_index("u1") is index
+    assert len(conversation_ids(index)) == 2
+    assert client.index_cache.stats()["hits"] >= 3
+
+
+def test_write_from_another_instance_reloads(make_client):
+    first = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    second = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    first.converse("first question", "u1")
+    second.converse("second question", "u1")
+    first.converse("third question", "u1")
+
+    first.invalidate_index("u1")
+    assert len(conversation_ids(first.load_index("u1"))) == 3
@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.llama_index_helpers.index_engine import \
+    CONVERSATION_PREFIX
+from chatgpt_long_term_memory.llama_index_helpers.kb_manifest import (
+    KB_PREFIX, MANIFEST_FNAME, KBManifest, kb_doc_prefix)
+
+
+def kb_texts(index):
+    return sorted(index.docstore.get_node(node_id).get_content()
+                  for ref_doc_id, ref_doc_info in index.ref_doc_info.items() if ref_doc_id.startswith(KB_PREFIX)
+                  for node_id in ref_doc_info.node_ids)
+
+
+@pytest.fixture
+def data_path(root_path):
+    return os.path.join(root_path, "resources", "data")
+
+
+def write(data_path, name, text):
+    with open(os.path.join(data_path, name), "w") as f:
+        f.write(text)
+
+
+def test_manifest_diff(data_path, tmp_path):
+    manifest = KBManifest()
+    added, modified, removed, unchanged, entries = manifest.diff(data_path)
+    assert added == ["refunds.txt", "shipping.txt", "support.txt"]
+    for relpath, entry in entries.items():
+        manifest.files[relpath] = dict(entry, ref_doc_ids=[])
+    manifest.save(str(tmp_path))
+    manifest = KBManifest.load(str(tmp_path))
+
+    write(data_path, "refunds.txt", "Refunds are paid back within thirty days of the purchase.")
+    write(data_path, "returns.txt", "Returns are free.")
+    os.remove(os.path.join(data_path, "shipping.txt"))
+    # Touched without changing the content
+    stat = os.stat(os.path.join(data_path, "support.txt"))
+    os.utime(os.path.join(data_path, "support.txt"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    added, modified, removed, unchanged, entries = manifest.diff(data_path)
+    assert (added, modified, removed, unchanged) == (["returns.txt"], ["refunds.txt"], ["shipping.txt"],
+                                                     ["support.txt"])
+    assert sorted(entries) == ["refunds.txt", "returns.txt", "support.txt"]
+
+
+def test_fingerprint_follows_the_content():
+    files = {"a.txt": {"sha256": "1"}, "b.txt": {"sha256": "2"}}
+
+    assert KBManifest(files).fingerprint() == KBManifest(dict(reversed(list(files.items())))).fingerprint()
+    assert KBManifest(files).fingerprint() != KBManifest({"a.txt": {"sha256": "1"}}).fingerprint()
+
+
+def test_doc_prefix_is_stable():
+    assert kb_doc_prefix("refunds.txt") == kb_doc_prefix("refunds.txt")
+    assert kb_doc_prefix("refunds.txt") != kb_doc_prefix("shipping.txt")
+    assert kb_doc_prefix("refunds.txt").startswith(KB_PREFIX)
+
+
+def test_unchanged_knowledge_base_is_not_read(make_client, embedding_batches):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    client.load_kb_index()
+    embedding_batches.clear()
+
+    assert client.ingest() == {"added": 0, "modified": 0, "removed": 0, "unchanged": 3}
+    assert embedding_batches == []
+
+
+def test_only_changed_files_are_embedded(make_client, data_path, embedding_batches):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    kb_index = client.load_kb_index()
+    embedding_batches.clear()
+
+    write(data_path, "refunds.txt", "Refunds are paid back within thirty days of the purchase.")
+    write(data_path, "returns.txt", "Returns are free.")
+    os.remove(os.path.join(data_path, "shipping.txt"))
+
+    assert client.ingest() == {"added": 1, "modified": 1, "removed": 1, "unchanged": 1}
+    assert embedding_batches == [2]
+    assert client.load_kb_index() is kb_index
+    texts = kb_texts(kb_index)
+    assert len(texts) == 3
+    assert any("thirty days" in text for text in texts)
+    assert any("Returns are free" in text for text in texts)
+    assert not any("fourteen" in text or "Shipping" in text for text in texts)
+
+
+def test_ingest_is_persisted(make_client, data_path):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    client.load_kb_index()
+    write(data_path, "returns.txt", "Returns are free.")
+    client.ingest()
+
+    reloaded = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    assert len(kb_texts(reloaded.load_kb_index())) == 4
+    assert reloaded.ingest()["unchanged"] == 4
+
+
+@pytest.mark.parametrize("storage_mode", ["full", "incremental"])
+def test_user_copy_keeps_the_conversations(make_client, data_path, storage_mode):
+    client = make_client(ChatGPTClient, IndexConfig(storage_mode=storage_mode))
+    client.converse("how long do refunds take?", "u1")
+
+    write(data_path, "refunds.txt", "Refunds are paid back within thirty days of the purchase.")
+    assert client.ingest(user_id="u1")["modified"] == 1
+
+    client.invalidate_index("u1")
+    index = client.load_index("u1")
+    assert len(kb_texts(index)) == 3
+    assert any("thirty days" in text for text in kb_texts(index))
+    assert any(ref_doc_id.startswith(CONVERSATION_PREFIX) for ref_doc_id in index.ref_doc_info)
+
+
+def test_index_without_manifest_is_read_again(make_client, embedding_batches):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    client.load_kb_index()
+    os.remove(os.path.join(client.kb_path, MANIFEST_FNAME))
+    embedding_batches.clear()
+
+    assert client.ingest()["added"] == 3
+    assert embedding_batches == [3]
+    # The documents read before are replaced, not duplicated
+    assert len(kb_texts(client.load_kb_index())) == 3
+    assert client.ingest()["unchanged"] == 3
+
+
+def test_ingest_needs_a_knowledge_base(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(knowledge_base=False))
+
+    with pytest.raises(AssertionError):
+        client.ingest()
@@ -0,0 +1,91 @@
+import os
+import shutil
+
+import numpy as np
+from llama_index.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.vector_stores.types import (NodeWithEmbedding,
+                                             VectorStoreQuery)
+
+from chatgpt_long_term_memory.llama_index_helpers.ivf_index import IVF_FNAME
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import \
+    NumpyVectorStore
+
+
+def clustered_vectors(count=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(40, dim))
+    return (centers[rng.integers(0, 40, count)] + 0.2 * rng.normal(size=(count, dim))).astype(np.float32)
+
+
+def make_store(vectors, **kw):
+    ids = [f"node_{row}" for row in range(len(vectors))]
+    return NumpyVectorStore(embedding_dict=dict(zip(ids, vectors.tolist())),
+                            text_id_to_ref_doc_id={node_id: f"doc_{node_id}" for node_id in ids}, **kw)
+
+
+def ivf_store(vectors, **kw):
+    store = make_store(vectors, index_type="ivf", ivf_nlist=40, ivf_min_train_size=100, **kw)
+    assert store.build_ann_index()
+    return store
+
+
+def top_ids(store, query, k=10, **kw):
+    return store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k), **kw).ids
+
+
+def test_recall_against_exact_search():
+    vectors = clustered_vectors()
+    exact, store = make_store(vectors), ivf_store(vectors)
+    queries = clustered_vectors(20, seed=1)
+
+    found = sum(len(set(top_ids(store, query)) & set(top_ids(exact, query))) for query in queries)
+    assert found / (10 * len(queries)) >= 0.9
+    # Probing every cluster is an exact search
+    for query in queries[:5]:
+        assert top_ids(store, query, nprobe=40) == top_ids(exact, query)
+
+
+def test_small_stores_use_exact_search():
+    vectors = clustered_vectors(50)
+    store = make_store(vectors, index_type="ivf", ivf_min_train_size=100)
+    assert not store._ann_ready()
+    assert top_ids(store, vectors[3]) == top_ids(make_store(vectors), vectors[3])
+
+
+def test_persisted_clusters_are_loaded(tmp_path):
+    vectors = clustered_vectors()
+    store = ivf_store(vectors, persist_format="binary")
+    store.persist(os.path.join(tmp_path, "vector_store.json"))
+    assert os.path.exists(os.path.join(tmp_path, IVF_FNAME))
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path), index_type="ivf", ivf_min_train_size=100)
+    assert loaded._ivf.trained
+    assert loaded._ivf.trained_size == len(vectors)
+    query = clustered_vectors(1, seed=2)[0]
+    assert top_ids(loaded, query) == top_ids(store, query)
+
+
+def test_clusters_of_another_store_are_ignored(tmp_path):
+    trained, other = tmp_path / "trained", tmp_path / "other"
+    ivf_store(clustered_vectors()).persist(os.path.join(trained, "vector_store.json"))
+    make_store(clustered_vectors(1500)).persist(os.path.join(other, "vector_store.json"))
+    shutil.copy(os.path.join(trained, IVF_FNAME), os.path.join(other, IVF_FNAME))
+
+    loaded = NumpyVectorStore.from_persist_dir(str(other), index_type="ivf", ivf_min_train_size=10000)
+    assert not loaded._ivf.trained
+
+
+def test_updates_after_training():
+    vectors = clustered_vectors()
+    store = ivf_store(vectors)
+    new_vector = clustered_vectors(1, seed=3)[0]
+    node = TextNode(text="new", id_="node_new",
+                    relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id="doc_new")})
+    store.add([NodeWithEmbedding(node=node, embedding=new_vector.tolist())])
+    assert top_ids(store, new_vector, k=1) == ["node_new"]
+
+    store.delete("doc_new")
+    assert "node_new" not in top_ids(store, new_vector)
+    nearest = top_ids(store, vectors[11], k=1)[0]
+    store.delete(f"doc_{nearest}")
+    assert nearest not in top_ids(store, vectors[11])
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pytest
+from llama_index.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.vector_stores import SimpleVectorStore
+from llama_index.vector_stores.types import (NodeWithEmbedding,
+                                             VectorStoreQuery)
+
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import \
+    NumpyVectorStore
+
+
+def random_vectors(count, dim=32, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def node_with_embedding(node_id, ref_doc_id, embedding):
+    node = TextNode(text=node_id, id_=node_id,
+                    relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=ref_doc_id)})
+    return NodeWithEmbedding(node=node, embedding=list(map(float, embedding)))
+
+
+def make_store(vectors, **kw):
+    ids = [f"node_{row}" for row in range(len(vectors))]
+    return NumpyVectorStore(embedding_dict=dict(zip(ids, vectors.tolist())),
+                            text_id_to_ref_doc_id={node_id: f"doc_{row // 2}" for row, node_id in enumerate(ids)},
+                            **kw)
+
+
+def exact_top_k(vectors, query, k):
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return [f"node_{row}" for row in np.argsort(-scores)[:k]], np.sort(scores)[::-1][:k]
+
+
+def test_top_k_matches_exact_cosine():
+    vectors = random_vectors(500)
+    store = make_store(vectors)
+    query = random_vectors(1, seed=1)[0]
+
+    result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=10))
+    ids, scores = exact_top_k(vectors, query, 10)
+    assert result.ids == ids
+    assert np.allclose(result.similarities, scores, atol=1e-5)
+
+
+def test_top_k_larger_than_the_store():
+    store = make_store(random_vectors(3))
+    result = store.query(VectorStoreQuery(query_embedding=random_vectors(1, seed=1)[0].tolist(),
+                                          similarity_top_k=10))
+    assert sorted(result.ids) == ["node_0", "node_1", "node_2"]
+
+
+def test_empty_store():
+    result = NumpyVectorStore().query(VectorStoreQuery(query_embedding=[1.0, 0.0], similarity_top_k=2))
+    assert result.ids == []
+
+
+def test_doc_id_and_node_id_filters():
+    store = make_store(random_vectors(10))
+    query = random_vectors(1, seed=1)[0].tolist()
+
+    result = store.query(VectorStoreQuery(query_embedding=query, similarity_top_k=10, doc_ids=["doc_1"]))
+    assert sorted(result.ids) == ["node_2", "node_3"]
+    result = store.query(VectorStoreQuery(query_embedding=query, similarity_top_k=10, node_ids=["node_7"]))
+    assert result.ids == ["node_7"]
+
+
+def test_add_replaces_and_delete_removes():
+    vectors = random_vectors(4)
+    store = make_store(vectors)
+    store.add([node_with_embedding("node_0", "doc_0", vectors[3]), node_with_embedding("node_9", "doc_9", vectors[1])])
+    assert store.count == 5
+    assert np.allclose(store.get("node_0"), vectors[3])
+
+    store.delete("doc_0")
+    assert store.count == 3
+    result = store.query(VectorStoreQuery(query_embedding=vectors[1].tolist(), similarity_top_k=1))
+    assert result.ids in (["node_9"], ["node_1"])
+    assert "node_0" not in store.to_dict()["embedding_dict"]
+
+
+def test_json_is_compatible_with_simple_vector_store(tmp_path):
+    vectors = random_vectors(6)
+    store = make_store(vectors)
+    path = os.path.join(tmp_path, "vector_store.json")
+    store.persist(path)
+
+    simple = SimpleVectorStore.from_persist_path(path)
+    assert simple.to_dict()["embedding_dict"].keys() == store.to_dict()["embedding_dict"].keys()
+    simple.persist(path)
+    loaded = NumpyVectorStore.from_persist_path(path)
+    assert loaded.count == 6
+    assert np.allclose(loaded.get("node_4"), vectors[4])
+
+
+def test_unsupported_queries():
+    store = make_store(random_vectors(2))
+    with pytest.raises(ValueError):
+        store.query(VectorStoreQuery(query_embedding=[0.0] * 32, similarity_top_k=1, mode="svm"))
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+from llama_index.vector_stores.types import VectorStoreQuery
+
+from chatgpt_long_term_memory.llama_index_helpers.numpy_vector_store import (
+    BINARY_FNAME, NumpyVectorStore)
+
+
+def clustered_vectors(count=400, dim=48, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    return (centers[rng.integers(0, 20, count)] + 0.3 * rng.normal(size=(count, dim))).astype(np.float32)
+
+
+def make_store(vectors, **kw):
+    ids = [f"node_{row}" for row in range(len(vectors))]
+    return NumpyVectorStore(embedding_dict=dict(zip(ids, vectors.tolist())),
+                            text_id_to_ref_doc_id={node_id: f"doc_{node_id}" for node_id in ids}, **kw)
+
+
+def recall(store, exact, queries, k=10):
+    found = 0
+    for query in queries:
+        vector_query = VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k)
+        found += len(set(store.query(vector_query).ids) & set(exact.query(vector_query).ids))
+    return found / (k * len(queries))
+
+
+@pytest.mark.parametrize("quantization,rerank_factor", [("float16", 1), ("int8", 1), ("int8", 4)])
+def test_recall_against_float32(quantization, rerank_factor):
+    vectors = clustered_vectors()
+    exact = make_store(vectors)
+    store = make_store(vectors, quantization=quantization, rerank_factor=rerank_factor)
+
+    assert recall(store, exact, clustered_vectors(20, seed=1)) >= 0.9
+
+
+def test_int8_memory():
+    vectors = clustered_vectors()
+    stats = make_store(vectors, quantization="int8").memory_stats()
+    assert stats["quantization"] == "int8"
+    assert stats["scan_bytes"] < stats["float32_bytes"] / 3
+    assert stats["savings"] > 0.7
+
+    with_copy = make_store(vectors, quantization="int8", rerank_factor=4).memory_stats()
+    assert stats["stored_bytes"] < with_copy["stored_bytes"] < with_copy["float32_bytes"]
+
+
+def test_rerank_returns_exact_similarities():
+    vectors = clustered_vectors()
+    exact = make_store(vectors)
+    store = make_store(vectors, quantization="int8", rerank_factor=4)
+    query = VectorStoreQuery(query_embedding=vectors[7].tolist(), similarity_top_k=1)
+
+    result = store.query(query)
+    assert result.ids == ["node_7"]
+    assert result.similarities[0] == pytest.approx(exact.query(query).similarities[0], abs=1e-3)
+
+
+@pytest.mark.parametrize("rerank_factor", [1, 4])
+def test_int8_persistence(tmp_path, rerank_factor):
+    vectors = clustered_vectors()
+    store = make_store(vectors, persist_format="binary", quantization="int8", rerank_factor=rerank_factor)
+    store.persist(os.path.join(tmp_path, "vector_store.json"))
+    assert os.listdir(tmp_path) == [BINARY_FNAME]
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path), quantization="int8", rerank_factor=rerank_factor)
+    assert loaded.memory_stats()["mapped"]
+    assert loaded.memory_stats()["stored_bytes"] == store.memory_stats()["stored_bytes"]
+    queries = clustered_vectors(10, seed=2)
+    assert recall(loaded, store, queries) == 1.0
+    assert np.allclose(loaded.get("node_5"), store.get("node_5"), atol=1e-2)
+
+
+def test_float32_file_is_quantized_on_load(tmp_path):
+    vectors = clustered_vectors()
+    make_store(vectors, persist_format="binary").persist(os.path.join(tmp_path, "vector_store.json"))
+
+    loaded = NumpyVectorStore.from_persist_dir(str(tmp_path), quantization="int8")
+    assert loaded.memory_stats()["quantization"] == "int8"
+    assert recall(loaded, make_store(vectors), clustered_vectors(10, seed=3)) >= 0.9
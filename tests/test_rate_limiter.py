@@ -0,0 +1,120 @@
+import asyncio
+import types
+
+import openai.error
+import pytest
+
+from chatgpt_long_term_memory.openai_engine import error_handler
+from chatgpt_long_term_memory.openai_engine.error_handler import (
+    is_retryable, retry_delay, retry_on_openai_errors)
+from chatgpt_long_term_memory.openai_engine.rate_limiter import (RateLimiter,
+                                                                 rate_limiter)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """
+    Record the delays of the retries instead of sleeping.
+    """
+    delays = []
+    monkeypatch.setattr(error_handler, "time", types.SimpleNamespace(sleep=delays.append))
+
+    async def sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(error_handler, "asyncio", types.SimpleNamespace(
+        sleep=sleep, iscoroutinefunction=asyncio.iscoroutinefunction))
+    yield delays
+    rate_limiter.configure()
+
+
+def flaky(errors, result="done"):
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return call, calls
+
+
+def test_request_budget():
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(60):
+        assert limiter._reserve(0) == 0
+    assert 0.9 < limiter._reserve(0) <= 1.0
+
+
+def test_token_budget():
+    limiter = RateLimiter(tokens_per_minute=1000)
+    assert limiter._reserve(600) == 0
+    assert 11.9 < limiter._reserve(600) <= 12.0
+    # A request larger than the whole budget waits for a full bucket only
+    assert limiter._reserve(5000) <= 36.0
+
+
+def test_unlimited_by_default():
+    limiter = RateLimiter()
+    for _ in range(1000):
+        assert limiter._reserve(10 ** 6) == 0
+
+
+def test_pause_holds_back_every_caller():
+    limiter = RateLimiter()
+    limiter.pause(5)
+    assert 4.9 < limiter._reserve(0) <= 5.0
+
+
+def test_retryable_errors():
+    assert is_retryable(openai.error.RateLimitError("slow down"))
+    assert is_retryable(openai.error.APIError("bad gateway", http_status=502))
+    assert not is_retryable(openai.error.APIError("bad request", http_status=400))
+    assert not is_retryable(openai.error.InvalidRequestError("too long", param=None))
+    assert not is_retryable(ValueError())
+
+
+def test_retry_after_is_honoured(sleeps):
+    error = openai.error.RateLimitError("slow down", headers={"retry-after": "2"})
+    assert retry_delay(error, 1) == 2.0
+    # Every caller of the shared limiter waits too
+    assert rate_limiter._reserve(0) > 1.9
+
+
+def test_backoff_is_bounded(sleeps):
+    rate_limiter.configure(base_delay=1, max_delay=4)
+    for retry in range(1, 8):
+        assert 0 <= retry_delay(openai.error.Timeout(), retry) <= min(4, 2 ** (retry - 1))
+
+
+def test_retries_until_success(sleeps):
+    call, calls = flaky([openai.error.Timeout(), openai.error.APIConnectionError("reset")])
+    assert retry_on_openai_errors(5)(call)() == "done"
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_permanent_errors_are_not_retried(sleeps):
+    call, calls = flaky([openai.error.APIError("bad request", http_status=400)])
+    with pytest.raises(openai.error.APIError):
+        retry_on_openai_errors(5)(call)()
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_maximum_number_of_attempts(sleeps):
+    call, calls = flaky([openai.error.Timeout()] * 10)
+    with pytest.raises(Exception, match="maximum number of retries"):
+        retry_on_openai_errors(3)(call)()
+    assert len(calls) == 3
+
+
+def test_coroutines_are_retried(sleeps):
+    call, calls = flaky([openai.error.ServiceUnavailableError("busy")])
+
+    @retry_on_openai_errors(3)
+    async def acall():
+        return call()
+
+    assert asyncio.run(acall()) == "done"
+    assert len(calls) == 2
+    assert len(sleeps) == 1
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.llama_index_helpers.index_engine import (
+    CONVERSATION_PREFIX, SUMMARY_PREFIX)
+from chatgpt_long_term_memory.memory.chat_memory import ChatMemory
+from chatgpt_long_term_memory.memory.config import ChatMemoryConfig
+from chatgpt_long_term_memory.memory.history_codec import TIMESTAMP_FORMAT
+
+
+def make_memory(redis_client, async_redis_client, **kw):
+    return ChatMemory(ChatMemoryConfig(**kw), redis_client=redis_client, async_redis_client=async_redis_client)
+
+
+def queries(entries):
+    return [list(entry.values())[0]["user_query"] for entry in entries]
+
+
+def stamped(number, seconds):
+    timestamp = datetime.utcfromtimestamp(seconds).strftime(TIMESTAMP_FORMAT)
+    return {timestamp: {"user_query": f"question {number}", "bot_response": f"answer {number}"}}
+
+
+def ref_doc_ids(index, prefix):
+    return [ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith(prefix)]
+
+
+@pytest.mark.parametrize("backend", ["list", "legacy"])
+def test_history_is_trimmed_to_max_turns(redis_client, async_redis_client, backend):
+    memory = make_memory(redis_client, async_redis_client, history_backend=backend, history_max_turns=3)
+    for number in range(5):
+        memory.add_conversation("u1", (f"question {number}", f"answer {number}"))
+
+    assert memory.trim_history("u1") == 2
+    assert queries(memory.get("u1")) == ["question 2", "question 3", "question 4"]
+    assert memory.trim_history("u1") == 0
+
+
+def test_aged_conversations_are_dropped(redis_client, async_redis_client):
+    memory = make_memory(redis_client, async_redis_client, history_max_age=3600)
+    now = time.time()
+    for number, age in enumerate([7200, 5000, 60, 10]):
+        redis_client.rpush("u1_history", json.dumps(stamped(number, now - age)))
+
+    assert memory.trim_history("u1", now=now, page_size=1) == 2
+    assert queries(memory.get("u1")) == ["question 2", "question 3"]
+
+
+def test_positions_survive_trimming(redis_client, async_redis_client):
+    memory = make_memory(redis_client, async_redis_client, history_max_turns=2)
+    for number in range(3):
+        memory.add_conversation("u1", (f"question {number}", f"answer {number}"))
+    memory.set_summary("u1", 1, "summary of question 0")
+
+    assert memory.trim_history("u1") == 1
+    # Positions count every conversation ever stored, and the watermark only moves past dropped ones
+    assert queries(memory.get_since("u1", 2)) == ["question 2"]
+    assert memory.get_summary("u1")["watermark"] == 1
+
+    memory.add_conversation("u1", ("question 3", "answer 3"))
+    assert memory.trim_history("u1") == 1
+    assert memory.get_summary("u1")["watermark"] == 2
+    assert queries(memory.get_since("u1", 2)) == ["question 2", "question 3"]
+
+
+def test_idle_history_expires(redis_client, async_redis_client):
+    memory = make_memory(redis_client, async_redis_client, history_idle_ttl=600)
+    memory.add_conversation("u1", ("question", "answer"))
+    memory.set_summary("u1", 1, "summary")
+
+    assert 0 < redis_client.ttl("u1_history") <= 600
+    assert 0 < redis_client.ttl(memory.summary_key("u1")) <= 600
+
+
+def test_no_policy_keeps_everything(redis_client, async_redis_client):
+    memory = make_memory(redis_client, async_redis_client)
+    memory.add_conversation("u1", ("question", "answer"))
+
+    assert memory.trim_history("u1") == 0
+    assert redis_client.ttl("u1_history") == -1
+
+
+@pytest.fixture(params=["full", "incremental"])
+def client(request, make_client):
+    return make_client(ChatGPTClient, IndexConfig(storage_mode=request.param, shared_knowledge_base=True,
+                                                  index_max_turns=2, index_idle_ttl=3600))
+
+
+def test_conversations_fold_into_one_summary(client):
+    for number in range(5):
+        client.converse(f"question {number}", "u1")
+    texts = []
+
+    def summarize(text):
+        texts.append(text)
+        return f"summary {len(texts)}"
+
+    assert client.fold_conversations("u1", summarize) == 3
+    index = client.load_index("u1")
+    assert len(ref_doc_ids(index, CONVERSATION_PREFIX)) == 2
+    assert len(ref_doc_ids(index, SUMMARY_PREFIX)) == 1
+
+    client.converse("question 5", "u1")
+    assert client.fold_conversations("u1", summarize) == 1
+    # The previous summary is folded into the new one
+    assert texts[1].startswith("SUMMARY OF EARLIER CONVERSATIONS: summary 1")
+    client.invalidate_index("u1")
+    index = client.load_index("u1")
+    assert len(ref_doc_ids(index, CONVERSATION_PREFIX)) == 2
+    assert len(ref_doc_ids(index, SUMMARY_PREFIX)) == 1
+
+
+def test_concurrent_folds_keep_one_summary(client):
+    for number in range(6):
+        client.converse(f"question {number}", "u1")
+    both_summarizing = threading.Barrier(2, timeout=5)
+
+    def summarize(text):
+        both_summarizing.wait()
+        return "summary"
+
+    results = []
+    folds = [threading.Thread(target=lambda: results.append(client.fold_conversations("u1", summarize)))
+             for _ in range(2)]
+    for fold in folds:
+        fold.start()
+    for fold in folds:
+        fold.join()
+
+    assert sorted(results) == [0, 4]
+    index = client.load_index("u1")
+    assert len(ref_doc_ids(index, CONVERSATION_PREFIX)) == 2
+    assert len(ref_doc_ids(index, SUMMARY_PREFIX)) == 1
+
+
+def test_idle_index_expires(client):
+    client.converse("question", "u1")
+    path = f"{client.root_path}/storages/storage_u1"
+
+    assert not client.expire_idle_index("u1")
+    assert client.expire_idle_index("u1", now=time.time() + 7200)
+    assert not os.path.exists(path)
+    assert ref_doc_ids(client.load_index("u1"), CONVERSATION_PREFIX) == []
+
+
+def test_late_turn_starts_a_new_index(client):
+    client.converse("question", "u1")
+    stale = client.load_index("u1")
+    client.expire_idle_index("u1", now=time.time() + 7200)
+
+    client.index_conversations("u1", stale, [("late question", "late answer")])
+    client.invalidate_index("u1")
+    # The expired conversation doesn't come back with the late one
+    assert len(ref_doc_ids(client.load_index("u1"), CONVERSATION_PREFIX)) == 1
+
+
+def test_compaction_indexes_queued_turns_first(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True, write_behind=True,
+                                                    index_idle_ttl=3600))
+    client.converse("question", "u1")
+
+    result = client.compact_memory("u1", now=time.time() + 7200)
+    assert result["index_expired"]
+    # The queued turn was indexed before the index was deleted, not into the deleted one afterwards
+    client.flush_index_updates()
+    assert not os.path.exists(f"{client.root_path}/storages/storage_u1")
+
+
+def test_compact_memories_covers_stored_users(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True, index_idle_ttl=3600))
+    client.converse("question", "u1")
+    client.converse("question", "u2")
+
+    results = client.compact_memories(now=time.time() + 7200)
+    assert sorted(results) == ["u1", "u2"]
+    assert all(result["index_expired"] for result in results.values())
+    assert client.stored_user_ids() == []
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from chatgpt_long_term_memory.conversation import ChatbotClient
+
+
+class Summaries:
+    """
+    Counting stand-in for `CreateContext.summarize_memories`.
+    """
+
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, text, encoding):
+        self.inputs.append(text)
+        return f"summary {len(self.inputs)}"
+
+    async def asummarize(self, text, encoding):
+        return self(text, encoding)
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(ChatbotClient)
+
+
+@pytest.fixture
+def summaries(client, monkeypatch):
+    summaries = Summaries()
+    monkeypatch.setattr(client.create_context, "summarize_memories", summaries)
+    monkeypatch.setattr(client.create_context, "asummarize_memories", summaries.asummarize)
+    return summaries
+
+
+def add_turns(client, user_id, numbers):
+    for number in numbers:
+        client.add_conversation(user_id, (f"question {number}", f"answer {number}"))
+
+
+def test_summary_is_stored_with_its_watermark(client, summaries):
+    add_turns(client, "u1", range(3))
+
+    assert client.history_summary("", "u1") == "summary 1"
+    assert client.get_summary("u1") == {"watermark": 3, "summary": "summary 1"}
+    assert summaries.inputs == ["USER: question 0, ANSWER: answer 0\n"
+                                "USER: question 1, ANSWER: answer 1\n"
+                                "USER: question 2, ANSWER: answer 2"]
+
+
+def test_unchanged_history_reuses_the_summary(client, summaries):
+    add_turns(client, "u1", range(3))
+    client.history_summary("", "u1")
+
+    assert client.history_summary("", "u1") == "summary 1"
+    assert len(summaries.inputs) == 1
+
+
+def test_only_new_turns_are_summarized(client, summaries):
+    add_turns(client, "u1", range(3))
+    client.history_summary("", "u1")
+    add_turns(client, "u1", [3])
+
+    assert client.history_summary("", "u1") == "summary 2"
+    assert summaries.inputs[1] == "summary 1\nUSER: question 3, ANSWER: answer 3"
+    assert client.get_summary("u1")["watermark"] == 4
+
+
+def test_async_summary_shares_the_watermark(client, summaries):
+    add_turns(client, "u1", range(2))
+    client.history_summary("", "u1")
+    add_turns(client, "u1", [2])
+
+    assert asyncio.run(client.ahistory_summary("", "u1")) == "summary 2"
+    assert asyncio.run(client.ahistory_summary("", "u1")) == "summary 2"
+    assert client.get_summary("u1")["watermark"] == 3
+    assert len(summaries.inputs) == 2
+
+
+def test_without_user_the_retrieved_nodes_are_summarized(client, summaries):
+    add_turns(client, "u1", range(2))
+
+    assert client.history_summary("retrieved text") == "summary 1"
+    assert summaries.inputs == ["retrieved text"]
+    assert client.get_summary("u1") is None
+    # A user without stored conversations falls back the same way
+    assert client.history_summary("retrieved text", "u2") == "summary 2"
+    assert client.get_summary("u2") is None
+
+
+def test_retrieved_nodes_are_kept_beside_the_summary(client, summaries):
+    add_turns(client, "u1", range(2))
+
+    assert client.history_summary("retrieved text", "u1") == "summary 1\nretrieved text"
+    assert len(summaries.inputs) == 1
+
+
+def test_retrieved_nodes_are_cut_to_the_room_left(client):
+    room = client._retrieved_room("summary", "question")
+    retrieved = " ".join(["word"] * (room + 10))
+
+    packed = client._pack_retrieved("summary", retrieved, room)
+    assert packed.startswith("summary\n")
+    assert client.token_counter.prompt_token_counter(packed[len("summary\n"):]) <= room
+    assert client._pack_retrieved("summary", retrieved, 0) == "summary"
+
+
+def test_room_shrinks_with_the_summary(client):
+    short = client._retrieved_room("summary", "question")
+    long = client._retrieved_room(" ".join(["summary"] * 100), "question")
+
+    assert long == max(short - 99, 0)
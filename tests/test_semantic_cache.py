@@ -0,0 +1,143 @@
+import os
+import time
+
+import openai
+import pytest
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.llama_index_helpers.config import (
+    IndexConfig, RetrieversConfig)
+from chatgpt_long_term_memory.llama_index_helpers.semantic_cache import \
+    SemanticCache
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    """
+    Count the chat completion requests.
+    """
+    calls = []
+    create = openai.ChatCompletion.create
+
+    def counting_create(**kw):
+        calls.append(kw)
+        return create(**kw)
+    monkeypatch.setattr(openai.ChatCompletion, "create", counting_create)
+    return calls
+
+
+def test_similar_question_hits():
+    cache = SemanticCache(threshold=0.9)
+    cache.put("u1", "question", [1.0, 0.0], "answer")
+
+    assert cache.lookup("u1", [2.0, 0.1]) == "answer"
+    assert cache.lookup("u1", [0.0, 1.0]) is None
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 1
+
+
+def test_user_scope_keeps_answers_apart():
+    cache = SemanticCache(scope="user")
+    cache.put("u1", "question", [1.0, 0.0], "answer")
+
+    assert cache.lookup("u2", [1.0, 0.0]) is None
+    cache.invalidate("u1")
+    assert cache.lookup("u1", [1.0, 0.0]) is None
+
+
+def test_kb_scope_shares_answers():
+    cache = SemanticCache(scope="kb")
+    cache.put("u1", "question", [1.0, 0.0], "answer")
+
+    assert cache.lookup("u2", [1.0, 0.0]) == "answer"
+
+
+def test_least_recently_used_is_evicted():
+    cache = SemanticCache(max_entries=2)
+    cache.put("u1", "first", [1.0, 0.0, 0.0], "first answer")
+    cache.put("u1", "second", [0.0, 1.0, 0.0], "second answer")
+    assert cache.lookup("u1", [1.0, 0.0, 0.0]) == "first answer"
+
+    cache.put("u1", "third", [0.0, 0.0, 1.0], "third answer")
+    assert cache.lookup("u1", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("u1", [1.0, 0.0, 0.0]) == "first answer"
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_answers_are_ignored(monkeypatch):
+    cache = SemanticCache(ttl=10)
+    cache.put("u1", "question", [1.0, 0.0], "answer")
+
+    later = time.time() + 11
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.lookup("u1", [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_new_version_clears_the_cache():
+    cache = SemanticCache()
+    cache.check_version("v1")
+    cache.put("u1", "question", [1.0, 0.0], "answer")
+
+    cache.check_version("v1")
+    assert cache.lookup("u1", [1.0, 0.0]) == "answer"
+    cache.check_version("v2")
+    assert cache.lookup("u1", [1.0, 0.0]) is None
+
+
+def test_unknown_scope_is_rejected():
+    with pytest.raises(AssertionError):
+        SemanticCache(scope="everyone")
+
+
+def test_repeated_question_is_answered_once(make_client, completions):
+    client = make_client(ChatGPTClient, retrievers_config=RetrieversConfig(semantic_cache=True))
+
+    first = client.converse("how long do refunds take?", "u1")
+    second = client.converse("how long do refunds take?", "u1")
+
+    assert first == second
+    assert len(completions) == 1
+    assert client.semantic_cache.stats()["hits"] == 1
+    # Both turns are still part of the user's history
+    assert client.history_length("u1") == 2
+
+
+def test_only_knowledge_base_answers_are_shared(make_client, completions):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True),
+                         RetrieversConfig(semantic_cache=True, semantic_cache_scope="kb"))
+
+    # u1 has no conversations yet, the answer only draws on the knowledge base
+    client.converse("how long do refunds take?", "u1")
+    client.converse("how long do refunds take?", "u2")
+    assert len(completions) == 1
+
+    # Now u1's own conversation is retrieved too, the answer stays private
+    client.converse("when does support answer?", "u1")
+    client.converse("when does support answer?", "u2")
+    assert len(completions) == 3
+
+
+def test_kb_scope_needs_a_knowledge_base(make_client):
+    with pytest.raises(AssertionError):
+        make_client(ChatGPTClient, IndexConfig(knowledge_base=False),
+                    RetrieversConfig(semantic_cache=True, semantic_cache_scope="kb"))
+
+
+def test_ingest_clears_the_cache(make_client, completions, root_path):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True),
+                         RetrieversConfig(semantic_cache=True))
+    client.converse("how long do refunds take?", "u1")
+    version = client.kb_version()
+    assert version
+
+    with open(os.path.join(root_path, "resources", "data", "refunds.txt"), "w") as f:
+        f.write("Refunds are paid back within thirty days of the purchase.")
+    # Edited but not ingested yet: the index, and so the cached answer, didn't change
+    assert client.kb_version() == version
+    client.converse("how long do refunds take?", "u1")
+    assert len(completions) == 1
+
+    client.ingest()
+    assert client.kb_version() != version
+    client.converse("how long do refunds take?", "u1")
+    assert len(completions) == 2
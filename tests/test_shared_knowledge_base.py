@@ -0,0 +1,60 @@
+import os
+
+from chatgpt_long_term_memory.conversation import ChatGPTClient
+from chatgpt_long_term_memory.llama_index_helpers.config import IndexConfig
+from chatgpt_long_term_memory.llama_index_helpers.kb_manifest import \
+    KB_PREFIX
+
+
+def kb_ids(index):
+    return [ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith(KB_PREFIX)]
+
+
+def test_users_get_a_copy_by_default(make_client):
+    client = make_client(ChatGPTClient)
+
+    assert client.load_kb_index() is None
+    assert len(kb_ids(client.load_index("u1"))) == 3
+
+
+def test_shared_knowledge_base_is_built_once(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    kb_index = client.load_kb_index()
+
+    assert os.path.isdir(client.kb_path)
+    assert len(kb_ids(kb_index)) == 3
+    assert client.load_kb_index() is kb_index
+    assert kb_ids(client.load_index("u1")) == []
+    assert kb_ids(client.load_index("u2")) == []
+
+
+def test_retrieval_reads_the_shared_knowledge_base(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    index = client.load_index("u1")
+
+    nodes = client.retrieve_nodes("how long do refunds take", index, kb_index=client.load_kb_index())
+    assert any("Refunds" in node.node.text for node in nodes)
+    assert client.kb_only(nodes)
+
+
+def test_kb_user_id_is_not_the_knowledge_base(make_client):
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    client.load_kb_index()
+    client.converse("hello", "kb")
+
+    assert client.stored_user_ids() == ["kb"]
+    assert kb_ids(client.load_index("kb")) == []
+    assert len(kb_ids(client.load_kb_index())) == 3
+
+
+def test_drop_kb_copies(make_client):
+    legacy = make_client(ChatGPTClient)
+    legacy.converse("hello", "u1")
+    assert len(kb_ids(legacy.load_index("u1"))) == 3
+
+    client = make_client(ChatGPTClient, IndexConfig(shared_knowledge_base=True))
+    assert client.drop_kb_copies("u1") == 3
+    client.invalidate_index("u1")
+    index = client.load_index("u1")
+    assert kb_ids(index) == []
+    assert len([ref_doc_id for ref_doc_id in index.ref_doc_info if ref_doc_id.startswith("doc_id_")]) == 1